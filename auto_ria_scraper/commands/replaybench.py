@@ -0,0 +1,63 @@
+import time
+
+from scrapy.commands import BaseRunSpiderCommand
+from scrapy.exceptions import UsageError
+
+
+class Command(BaseRunSpiderCommand):
+    """
+    `scrapy replaybench <corpus_dir>`: run the spider fully offline against a recorded corpus
+    (see auto_ria_scraper.replay) and report end-to-end items/sec, parse time per page
+    and PostgresPipeline write throughput.
+    """
+
+    requires_project = True
+
+    def syntax(self):
+        return "[options] <corpus_dir>"
+
+    def short_desc(self):
+        return "Replay a recorded corpus through the spider and pipeline and report throughput"
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument("--spider", default="autoriaspider", help="spider to run (default: autoriaspider)")
+        parser.add_argument("--no-db", action="store_true", help="disable the item pipelines (parse-only run)")
+
+    def run(self, args, opts):
+        if len(args) != 1:
+            raise UsageError
+        handler = "auto_ria_scraper.replay.ReplayDownloadHandler"
+        self.settings.set("REPLAY_CORPUS_DIR", args[0], priority="cmdline")
+        self.settings.set("REPLAY_RECORD", False, priority="cmdline")
+        self.settings.set("DOWNLOAD_HANDLERS", {"http": handler, "https": handler}, priority="cmdline")
+        # Measure the crawl itself, not politeness delays or cache lookups
+        self.settings.set("DOWNLOAD_DELAY", 0, priority="cmdline")
+        self.settings.set("AUTOTHROTTLE_ENABLED", False, priority="cmdline")
+        self.settings.set("HTTPCACHE_ENABLED", False, priority="cmdline")
+        if opts.no_db:
+            self.settings.set("ITEM_PIPELINES", {}, priority="cmdline")
+
+        crawler = self.crawler_process.create_crawler(opts.spider)
+        self.crawler_process.crawl(crawler, **opts.spargs)
+        start = time.perf_counter()
+        self.crawler_process.start()
+        self.report(crawler.stats.get_stats(), time.perf_counter() - start)
+
+    def report(self, stats, elapsed):
+        items = stats.get("item_scraped_count", 0)
+        print(f"replayed {stats.get('replay/hit', 0)} responses ({stats.get('replay/miss', 0)} missing) in {elapsed:.2f}s")
+        print(f"items: {items} -> {items / elapsed:,.1f} items/s end to end")
+        for key in sorted(stats):
+            if key.startswith("parse/") and key.endswith("/seconds"):
+                callback = key.split("/")[1]
+                responses = stats.get(f"parse/{callback}/responses", 0)
+                if responses:
+                    print(f"parse {callback}: {responses} pages, {stats[key] / responses * 1000:.2f} ms/page")
+        if stats.get("pipeline/rows_inserted"):
+            print(f"dedup: {stats.get('dedup/hits', 0)} of {stats['pipeline/rows_inserted']} new listings matched a known "
+                  f"vehicle, {stats.get('dedup/phones_reused', 0)} phone lookups saved")
+        rows = stats.get("pipeline/rows_written", 0)
+        seconds = stats.get("pipeline/write_seconds", 0)
+        if seconds:
+            print(f"db: {rows} rows in {stats.get('pipeline/batches', 0)} batches -> {rows / seconds:,.0f} rows/s")
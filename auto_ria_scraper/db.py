@@ -0,0 +1,22 @@
+import os
+import psycopg2
+
+# Read database configuration from environment variables (or set defaults)
+db_name = os.getenv("DB_NAME", "autodb")
+db_user = os.getenv("DB_USER", "autoria")
+db_pass = os.getenv("DB_PASS", "autoria")
+db_host = os.getenv("DB_HOST", "postgres")
+db_port = int(os.getenv("DB_PORT", 5432))
+
+
+def get_connection():
+    """
+    Establish and return a connection to the PostgreSQL database.
+    """
+    return psycopg2.connect(
+        dbname=db_name,
+        user=db_user,
+        password=db_pass,
+        host=db_host,
+        port=db_port,
+    )
@@ -0,0 +1,199 @@
+import argparse
+import itertools
+import json
+import os
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from auto_ria_scraper.db import get_connection
+
+# Columns of an exported car, shared by the database export and the Scrapy feed exporters
+# (crawled items have no id, phone_status or updated_at yet; those columns are null there)
+SCHEMA = pa.schema([
+    ("id", pa.int32()),
+    ("url", pa.string()),
+    ("title", pa.string()),
+    ("price_usd", pa.int32()),
+    ("odometer", pa.int32()),
+    ("username", pa.string()),
+    ("phone_number", pa.string()),
+    ("image_url", pa.string()),
+    ("images_count", pa.int32()),
+    ("car_number", pa.string()),
+    ("car_vin", pa.string()),
+    ("datetime_found", pa.timestamp("us", tz="UTC")),
+    ("phone_status", pa.string()),
+    ("updated_at", pa.timestamp("us", tz="UTC")),
+])
+FOUND = SCHEMA.names.index("datetime_found")
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+# Where an incremental export keeps the (datetime_found, id) of the last row it wrote
+# and the time up to which updated rows were exported
+WATERMARK_FILE = "_watermark.json"
+
+
+def open_writer(sink, fmt):
+    """
+    Return a writer for `sink` (a path or a binary file object) with write_batch() and close().
+    Parquet files are zstd-compressed with one row group per batch; "arrow" writes the Arrow IPC file format.
+    """
+    if fmt == "parquet":
+        return pq.ParquetWriter(sink, SCHEMA, compression="zstd")
+    if fmt == "arrow":
+        return pa.ipc.new_file(sink, SCHEMA)
+    raise ValueError(f"Unknown export format {fmt!r}, expected one of {', '.join(FORMATS)}")
+
+
+def record_batch(rows):
+    """
+    Build a RecordBatch from row tuples in SCHEMA column order.
+    """
+    columns = list(zip(*rows)) if rows else [()] * len(SCHEMA)
+    return pa.RecordBatch.from_arrays(
+        [pa.array(values, type=field.type) for values, field in zip(columns, SCHEMA)], schema=SCHEMA
+    )
+
+
+def read_watermark(out_dir):
+    try:
+        with open(os.path.join(out_dir, WATERMARK_FILE), encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    # Watermarks written before updates were tracked: nothing could have been updated since the last row
+    updated_before = data.get("updated_before", data["datetime_found"])
+    return datetime.fromisoformat(data["datetime_found"]), data["id"], datetime.fromisoformat(updated_before)
+
+
+def write_watermark(out_dir, datetime_found, car_id, updated_before):
+    path = os.path.join(out_dir, WATERMARK_FILE)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(
+            {"datetime_found": datetime_found.isoformat(), "id": car_id, "updated_before": updated_before.isoformat()},
+            f,
+        )
+    os.replace(f"{path}.tmp", path)
+
+
+def _month(row):
+    return row[FOUND].astimezone(timezone.utc).strftime("%Y-%m")
+
+
+def export_cars(conn, out_dir, fmt="parquet", chunk_rows=50_000, full=False, lag_seconds=300, log=print):
+    """
+    Stream 'cars' into out_dir/month=YYYY-MM/<run>.<ext> files (UTC month of datetime_found,
+    hive-style, so pyarrow.dataset and most query engines read the directory as one table).
+    - Rows come from a server-side cursor in chunks of `chunk_rows`, ordered by (datetime_found, id);
+      each chunk is written as one row group and dropped, and only one file is open at a time,
+      so memory stays at about one chunk whatever the table size.
+    - Incremental unless `full`: only rows after the (datetime_found, id) watermark left in
+      out_dir by the previous run are exported, plus the already exported rows whose price,
+      mileage or phone changed since then (cars.updated_at). Rows found or updated in the last
+      `lag_seconds` wait for the next run, since transactions still being written may carry
+      older timestamps.
+    - An updated row is written again, into its month's file of this run: readers keep the
+      latest version of each id, the one with the greatest updated_at (null for the first).
+    - Files are written under temporary names and renamed, and the watermark saved, only once
+      the whole run succeeded; a failed run leaves nothing behind and is simply repeated.
+    Earlier prices and mileages are kept in 'cars_history'.
+    Returns (rows exported, files written).
+    """
+    ext = FORMATS[fmt]
+    os.makedirs(out_dir, exist_ok=True)
+    watermark = None if full else read_watermark(out_dir)
+    # Microseconds: a second run within the same second must not replace the first one's files
+    run = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    columns = ", ".join(SCHEMA.names)
+    query = f"SELECT {columns} FROM cars WHERE datetime_found < %(cutoff)s"
+    if watermark is not None:
+        # Two scans (the BRIN index on datetime_found, the partial index on updated_at) rather than an OR
+        query += (
+            " AND (datetime_found, id) > (%(found)s, %(id)s)"
+            f" UNION ALL SELECT {columns} FROM cars"
+            " WHERE updated_at >= %(updated)s AND updated_at < %(cutoff)s AND (datetime_found, id) <= (%(found)s, %(id)s)"
+        )
+        log(
+            f"Exporting cars found after {watermark[0].isoformat()} (id {watermark[1]}) "
+            f"or updated since {watermark[2].isoformat()}"
+        )
+
+    written = []
+    writer = None
+    month = None
+    rows_exported = 0
+    last = None
+    try:
+        # One snapshot and one cutoff for both halves of the query
+        with conn.cursor() as cur:
+            cur.execute("SELECT now() - make_interval(secs => %s)", (lag_seconds,))
+            cutoff = cur.fetchone()[0]
+        params = {"cutoff": cutoff}
+        if watermark is not None:
+            params.update(found=watermark[0], id=watermark[1], updated=watermark[2])
+        # A named cursor is a server-side cursor: rows are fetched chunk by chunk, not all at once
+        with conn.cursor(name="cars_export") as cur:
+            cur.itersize = chunk_rows
+            cur.execute(f"{query} ORDER BY datetime_found, id", params)
+            while True:
+                rows = cur.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                # A chunk may span a month boundary: switch files at each new month
+                for chunk_month, group in itertools.groupby(rows, key=_month):
+                    if chunk_month != month:
+                        if writer is not None:
+                            writer.close()
+                        month = chunk_month
+                        directory = os.path.join(out_dir, f"month={month}")
+                        os.makedirs(directory, exist_ok=True)
+                        path = os.path.join(directory, f"{run}{ext}")
+                        written.append(path)
+                        writer = open_writer(f"{path}.tmp", fmt)
+                    writer.write_batch(record_batch(list(group)))
+                rows_exported += len(rows)
+                last = (rows[-1][FOUND], rows[-1][0])
+        conn.commit()
+        if writer is not None:
+            writer.close()
+            writer = None
+    except BaseException:
+        conn.rollback()
+        if writer is not None:
+            writer.close()
+        for path in written:
+            if os.path.exists(f"{path}.tmp"):
+                os.remove(f"{path}.tmp")
+        raise
+    for path in written:
+        os.replace(f"{path}.tmp", path)
+    if watermark is not None and (last is None or last < watermark[:2]):
+        # Only updated rows were exported: the newest row found stays the same
+        last = watermark[:2]
+    if last is not None:
+        write_watermark(out_dir, *last, cutoff)
+    return rows_exported, len(written)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the cars table to Parquet or Arrow files")
+    parser.add_argument("out_dir", help="directory for the month=YYYY-MM/ files and the watermark")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="parquet")
+    parser.add_argument("--chunk-rows", type=int, default=50_000, help="rows per fetch and per row group")
+    parser.add_argument("--full", action="store_true", help="ignore the watermark and export every row (into an empty directory)")
+    parser.add_argument("--lag", type=float, default=300, help="leave rows found in the last LAG seconds for the next run")
+    args = parser.parse_args()
+
+    conn = get_connection()
+    try:
+        rows, files = export_cars(
+            conn, args.out_dir, fmt=args.format, chunk_rows=args.chunk_rows, full=args.full, lag_seconds=args.lag
+        )
+    finally:
+        conn.close()
+    print(f"Exported {rows} cars into {files} files")
+
+
+if __name__ == "__main__":
+    main()
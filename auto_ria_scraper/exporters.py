@@ -0,0 +1,53 @@
+from datetime import datetime
+
+from itemadapter import ItemAdapter
+from scrapy.exporters import BaseItemExporter
+
+from auto_ria_scraper.export import FOUND, SCHEMA, open_writer, record_batch
+
+
+class ParquetItemExporter(BaseItemExporter):
+    """
+    Feed exporter writing AutoRiaItems with the columns of `python -m auto_ria_scraper.export`,
+    so crawl output and database snapshots can be read as one dataset, e.g. for a crawl
+    without a database: `scrapy crawl autoriaspider -s ITEM_PIPELINES='{}' -O cars.parquet`.
+    - Items are buffered and written `batch_items` at a time (feed option, default 10000),
+      each batch as one Parquet row group.
+    - datetime_found is parsed from its ISO string; fields not in the schema are ignored.
+    Registered as the 'parquet' feed format; ArrowItemExporter ('arrow') writes the Arrow IPC file format.
+    """
+
+    format = "parquet"
+
+    def __init__(self, file, batch_items=10_000, **kwargs):
+        super().__init__(dont_fail=True, **kwargs)
+        self.file = file
+        self.batch_items = batch_items
+        self.rows = []
+        self.writer = None
+
+    def start_exporting(self):
+        self.writer = open_writer(self.file, self.format)
+
+    def export_item(self, item):
+        adapter = ItemAdapter(item)
+        row = [adapter.get(name) for name in SCHEMA.names]
+        if isinstance(row[FOUND], str):
+            row[FOUND] = datetime.fromisoformat(row[FOUND])
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_items:
+            self._flush()
+
+    def finish_exporting(self):
+        self._flush()
+        # Closes the writer only; the feed storage closes (and uploads) the file itself
+        self.writer.close()
+
+    def _flush(self):
+        if self.rows:
+            self.writer.write_batch(record_batch(self.rows))
+            self.rows = []
+
+
+class ArrowItemExporter(ParquetItemExporter):
+    format = "arrow"
@@ -0,0 +1,87 @@
+import re
+
+from lxml import etree
+from parsel.csstranslator import HTMLTranslator
+
+_translator = HTMLTranslator()
+_DIGITS_RE = re.compile(r"\d+")
+
+
+def _css(query):
+    """
+    Compile a parsel-style CSS query (with ::text / ::attr() support) into an lxml XPath object.
+    """
+    return etree.XPath(_translator.css_to_xpath(query))
+
+
+# Detail page selector plan, compiled once at import instead of translated on every response
+TITLE = _css("h1.head::text")
+PRICE_USD = _css("div.price_value--additional span[data-currency='USD']::text")
+PRICE_MAIN = _css("div.price_value strong::text")
+ODOMETER = _css("div.base-information.bold span.size18::text")
+SELLER_NAME = _css("div.seller_info_area .seller_info_name")
+SELLER_PRO = _css("div.seller_info_area a.sellerPro::text")
+MAIN_IMAGE = etree.XPath("//div[@class='photo-620x465']//img[@class='outline m-auto']/@src")
+PHOTO_BLOCKS = etree.XPath("count(//div[@class='photo-620x465'])")
+PHOTOS_TEXT = _css("a.show-all.link-dotted::text")
+CAR_NUMBER = _css("span.state-num.ua::text")
+VIN = _css("span.label-vin::text")
+NORMALIZED_TEXT = etree.XPath("normalize-space(string(.))")
+
+
+def _first(xpath, root):
+    result = xpath(root)
+    return str(result[0]) if result else None
+
+
+def _strip(value):
+    return value.strip() if value else None
+
+
+def _digits(text):
+    """
+    Join all digit runs of a formatted number ("12 500 $" -> 12500), or return None.
+    """
+    digits = "".join(_DIGITS_RE.findall(text)) if text else ""
+    return int(digits) if digits else None
+
+
+def extract_detail(root):
+    """
+    Extract every AutoRiaItem field of a car detail page from its lxml root element.
+    - Each precompiled query runs at most once per page, straight on the lxml tree.
+    - Returns a dict with title, price_usd, odometer, username, image_url,
+      images_count, car_number and car_vin (missing values are None).
+    """
+    # USD price (prefer the additional USD label, fall back to the main price)
+    price_text = _first(PRICE_USD, root) or _first(PRICE_MAIN, root)
+
+    # Odometer is shown in thousands of km
+    odometer_text = _first(ODOMETER, root)
+    try:
+        odometer = int(odometer_text.strip()) * 1000 if odometer_text else None
+    except ValueError:
+        odometer = None
+
+    # Seller username (prefer modern class, fallback to classic)
+    name_nodes = SELLER_NAME(root)
+    if name_nodes:
+        username = NORMALIZED_TEXT(name_nodes[0])
+    else:
+        username = _strip(_first(SELLER_PRO, root))
+
+    # Image count from the "show all" link text, falling back to the number of photo blocks
+    photos_text = _first(PHOTOS_TEXT, root)
+    match = _DIGITS_RE.search(photos_text) if photos_text else None
+    images_count = int(match.group()) if match else int(PHOTO_BLOCKS(root))
+
+    return {
+        "title": _strip(_first(TITLE, root)),
+        "price_usd": _digits(price_text),
+        "odometer": odometer,
+        "username": username,
+        "image_url": _first(MAIN_IMAGE, root),
+        "images_count": images_count,
+        "car_number": _strip(_first(CAR_NUMBER, root)),
+        "car_vin": _strip(_first(VIN, root)),
+    }
@@ -0,0 +1,171 @@
+import sqlite3
+import time
+import zlib
+from pathlib import Path
+
+from scrapy.downloadermiddlewares.httpcache import HttpCacheMiddleware
+from scrapy.exceptions import IgnoreRequest
+from scrapy.extensions.httpcache import RFC2616Policy
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.project import data_path
+from w3lib.http import headers_dict_to_raw, headers_raw_to_dict
+
+from auto_ria_scraper.utils import listing_id
+
+
+class AutoRiaCachePolicy(RFC2616Policy):
+    """
+    RFC 2616 cache policy tuned for auto.ria.
+    - Only detail pages are cached: search pages list new ads on every visit.
+    - Detail pages are stored even without validators (the site rarely sends them),
+      except captcha pages (ADAPTIVE_BAN_MARKERS).
+    - A cached page with an ETag/Last-Modified is revalidated with a conditional request;
+      one without validators is reused for HTTPCACHE_DETAIL_MAX_AGE seconds.
+    """
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.detail_max_age = settings.getint("HTTPCACHE_DETAIL_MAX_AGE")
+        self.ban_markers = [marker.encode() for marker in settings.getlist("ADAPTIVE_BAN_MARKERS")]
+
+    def should_cache_request(self, request):
+        return listing_id(request.url) is not None and super().should_cache_request(request)
+
+    def should_cache_response(self, response, request):
+        if response.status == 200 and b"no-store" not in self._parse_cachecontrol(response):
+            return not any(marker in response.body for marker in self.ban_markers)
+        return super().should_cache_response(response, request)
+
+    def is_cached_response_fresh(self, cachedresponse, request):
+        if super().is_cached_response_fresh(cachedresponse, request):
+            return True
+        # A stale response with validators: super() has made this a conditional request
+        if b"If-None-Match" in request.headers or b"If-Modified-Since" in request.headers:
+            return False
+        return self._compute_current_age(cachedresponse, request, time.time()) < self.detail_max_age
+
+
+class LruCacheStorage:
+    """
+    Persistent, size-bounded HTTP cache storage with least-recently-used eviction.
+    - One SQLite file per spider under HTTPCACHE_DIR; bodies are zlib-compressed.
+    - When the stored size exceeds HTTPCACHE_MAX_BYTES, the least recently read or written
+      entries are evicted down to 90% of the limit.
+    - Honors HTTPCACHE_EXPIRATION_SECS like the built-in storages.
+    """
+
+    def __init__(self, settings):
+        self.cachedir = data_path(settings["HTTPCACHE_DIR"], createdir=True)
+        self.expiration_secs = settings.getint("HTTPCACHE_EXPIRATION_SECS")
+        self.max_bytes = settings.getint("HTTPCACHE_MAX_BYTES")
+        self.db = None
+        self.total_bytes = 0
+
+    def open_spider(self, spider):
+        self._fingerprinter = spider.crawler.request_fingerprinter
+        self.stats = spider.crawler.stats
+        # Autocommit + WAL: every statement is durable and several crawler nodes can share the file
+        self.db = sqlite3.connect(Path(self.cachedir, f"{spider.name}.sqlite3"), timeout=30, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "  fingerprint TEXT PRIMARY KEY, url TEXT NOT NULL, status INTEGER NOT NULL,"
+            "  headers BLOB NOT NULL, body BLOB NOT NULL, size INTEGER NOT NULL,"
+            "  stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_accessed_idx ON responses (accessed_at)")
+        self.total_bytes = self.db.execute("SELECT coalesce(sum(size), 0) FROM responses").fetchone()[0]
+        spider.logger.debug("Using LRU cache storage in %s (%d bytes)", self.cachedir, self.total_bytes)
+
+    def close_spider(self, spider):
+        self.db.close()
+
+    def retrieve_response(self, spider, request):
+        key = self._fingerprinter.fingerprint(request).hex()
+        row = self.db.execute(
+            "SELECT url, status, headers, body, stored_at FROM responses WHERE fingerprint = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            return None
+        url, status, raw_headers, body, stored_at = row
+        now = time.time()
+        if 0 < self.expiration_secs < now - stored_at:
+            return None
+        self.db.execute("UPDATE responses SET accessed_at = ? WHERE fingerprint = ?", (now, key))
+        headers = Headers(headers_raw_to_dict(raw_headers))
+        body = zlib.decompress(body)
+        respcls = responsetypes.from_args(headers=headers, url=url, body=body)
+        return respcls(url=url, headers=headers, status=status, body=body)
+
+    def store_response(self, spider, request, response):
+        key = self._fingerprinter.fingerprint(request).hex()
+        raw_headers = headers_dict_to_raw(response.headers)
+        body = zlib.compress(response.body)
+        size = len(raw_headers) + len(body)
+        now = time.time()
+        old = self.db.execute("SELECT size FROM responses WHERE fingerprint = ?", (key,)).fetchone()
+        self.db.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, response.url, response.status, raw_headers, body, size, now, now),
+        )
+        self.total_bytes += size - (old[0] if old else 0)
+        if self.total_bytes > self.max_bytes:
+            self._evict(spider)
+
+    def _evict(self, spider):
+        target = self.max_bytes * 0.9
+        while self.total_bytes > target:
+            rows = self.db.execute(
+                "SELECT fingerprint, size FROM responses ORDER BY accessed_at LIMIT 500"
+            ).fetchall()
+            if not rows:
+                self.total_bytes = 0
+                break
+            victims = []
+            for fingerprint, size in rows:
+                victims.append((fingerprint,))
+                self.total_bytes -= size
+                if self.total_bytes <= target:
+                    break
+            self.db.executemany("DELETE FROM responses WHERE fingerprint = ?", victims)
+            self.stats.inc_value("httpcache/evicted", len(victims), spider=spider)
+
+
+class AutoRiaHttpCacheMiddleware(HttpCacheMiddleware):
+    """
+    HttpCacheMiddleware that also reports httpcache/bytes_saved (body bytes not downloaded thanks
+    to fresh hits and 304 revalidations).
+    - Cached and revalidated pages are parsed like downloaded ones; the pipeline's content hash
+      then leaves unchanged cars untouched.
+    - With HTTPCACHE_SKIP_UNCHANGED (off by default) they are dropped instead. Lite-mode detail
+      requests are never dropped: they carry a card item that is only yielded by the callback.
+    """
+
+    def __init__(self, settings, stats):
+        super().__init__(settings, stats)
+        self.skip_unchanged = settings.getbool("HTTPCACHE_SKIP_UNCHANGED")
+
+    def process_request(self, request, spider):
+        cachedresponse = super().process_request(request, spider)
+        if cachedresponse is None:
+            return None
+        self.stats.inc_value("httpcache/bytes_saved", len(cachedresponse.body), spider=spider)
+        return self._unchanged(request, cachedresponse, spider)
+
+    def process_response(self, request, response, spider):
+        result = super().process_response(request, response, spider)
+        if result is not response and "cached" in result.flags:
+            # Revalidated: the cached body stands in for the (empty) 304 body
+            saved = max(len(result.body) - len(response.body), 0)
+            self.stats.inc_value("httpcache/bytes_saved", saved, spider=spider)
+            return self._unchanged(request, result, spider)
+        return result
+
+    def _unchanged(self, request, cachedresponse, spider):
+        if self.skip_unchanged and "card_item" not in request.cb_kwargs:
+            self.stats.inc_value("httpcache/skipped_unchanged", spider=spider)
+            raise IgnoreRequest(f"Unchanged since last crawl: {cachedresponse.url}")
+        return cachedresponse
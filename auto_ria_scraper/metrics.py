@@ -0,0 +1,99 @@
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+from auto_ria_scraper.utils import listing_id
+
+# Module level, so several crawls in one process (replaybench) share one set of series
+REQUEST_LATENCY = Histogram(
+    "autoria_request_latency_seconds",
+    "Download latency of crawled pages",
+    ["page"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32),
+)
+RESPONSES = Counter("autoria_responses", "Responses received", ["page", "status"])
+PARSE_SECONDS = Histogram(
+    "autoria_parse_seconds",
+    "Time a spider callback spends on one response",
+    ["callback"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+)
+ITEMS_SCRAPED = Counter("autoria_items_scraped", "Items scraped")
+PIPELINE_BATCH_ITEMS = Histogram(
+    "autoria_pipeline_batch_items",
+    "Items per batch written by PostgresPipeline",
+    buckets=(1, 10, 50, 100, 250, 500, 1000),
+)
+PIPELINE_FLUSH_SECONDS = Histogram(
+    "autoria_pipeline_flush_seconds",
+    "Time to write one batch, from COPY to commit",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+PIPELINE_ROWS = Counter("autoria_pipeline_rows", "Rows handed to the pipeline, by outcome", ["result"])
+DEDUP_HITS = Counter("autoria_dedup_hits", "New listings matched to a known vehicle by VIN, plate or photo")
+DEDUP_PHONES_REUSED = Counter("autoria_dedup_phones_reused", "New listings that took a known vehicle's phone instead of a lookup")
+PIPELINE_PENDING = Gauge("autoria_pipeline_pending_batches", "Batches queued for or being written by the writer thread")
+DB_ROUNDTRIP = Histogram(
+    "autoria_db_roundtrip_seconds",
+    "Duration of one pipeline DB statement",
+    ["statement"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+SCHEDULER_QUEUE = Gauge("autoria_scheduler_queue_depth", "Requests waiting in the Scrapy scheduler")
+DOWNLOADER_ACTIVE = Gauge("autoria_downloader_active_requests", "Requests in the downloader, queued in slots or in flight")
+
+
+class PrometheusExporter:
+    """
+    Serves crawler metrics in the Prometheus text format on http://METRICS_HOST:METRICS_PORT/metrics.
+    - Request latency and response counts come from the response_received signal; parse time,
+      pipeline batches and DB statement times are observed by CallbackTimerSpiderMiddleware
+      and PostgresPipeline.
+    - Scheduler and downloader queue depths are read when the endpoint is scraped.
+    Disabled with METRICS_ENABLED = False; a port already in use only logs a warning.
+    """
+
+    def __init__(self, crawler, host, port):
+        self.crawler = crawler
+        self.host = host
+        self.port = port
+        self.server = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("METRICS_ENABLED"):
+            raise NotConfigured
+        ext = cls(crawler, crawler.settings.get("METRICS_HOST"), crawler.settings.getint("METRICS_PORT"))
+        crawler.signals.connect(ext.engine_started, signal=signals.engine_started)
+        crawler.signals.connect(ext.engine_stopped, signal=signals.engine_stopped)
+        crawler.signals.connect(ext.response_received, signal=signals.response_received)
+        crawler.signals.connect(ext.item_scraped, signal=signals.item_scraped)
+        return ext
+
+    def engine_started(self):
+        stats = self.crawler.stats
+        SCHEDULER_QUEUE.set_function(
+            lambda: stats.get_value("scheduler/enqueued", 0) - stats.get_value("scheduler/dequeued", 0)
+        )
+        DOWNLOADER_ACTIVE.set_function(lambda: len(self.crawler.engine.downloader.active))
+        try:
+            self.server, _ = start_http_server(self.port, self.host)
+        except OSError as e:
+            self.crawler.spider.logger.warning(f"Metrics endpoint not started on {self.host}:{self.port}: {e}")
+
+    def engine_stopped(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def response_received(self, response, request, spider):
+        page = "detail" if listing_id(request.url) is not None else "search"
+        RESPONSES.labels(page, str(response.status)).inc()
+        latency = request.meta.get("download_latency")
+        # Cached responses never reach the downloader and carry no latency
+        if latency is not None:
+            REQUEST_LATENCY.labels(page).observe(latency)
+
+    def item_scraped(self, item, response, spider):
+        ITEMS_SCRAPED.inc()
@@ -3,11 +3,20 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
-from scrapy import signals
+import time
+
+from scrapy import Request, signals
+from scrapy.downloadermiddlewares.retry import get_retry_request
+from scrapy.exceptions import IgnoreRequest, NotConfigured
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
 
+from auto_ria_scraper.bloom import BloomFilter
+from auto_ria_scraper.db import get_connection
+from auto_ria_scraper.metrics import PARSE_SECONDS
+from auto_ria_scraper.utils import listing_id
+
 
 class AutoRiaScraperSpiderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
@@ -53,48 +62,301 @@ class AutoRiaScraperSpiderMiddleware:
         spider.logger.info("Spider opened: %s" % spider.name)
 
 
-class AutoRiaScraperDownloaderMiddleware:
-    # Not all methods need to be defined. If a method is not defined,
-    # scrapy acts as if the downloader middleware does not modify the
-    # passed objects.
+class SlotState:
+    """
+    Per-slot bookkeeping of AdaptiveConcurrencyMiddleware.
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.latency = None
+        self.window_responses = 0
+        self.window_latency = 0.0
+        self.last_decrease = 0.0
+
+
+class AdaptiveConcurrencyMiddleware:
+    """
+    AIMD controller for the request rate and concurrency of each download slot (per domain).
+    - The slot delay is driven as 1 / rate, bounded by ADAPTIVE_MIN_DELAY and ADAPTIVE_MAX_DELAY;
+      the starting rate comes from DOWNLOAD_DELAY.
+    - After a clean window (as many responses as the current concurrency) whose mean latency is
+      below ADAPTIVE_TARGET_LATENCY, the rate grows by ADAPTIVE_RATE_STEP requests/sec and
+      concurrency by one.
+    - Ban signals (ADAPTIVE_BAN_STATUSES, or an ADAPTIVE_BAN_MARKERS captcha marker in the
+      URL or body) multiply both by ADAPTIVE_DECREASE_FACTOR, at most once per ADAPTIVE_COOLDOWN
+      seconds, and a Retry-After header pauses the slot. Captcha'd and 403 responses are
+      retried; 429 is left to RetryMiddleware.
+    - The current state of each slot is exposed as adaptive/<slot>/* crawler stats.
+    Replaces AutoThrottle, which must stay disabled.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.min_concurrency = settings.getint("ADAPTIVE_MIN_CONCURRENCY")
+        self.max_concurrency = settings.getint("ADAPTIVE_MAX_CONCURRENCY")
+        self.min_delay = settings.getfloat("ADAPTIVE_MIN_DELAY")
+        self.max_delay = settings.getfloat("ADAPTIVE_MAX_DELAY")
+        self.rate_step = settings.getfloat("ADAPTIVE_RATE_STEP")
+        self.target_latency = settings.getfloat("ADAPTIVE_TARGET_LATENCY")
+        self.decrease_factor = settings.getfloat("ADAPTIVE_DECREASE_FACTOR")
+        self.cooldown = settings.getfloat("ADAPTIVE_COOLDOWN")
+        self.ban_statuses = {int(status) for status in settings.getlist("ADAPTIVE_BAN_STATUSES")}
+        self.ban_markers = [marker.encode() for marker in settings.getlist("ADAPTIVE_BAN_MARKERS")]
+        self.slots = {}
 
     @classmethod
     def from_crawler(cls, crawler):
-        # This method is used by Scrapy to create your spiders.
-        s = cls()
-        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
-        return s
+        if not crawler.settings.getbool("ADAPTIVE_CONCURRENCY_ENABLED"):
+            raise NotConfigured
+        if crawler.settings.getbool("AUTOTHROTTLE_ENABLED"):
+            raise NotConfigured("AdaptiveConcurrencyMiddleware and AutoThrottle both adjust slot delays")
+        return cls(crawler)
 
-    def process_request(self, request, spider):
-        # Called for each request that goes through the downloader
-        # middleware.
-
-        # Must either:
-        # - return None: continue processing this request
-        # - or return a Response object
-        # - or return a Request object
-        # - or raise IgnoreRequest: process_exception() methods of
-        #   installed downloader middleware will be called
+    def _get_slot(self, request):
+        key = request.meta.get("download_slot")
+        if key is None:
+            return None, None
+        return key, self.crawler.engine.downloader.slots.get(key)
+
+    def _get_state(self, key, slot):
+        if key not in self.slots:
+            rate = 1 / slot.delay if slot.delay else self.rate_step
+            self.slots[key] = SlotState(rate)
+            self._apply_rate(slot, self.slots[key])
+        return self.slots[key]
+
+    def _ban_reason(self, response):
+        if response.status in self.ban_statuses:
+            return str(response.status)
+        for marker in self.ban_markers:
+            if marker in response.url.encode() or marker in response.body:
+                return "captcha"
         return None
 
+    def _retry_after(self, response):
+        value = response.headers.get("Retry-After")
+        try:
+            return float(value) if value else None
+        except ValueError:
+            return None
+
     def process_response(self, request, response, spider):
-        # Called with the response returned from the downloader.
+        key, slot = self._get_slot(request)
+        if slot is None:
+            return response
+        state = self._get_state(key, slot)
+        latency = request.meta.get("download_latency")
+
+        reason = self._ban_reason(response)
+        if reason:
+            self.stats.inc_value(f"adaptive/bans/{reason}", spider=spider)
+            self._decrease(key, slot, state, spider, self._retry_after(response))
+        elif latency is not None:
+            state.latency = latency if state.latency is None else 0.8 * state.latency + 0.2 * latency
+            state.window_responses += 1
+            state.window_latency += latency
+            if state.window_responses >= slot.concurrency:
+                if state.window_latency / state.window_responses < self.target_latency:
+                    self._increase(slot, state)
+                state.window_responses = 0
+                state.window_latency = 0.0
+        self._record(key, slot, state, spider)
 
-        # Must either;
-        # - return a Response object
-        # - return a Request object
-        # - or raise IgnoreRequest
+        if reason and reason != "429":
+            # 429 is already in RETRY_HTTP_CODES; 403 and captcha pages are retried here
+            return get_retry_request(request, spider=spider, reason=f"adaptive_{reason}") or response
         return response
 
-    def process_exception(self, request, exception, spider):
-        # Called when a download handler or a process_request()
-        # (from other downloader middleware) raises an exception.
+    def _apply_rate(self, slot, state):
+        # Keep the rate inside the delay bounds so it cannot run away while the slot is capped
+        delay = min(max(1 / state.rate, self.min_delay), self.max_delay)
+        state.rate = 1 / delay if delay else state.rate
+        slot.delay = delay
 
-        # Must either:
-        # - return None: continue processing this exception
-        # - return a Response object: stops process_exception() chain
-        # - return a Request object: stops process_exception() chain
-        pass
+    def _increase(self, slot, state):
+        state.rate += self.rate_step
+        slot.concurrency = min(slot.concurrency + 1, self.max_concurrency)
+        self._apply_rate(slot, state)
+
+    def _decrease(self, key, slot, state, spider, retry_after=None):
+        # Requests sent before the last decrease keep reporting bans; only react once per cooldown
+        now = time.monotonic()
+        if now - state.last_decrease < self.cooldown:
+            return
+        state.last_decrease = now
+        state.window_responses = 0
+        state.window_latency = 0.0
+        state.rate *= self.decrease_factor
+        slot.concurrency = max(int(slot.concurrency * self.decrease_factor), self.min_concurrency)
+        self._apply_rate(slot, state)
+        if retry_after:
+            # The downloader waits `delay` after lastseen; move lastseen so the next request waits retry_after
+            slot.lastseen = max(slot.lastseen, time.time() + retry_after - slot.delay)
+        self.stats.inc_value("adaptive/decreases", spider=spider)
+        spider.logger.info(
+            "Backing off slot %s: %.1f req/s, concurrency %d", key, state.rate, slot.concurrency
+        )
+
+    def _record(self, key, slot, state, spider):
+        self.stats.set_value(f"adaptive/{key}/rate", round(state.rate, 2), spider=spider)
+        self.stats.set_value(f"adaptive/{key}/concurrency", slot.concurrency, spider=spider)
+        self.stats.set_value(f"adaptive/{key}/delay_ms", round(slot.delay * 1000), spider=spider)
+        if state.latency is not None:
+            self.stats.set_value(f"adaptive/{key}/latency_ms", round(state.latency * 1000), spider=spider)
+
+
+class IncrementalSpiderMiddleware:
+    """
+    Drops detail-page requests for listings already stored in 'cars', before they reach the downloader.
+    - Enabled with INCREMENTAL_CRAWL = True (e.g. `scrapy crawl autoriaspider -s INCREMENTAL_CRAWL=1`).
+    - Only listings a crawl saw within INCREMENTAL_FRESHNESS_DAYS ('car_urls.last_seen') are skipped,
+      so every listing is re-checked once per window.
+    - Known listing ids are kept in a set, or in a Bloom filter once there are more than
+      INCREMENTAL_BLOOM_THRESHOLD of them (a false positive only skips one listing for one run).
+    """
+
+    def __init__(self, stats, freshness_days, bloom_threshold, bloom_error_rate):
+        self.stats = stats
+        self.freshness_days = freshness_days
+        self.bloom_threshold = bloom_threshold
+        self.bloom_error_rate = bloom_error_rate
+        self.known = set()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("INCREMENTAL_CRAWL"):
+            raise NotConfigured
+        s = cls(
+            crawler.stats,
+            crawler.settings.getfloat("INCREMENTAL_FRESHNESS_DAYS", 7),
+            crawler.settings.getint("INCREMENTAL_BLOOM_THRESHOLD", 1_000_000),
+            crawler.settings.getfloat("INCREMENTAL_BLOOM_ERROR_RATE", 0.001),
+        )
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        return s
 
     def spider_opened(self, spider):
-        spider.logger.info("Spider opened: %s" % spider.name)
+        """
+        Load ids of listings seen within the freshness window.
+        A server-side cursor streams the URLs so the result set is never materialised at once.
+        """
+        where = "WHERE u.last_seen >= now() - make_interval(secs => %s)"
+        params = (self.freshness_days * 86400,)
+        conn = get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT count(*) FROM car_urls u {where}", params)
+                count = cur.fetchone()[0]
+            if count > self.bloom_threshold:
+                self.known = BloomFilter(count, self.bloom_error_rate)
+            with conn.cursor(name="incremental_known_urls") as cur:
+                cur.itersize = 50_000
+                cur.execute(
+                    f"SELECT c.url FROM car_urls u JOIN cars c ON c.id = u.car_id AND c.datetime_found = u.datetime_found {where}",
+                    params,
+                )
+                for (url,) in cur:
+                    car_id = listing_id(url)
+                    if car_id is not None:
+                        self.known.add(car_id)
+        finally:
+            conn.close()
+        self.stats.set_value("incremental/known", len(self.known), spider=spider)
+        spider.logger.info(
+            f"Incremental crawl: {len(self.known)} known listings loaded into {type(self.known).__name__}"
+        )
+
+    def _is_known(self, r, spider):
+        if not isinstance(r, Request):
+            return False
+        car_id = listing_id(r.url)
+        if car_id is None or car_id not in self.known:
+            return False
+        self.stats.inc_value("incremental/skipped", spider=spider)
+        return True
+
+    def process_spider_output(self, response, result, spider):
+        for r in result:
+            if not self._is_known(r, spider):
+                yield r
+
+    async def process_spider_output_async(self, response, result, spider):
+        async for r in result:
+            if not self._is_known(r, spider):
+                yield r
+
+
+class PaginationCutoffMiddleware:
+    """
+    Drops queued listing-page requests beyond the spider's last non-empty page.
+    The spider fans out all result pages at once; when one comes back empty it lowers
+    spider.last_page and the pages after it are cancelled here instead of being downloaded.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.stats)
+
+    def process_request(self, request, spider):
+        page = request.meta.get("listing_page")
+        last_page = getattr(spider, "last_page", None)
+        if page is not None and last_page is not None and page > last_page:
+            self.stats.inc_value("pagination/cancelled", spider=spider)
+            raise IgnoreRequest(f"Page {page} is past the last non-empty page {last_page}")
+        return None
+
+
+class CallbackTimerSpiderMiddleware:
+    """
+    Measures how long each spider callback spends producing its output.
+    Accumulates parse/<callback>/seconds and parse/<callback>/responses stats,
+    and observes each response's time in the autoria_parse_seconds histogram.
+    Must sit closest to the spider (highest order) so other middlewares are not timed.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.stats)
+
+    def _record(self, response, spider, elapsed):
+        callback = getattr(response.request.callback, "__name__", "parse") if response.request else "parse"
+        self.stats.inc_value(f"parse/{callback}/seconds", elapsed, spider=spider)
+        self.stats.inc_value(f"parse/{callback}/responses", spider=spider)
+        PARSE_SECONDS.labels(callback).observe(elapsed)
+
+    def process_spider_output(self, response, result, spider):
+        elapsed = 0.0
+        it = iter(result)
+        while True:
+            start = time.perf_counter()
+            try:
+                r = next(it)
+            except StopIteration:
+                elapsed += time.perf_counter() - start
+                break
+            elapsed += time.perf_counter() - start
+            yield r
+        self._record(response, spider, elapsed)
+
+    async def process_spider_output_async(self, response, result, spider):
+        elapsed = 0.0
+        it = result.__aiter__()
+        while True:
+            start = time.perf_counter()
+            try:
+                r = await it.__anext__()
+            except StopAsyncIteration:
+                elapsed += time.perf_counter() - start
+                break
+            elapsed += time.perf_counter() - start
+            yield r
+        self._record(response, spider, elapsed)
@@ -0,0 +1,101 @@
+import argparse
+import os
+import re
+
+from auto_ria_scraper.db import get_connection
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), "migrations")
+# Versioned migrations: NNNN_description.sql, applied once each, in order
+MIGRATION_RE = re.compile(r"^(\d{4})_(\w+)\.sql$")
+# Arbitrary constant for pg_advisory_lock, so concurrently starting containers migrate one at a time
+MIGRATE_LOCK_KEY = 4711
+
+
+def discover(path=MIGRATIONS_DIR):
+    """
+    Return the versioned migrations in `path` as a sorted list of (version, name, file path).
+    """
+    migrations = []
+    for filename in os.listdir(path):
+        match = MIGRATION_RE.match(filename)
+        if match:
+            migrations.append((match.group(1), match.group(2), os.path.join(path, filename)))
+    return sorted(migrations)
+
+
+def _read(file_path):
+    with open(file_path, encoding="utf-8") as f:
+        return f.read()
+
+
+def migrate(conn, path=MIGRATIONS_DIR, target=None, log=print):
+    """
+    Bring the database schema up to date.
+    - Applied versions are recorded in 'schema_migrations'; each pending migration runs in its own transaction.
+    - A database created from the old init.sql (a 'cars' table but no 'schema_migrations')
+      is baselined at 0001; later migrations are written to tolerate any init.sql version.
+    - Stops after `target` if given; otherwise also re-runs every repeatable/*.sql script
+      (e.g. creating upcoming partitions) after the versioned ones.
+    - Holds a session advisory lock throughout, so several nodes starting at once are safe.
+    Returns the list of versions applied.
+    """
+    applied_now = []
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATE_LOCK_KEY,))
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute(
+                "CREATE TABLE IF NOT EXISTS schema_migrations ("
+                "  version TEXT PRIMARY KEY,"
+                "  name TEXT NOT NULL,"
+                "  applied_at TIMESTAMPTZ NOT NULL DEFAULT now()"
+                ")"
+            )
+            cur.execute("SELECT version FROM schema_migrations")
+            applied = {row[0] for row in cur.fetchall()}
+            if not applied:
+                cur.execute("SELECT to_regclass('cars') IS NOT NULL")
+                if cur.fetchone()[0]:
+                    cur.execute("INSERT INTO schema_migrations (version, name) VALUES ('0001', 'baseline')")
+                    applied.add("0001")
+                    log("Existing schema found, baselined at 0001")
+
+        for version, name, file_path in discover(path):
+            if target is not None and version > target:
+                break
+            if version in applied:
+                continue
+            with conn, conn.cursor() as cur:
+                cur.execute(_read(file_path))
+                cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+            applied_now.append(version)
+            log(f"Applied {version}_{name}")
+
+        repeatable_dir = os.path.join(path, "repeatable")
+        if target is None and os.path.isdir(repeatable_dir):
+            for filename in sorted(os.listdir(repeatable_dir)):
+                if filename.endswith(".sql"):
+                    with conn, conn.cursor() as cur:
+                        cur.execute(_read(os.path.join(repeatable_dir, filename)))
+    finally:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATE_LOCK_KEY,))
+        conn.commit()
+    return applied_now
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply pending database migrations")
+    parser.add_argument("--target", help="stop after this version (e.g. 0004)")
+    args = parser.parse_args()
+
+    conn = get_connection()
+    try:
+        applied = migrate(conn, target=args.target)
+    finally:
+        conn.close()
+    print(f"Schema up to date ({len(applied)} migrations applied)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+-- Phone job bookkeeping: attempts used, when the job is next due, and the current worker lease
+ALTER TABLE cars
+    ADD COLUMN IF NOT EXISTS phone_attempts INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS phone_next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    ADD COLUMN IF NOT EXISTS phone_lease_expires_at TIMESTAMPTZ;
+
+-- Claim index: only non-terminal jobs, ordered by due time, so claiming is a short range scan
+CREATE INDEX IF NOT EXISTS cars_phone_due_idx ON cars (phone_next_attempt_at)
+    WHERE phone_status IN ('pending', 'error', 'in_progress');
@@ -0,0 +1,10 @@
+-- Price-band shards of the search, claimed by crawler nodes in sharded mode (-a shards=1)
+CREATE TABLE IF NOT EXISTS crawl_shards (
+    id SERIAL PRIMARY KEY,
+    price_min INTEGER NOT NULL,
+    price_max INTEGER,
+    status VARCHAR(16) NOT NULL DEFAULT 'pending',
+    claimed_by TEXT,
+    claimed_at TIMESTAMPTZ,
+    result_count INTEGER
+);
@@ -0,0 +1,23 @@
+-- Hash of the tracked fields (pipelines.TRACKED_COLUMNS) and when they last changed
+ALTER TABLE cars
+    ADD COLUMN IF NOT EXISTS content_hash BIGINT,
+    ADD COLUMN IF NOT EXISTS content_changed_at TIMESTAMPTZ;
+
+-- URL lookups also carry the content hash, so the pipeline can tell unchanged listings
+-- apart with an index-only probe, without touching (or locking) the table rows
+ALTER TABLE cars DROP CONSTRAINT IF EXISTS cars_url_key;
+DROP INDEX IF EXISTS cars_url_key;
+CREATE UNIQUE INDEX cars_url_key ON cars (url) INCLUDE (content_hash);
+
+-- Append-only history of tracked listing fields: each row is a version replaced by a later crawl
+CREATE TABLE IF NOT EXISTS cars_history (
+    id BIGSERIAL PRIMARY KEY,
+    car_id INTEGER NOT NULL REFERENCES cars (id) ON DELETE CASCADE,
+    price_usd INTEGER,
+    odometer INTEGER,
+    content_hash BIGINT NOT NULL,
+    valid_from TIMESTAMPTZ,
+    valid_to TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS cars_history_car_idx ON cars_history (car_id, valid_to);
@@ -0,0 +1,111 @@
+-- Partition 'cars' by month of datetime_found (now TIMESTAMPTZ) and move URL uniqueness to 'car_urls'.
+-- A partitioned table can only enforce uniqueness on keys that include the partition key, so the
+-- global URL registry (with the content hash used for change detection) is a separate table keyed
+-- by the 16-byte md5 of the URL instead of the full URL text.
+
+ALTER TABLE cars RENAME TO cars_legacy;
+ALTER SEQUENCE cars_id_seq OWNED BY NONE;
+-- cars(id) is no longer unique on its own, so history rows cannot reference it
+ALTER TABLE cars_history DROP CONSTRAINT IF EXISTS cars_history_car_id_fkey;
+
+CREATE TABLE cars (
+    id INTEGER NOT NULL DEFAULT nextval('cars_id_seq'),
+    url TEXT NOT NULL,
+    title TEXT,
+    price_usd INTEGER,
+    odometer INTEGER,
+    username TEXT,
+    phone_number TEXT,
+    image_url TEXT,
+    images_count INTEGER,
+    car_number TEXT,
+    car_vin TEXT,
+    datetime_found TIMESTAMPTZ NOT NULL DEFAULT now(),
+    phone_status VARCHAR(16) DEFAULT 'pending',
+    -- Phone job bookkeeping: attempts used, when the job is next due, and the current worker lease
+    phone_attempts INTEGER NOT NULL DEFAULT 0,
+    phone_next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    phone_lease_expires_at TIMESTAMPTZ,
+    -- When the tracked fields last changed (the replaced values are in cars_history)
+    content_changed_at TIMESTAMPTZ
+) PARTITION BY RANGE (datetime_found);
+
+-- Catches rows outside every monthly partition, so an insert never fails for a missing month
+CREATE TABLE cars_default PARTITION OF cars DEFAULT;
+
+-- Create the monthly partitions (cars_yYYYYmMM, UTC months) from first_month up to months_ahead
+-- months after the current one and return how many were created. A month that already has rows
+-- in cars_default is skipped: its partition can only be attached after moving those rows.
+CREATE FUNCTION ensure_cars_partitions(first_month TIMESTAMPTZ, months_ahead INTEGER)
+RETURNS INTEGER
+LANGUAGE plpgsql
+SET TimeZone = 'UTC'
+AS $$
+DECLARE
+    month_start TIMESTAMPTZ := date_trunc('month', first_month);
+    last_month TIMESTAMPTZ := date_trunc('month', now()) + make_interval(months => months_ahead);
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    WHILE month_start <= last_month LOOP
+        partition_name := 'cars_y' || to_char(month_start, 'YYYY"m"MM');
+        IF to_regclass(partition_name) IS NULL THEN
+            BEGIN
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF cars FOR VALUES FROM (%L) TO (%L)',
+                    partition_name, month_start, month_start + interval '1 month'
+                );
+                created := created + 1;
+            EXCEPTION WHEN check_violation THEN
+                RAISE WARNING 'cars_default holds rows for %, partition % not created', month_start, partition_name;
+            END;
+        END IF;
+        month_start := month_start + interval '1 month';
+    END LOOP;
+    RETURN created;
+END;
+$$;
+
+-- The spider wrote Kyiv time (+03:00) into the old TIMESTAMP column, which dropped the offset
+SELECT ensure_cars_partitions(
+    coalesce((SELECT min(datetime_found) FROM cars_legacy) AT TIME ZONE INTERVAL '+03:00', now()), 12
+);
+
+INSERT INTO cars (
+    id, url, title, price_usd, odometer, username, phone_number, image_url, images_count,
+    car_number, car_vin, datetime_found, phone_status, phone_attempts, phone_next_attempt_at,
+    phone_lease_expires_at, content_changed_at
+)
+SELECT
+    id, url, title, price_usd, odometer, username, phone_number, image_url, images_count,
+    car_number, car_vin, coalesce(datetime_found AT TIME ZONE INTERVAL '+03:00', now()), phone_status,
+    phone_attempts, phone_next_attempt_at, phone_lease_expires_at, content_changed_at
+FROM cars_legacy;
+
+-- Global URL registry: one row per listing, pointing at its (id, datetime_found) in 'cars'.
+-- The content hash rides along in the primary key index for index-only change checks.
+CREATE TABLE car_urls (
+    url_hash UUID NOT NULL,
+    car_id INTEGER NOT NULL,
+    datetime_found TIMESTAMPTZ NOT NULL,
+    content_hash BIGINT,
+    CONSTRAINT car_urls_pkey PRIMARY KEY (url_hash) INCLUDE (content_hash)
+);
+
+INSERT INTO car_urls (url_hash, car_id, datetime_found, content_hash)
+SELECT md5(url)::uuid, id, coalesce(datetime_found AT TIME ZONE INTERVAL '+03:00', now()), content_hash
+FROM cars_legacy
+ON CONFLICT DO NOTHING;
+
+DROP TABLE cars_legacy;
+ALTER SEQUENCE cars_id_seq OWNED BY cars.id;
+
+-- Indexes are built after the copy, and cascade to every current and future partition
+ALTER TABLE cars ADD CONSTRAINT cars_pkey PRIMARY KEY (id, datetime_found);
+CREATE INDEX cars_phone_due_idx ON cars (phone_next_attempt_at)
+    WHERE phone_status IN ('pending', 'error', 'in_progress');
+-- Leased jobs only, so sweeping expired leases does not walk every due pending job
+CREATE INDEX cars_phone_lease_idx ON cars (phone_lease_expires_at) WHERE phone_status = 'in_progress';
+CREATE INDEX cars_price_idx ON cars (price_usd);
+-- Rows arrive roughly in datetime_found order, so a BRIN index covers time ranges in a few pages
+CREATE INDEX cars_found_idx ON cars USING brin (datetime_found);
@@ -0,0 +1,3 @@
+-- Worker holding a phone job's lease (host:pid), so a supervisor can hand back a dead worker's
+-- jobs at once instead of waiting for their leases to expire
+ALTER TABLE cars ADD COLUMN IF NOT EXISTS phone_claimed_by TEXT;
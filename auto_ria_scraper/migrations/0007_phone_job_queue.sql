@@ -0,0 +1,41 @@
+-- Move the phone job queue out of 'cars' into a small dedicated table.
+-- The pipeline enqueues a row in the same statement that inserts the car; workers lease rows
+-- with SKIP LOCKED and acknowledge a finished job by deleting it. Claims and retries no longer
+-- write to the partitioned 'cars' table, which only receives the final result.
+CREATE TABLE phone_jobs (
+    car_id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    -- Copied from the car, so the result update can be pruned to its partition
+    datetime_found TIMESTAMPTZ NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    -- While leased, mirrors the lease expiry, so a single index finds due and abandoned jobs
+    next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    lease_expires_at TIMESTAMPTZ,
+    claimed_by TEXT
+) WITH (
+    -- Every row is updated and deleted within minutes: vacuum early to keep the table small
+    autovacuum_vacuum_scale_factor = 0.01,
+    autovacuum_vacuum_insert_scale_factor = 0.01
+);
+
+CREATE INDEX phone_jobs_due_idx ON phone_jobs (next_attempt_at);
+CREATE INDEX phone_jobs_lease_idx ON phone_jobs (lease_expires_at) WHERE lease_expires_at IS NOT NULL;
+
+INSERT INTO phone_jobs (car_id, url, datetime_found, attempts, next_attempt_at, lease_expires_at, claimed_by)
+SELECT id, url, datetime_found, phone_attempts, phone_next_attempt_at, phone_lease_expires_at, phone_claimed_by
+FROM cars
+WHERE phone_status IN ('pending', 'error', 'in_progress')
+ON CONFLICT DO NOTHING;
+
+-- 'cars' keeps the outcome only: pending until the queue acknowledges the job, then success or failed
+UPDATE cars SET phone_status = 'pending' WHERE phone_status IN ('error', 'in_progress');
+
+DROP INDEX IF EXISTS cars_phone_due_idx;
+DROP INDEX IF EXISTS cars_phone_lease_idx;
+ALTER TABLE cars
+    DROP COLUMN IF EXISTS phone_attempts,
+    DROP COLUMN IF EXISTS phone_next_attempt_at,
+    DROP COLUMN IF EXISTS phone_lease_expires_at,
+    DROP COLUMN IF EXISTS phone_claimed_by,
+    -- When the phone job was acknowledged; minus datetime_found, the discovery-to-phone latency
+    ADD COLUMN IF NOT EXISTS phone_checked_at TIMESTAMPTZ;
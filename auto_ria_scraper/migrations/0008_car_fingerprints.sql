@@ -0,0 +1,83 @@
+-- Cross-listing deduplication: the same vehicle reposted under another URL is recognised by its
+-- VIN, its plate number or its main photo, linked to the first listing of that vehicle, and
+-- reuses that listing's phone number instead of queueing another phone lookup.
+
+-- Uppercase, drop spaces and dashes, and map Cyrillic letters that look like Latin ones
+-- (sellers type either). Partially masked or malformed values give NULL and are never matched.
+-- Single expressions, so the planner inlines them into the pipeline's merge.
+CREATE FUNCTION normalize_vin(vin TEXT) RETURNS TEXT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT substring(
+        upper(translate(regexp_replace(vin, '[\s-]', '', 'g'), 'АВЕКМНОРСТХІУавекмнорстхіу', 'ABEKMHOPCTXIYabekmhopctxiy'))
+        FROM '^[A-HJ-NPR-Z0-9]{17}$'
+    )
+$$;
+
+-- 4 to 10 letters and digits, at least one digit
+CREATE FUNCTION normalize_plate(plate TEXT) RETURNS TEXT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT substring(
+        upper(translate(regexp_replace(plate, '[\s-]', '', 'g'), 'АВЕКМНОРСТХІУавекмнорстхіу', 'ABEKMHOPCTXIYabekmhopctxiy'))
+        FROM '^(?=.*[0-9])[A-Z0-9]{4,10}$'
+    )
+$$;
+
+-- The photo id of a riastatic.com image URL (".../photosnew/auto/photo/audi_a6__560563454fx.webp"
+-- -> 560563454): the same photo is served from several cdn hosts, sizes and formats.
+-- Placeholders and other images give NULL.
+CREATE FUNCTION photo_id(image_url TEXT) RETURNS TEXT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT (regexp_match(image_url, '^https?://[^/]*riastatic\.com/.*?(\d{5,})[a-z]*\.(?:jpe?g|webp|png)$', 'i'))[1]
+$$;
+
+-- The fingerprints of a listing, most reliable first
+CREATE FUNCTION vehicle_keys(vin TEXT, plate TEXT, image_url TEXT)
+RETURNS TABLE (priority INTEGER, fingerprint UUID)
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT k.priority, md5(k.prefix || k.value)::uuid
+    FROM (VALUES
+        (1, 'vin:', normalize_vin(vin)),
+        (2, 'plate:', normalize_plate(plate)),
+        (3, 'photo:', photo_id(image_url))
+    ) k (priority, prefix, value)
+    WHERE k.value IS NOT NULL
+$$;
+
+-- Fingerprint -> the first listing of the vehicle, keyed by md5 like 'car_urls'
+CREATE TABLE car_fingerprints (
+    fingerprint UUID PRIMARY KEY,
+    car_id INTEGER NOT NULL,
+    -- The listing's partition key, so its row in 'cars' is found with partition pruning
+    datetime_found TIMESTAMPTZ NOT NULL
+);
+
+-- Reposts point at the first listing of the vehicle
+ALTER TABLE cars ADD COLUMN IF NOT EXISTS duplicate_of INTEGER;
+CREATE INDEX cars_duplicate_of_idx ON cars (duplicate_of) WHERE duplicate_of IS NOT NULL;
+
+-- Backfill oldest first, so the first listing of each vehicle wins every fingerprint
+INSERT INTO car_fingerprints (fingerprint, car_id, datetime_found)
+SELECT k.fingerprint, c.id, c.datetime_found
+FROM cars c CROSS JOIN LATERAL vehicle_keys(c.car_vin, c.car_number, c.image_url) k
+ORDER BY c.datetime_found, c.id
+ON CONFLICT DO NOTHING;
+
+UPDATE cars c SET duplicate_of = m.car_id
+FROM (
+    SELECT DISTINCT ON (c.id) c.id, c.datetime_found, f.car_id
+    FROM cars c
+    CROSS JOIN LATERAL vehicle_keys(c.car_vin, c.car_number, c.image_url) k
+    JOIN car_fingerprints f ON f.fingerprint = k.fingerprint
+    WHERE f.car_id <> c.id
+    ORDER BY c.id, k.priority
+) m
+WHERE c.id = m.id AND c.datetime_found = m.datetime_found;
+
+-- Queued reposts of vehicles whose phone is already known need no lookup
+WITH reused AS (
+    UPDATE cars d SET phone_number = c.phone_number, phone_status = 'success', phone_checked_at = now()
+    FROM cars c
+    WHERE d.duplicate_of = c.id AND d.phone_status = 'pending' AND c.phone_status = 'success'
+    RETURNING d.id
+)
+DELETE FROM phone_jobs WHERE car_id IN (SELECT id FROM reused);
@@ -0,0 +1,3 @@
+-- Phone numbers are stored in E.164 ("+380671234567"). Values that cannot be normalized keep
+-- their raw text and are flagged: 'masked' (digits hidden, queued for a new lookup) or 'invalid'.
+ALTER TABLE cars ADD COLUMN IF NOT EXISTS phone_flag VARCHAR(16);
@@ -0,0 +1,5 @@
+-- When a crawl last saw each listing. datetime_found is the first-seen time and never moves, so
+-- the incremental crawl decides freshness on this column instead.
+ALTER TABLE car_urls ADD COLUMN last_seen TIMESTAMPTZ;
+UPDATE car_urls SET last_seen = datetime_found;
+ALTER TABLE car_urls ALTER COLUMN last_seen SET DEFAULT now(), ALTER COLUMN last_seen SET NOT NULL;
@@ -0,0 +1,6 @@
+-- When an exported column of a car (price, mileage, phone number or status) last changed after
+-- the row was inserted, so the incremental export can pick up rows it already wrote. NULL until
+-- the first such update: inserts skip the partial index. Not backfilled; updates made before
+-- this migration only reach the exports through a full export.
+ALTER TABLE cars ADD COLUMN updated_at TIMESTAMPTZ;
+CREATE INDEX cars_updated_at_idx ON cars (updated_at) WHERE updated_at IS NOT NULL;
@@ -0,0 +1,2 @@
+-- Keep a year of monthly partitions ahead of the current month
+SELECT ensure_cars_partitions(now(), 12);
@@ -1,86 +1,409 @@
-import os
-from psycopg2.extras import execute_values
-from datetime import datetime
-import psycopg2
-
-# Read database configuration from environment variables (or set defaults)
-db_name = os.getenv("DB_NAME", "autodb")
-db_user = os.getenv("DB_USER", "autoria")
-db_pass = os.getenv("DB_PASS", "autoria")
-db_host = os.getenv("DB_HOST", "postgres")
-db_port = int(os.getenv("DB_PORT", 5432))
+import csv
+import hashlib
+import io
+import re
+import time
+from collections import deque
+from datetime import datetime, timezone
+from twisted.internet import defer, task, threads
+from twisted.python.threadpool import ThreadPool
+
+from auto_ria_scraper.db import get_connection
+from auto_ria_scraper.metrics import (
+    DB_ROUNDTRIP,
+    DEDUP_HITS,
+    DEDUP_PHONES_REUSED,
+    PIPELINE_BATCH_ITEMS,
+    PIPELINE_FLUSH_SECONDS,
+    PIPELINE_PENDING,
+    PIPELINE_ROWS,
+)
+
+# Columns written by the spider (phone_number is filled in later by the Selenium parser)
+COLUMNS = (
+    "url", "title", "price_usd", "odometer", "username", "image_url",
+    "images_count", "car_number", "car_vin", "datetime_found",
+)
+
+# Columns of the COPY into the staging table: the item, then the hashes computed in Python
+# (the URL's md5 is a generated column of the staging table, computed by the server during COPY)
+STAGING_COLUMNS = COLUMNS + ("content_hash", "vin_key", "plate_key", "photo_key")
+
+# Fields whose changes are kept in 'cars_history' (price drops, mileage corrections)
+TRACKED_COLUMNS = ("price_usd", "odometer")
+
+# An unchanged listing's car_urls.last_seen is refreshed when older than this
+LAST_SEEN_DUE = "now() - interval '1 hour'"
+
+# New tracked values of the changed listings of a batch, by car id, partition key and URL md5.
+# A separate statement: unnest() of the keys has a known row count, so 'cars' is probed by its
+# primary key instead of being hashed whole as it would be from a join with the merge's CTEs.
+UPDATE_SQL = (
+    f"UPDATE cars c SET {', '.join(f'{col} = s.{col}' for col in TRACKED_COLUMNS)}, content_changed_at = now(), updated_at = now() "
+    f"FROM unnest(%s::integer[], %s::timestamptz[], %s::uuid[]) k (car_id, datetime_found, url_hash) "
+    f"JOIN cars_staging s ON s.url_hash = k.url_hash "
+    f"WHERE c.id = k.car_id AND c.datetime_found = k.datetime_found"
+)
+
+
+def content_hash(item):
+    """
+    Compact 64-bit hash of an item's tracked fields, stored as BIGINT in car_urls.content_hash.
+    """
+    raw = "\x1f".join("" if item.get(col) is None else str(item.get(col)) for col in TRACKED_COLUMNS)
+    return int.from_bytes(hashlib.blake2b(raw.encode(), digest_size=8).digest(), "big", signed=True)
+
+
+# Python twins of the SQL functions of migration 0008 (normalize_vin, normalize_plate, photo_id,
+# vehicle_keys), which remain for backfills; fingerprints of new items are computed here, since
+# evaluating those regular expressions per row dominated the cost of the merge
+SEPARATORS_RE = re.compile(r"[\s-]")
+CYRILLIC_LOOKALIKES = str.maketrans("АВЕКМНОРСТХІУавекмнорстхіу", "ABEKMHOPCTXIYabekmhopctxiy")
+VIN_RE = re.compile(r"[A-HJ-NPR-Z0-9]{17}")
+PLATE_RE = re.compile(r"(?=.*[0-9])[A-Z0-9]{4,10}")
+PHOTO_ID_RE = re.compile(r"https?://[^/]*riastatic\.com/.*?(\d{5,})[a-z]*\.(?:jpe?g|webp|png)", re.IGNORECASE)
+
+
+def _normalize(value, pattern):
+    if not value:
+        return None
+    value = SEPARATORS_RE.sub("", value).translate(CYRILLIC_LOOKALIKES).upper()
+    return value if pattern.fullmatch(value) else None
+
+
+def vehicle_keys(item):
+    """
+    Fingerprints of an item as (VIN, plate, photo) md5 hex digests (UUID input), None where the
+    value is missing or malformed; the same values as the SQL vehicle_keys() function.
+    """
+    photo = PHOTO_ID_RE.fullmatch(item.get("image_url") or "")
+    values = (
+        ("vin:", _normalize(item.get("car_vin"), VIN_RE)),
+        ("plate:", _normalize(item.get("car_number"), PLATE_RE)),
+        ("photo:", photo and photo.group(1)),
+    )
+    return tuple(
+        None if value is None else hashlib.md5((prefix + value).encode()).hexdigest()
+        for prefix, value in values
+    )
+
 
 class PostgresPipeline:
     """
     Pipeline to save scraped items to PostgreSQL in batches.
+    - Batches are streamed with COPY into a staging table and merged into 'cars' with one prepared
+      statement; listings whose tracked fields changed are updated by a second, keyed statement.
+    - URLs are deduplicated through the 'car_urls' registry ('cars' is partitioned and cannot
+      enforce a global unique URL).
+    - Known listings whose tracked fields changed are updated and their previous values
+      appended to 'cars_history'; unchanged ones are skipped by comparing content hashes.
+    - New cars are handed to the phone workers through the 'phone_jobs' queue in the same statement,
+      except reposts of a vehicle whose phone number is already known from the same seller
+      (see 'car_fingerprints').
+    - Writes run on a dedicated single-thread pool so the Twisted reactor never blocks on the DB.
+    - At most max_pending batches may be queued for writing; beyond that, process_item
+      returns a Deferred that holds the item until the oldest batch is written, which
+      throttles the crawl through Scrapy's scraper slot limits.
     """
 
+    def __init__(self, batch_size=2000, flush_interval=5.0, max_pending=4, stats=None, phone_reuse_days=30):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.stats = stats
+        self.phone_reuse_days = phone_reuse_days
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        """
+        Build the pipeline with flush thresholds from the crawler settings.
+        """
+        return cls(
+            batch_size=crawler.settings.getint("PIPELINE_BATCH_MAX_ITEMS", 2000),
+            flush_interval=crawler.settings.getfloat("PIPELINE_FLUSH_INTERVAL", 5.0),
+            max_pending=crawler.settings.getint("PIPELINE_MAX_PENDING_BATCHES", 4),
+            stats=crawler.stats,
+            phone_reuse_days=crawler.settings.getint("DEDUP_PHONE_REUSE_DAYS", 30),
+        )
+
+    def connect(self):
+        """
+        Open the database connection and create the session-private staging table used by COPY.
+        """
+        self.conn = get_connection()
+        self.cur = self.conn.cursor()
+        # Temporary tables are never WAL-logged (like UNLOGGED ones) and are private to this
+        # connection, so concurrent crawlers cannot see each other's staged rows.
+        # ON COMMIT DELETE ROWS empties it after every merge without an explicit TRUNCATE.
+        self.cur.execute(
+            f"CREATE TEMP TABLE cars_staging ON COMMIT DELETE ROWS AS "
+            f"SELECT {', '.join(COLUMNS)}, NULL::bigint AS content_hash,"
+            f"  NULL::uuid AS vin_key, NULL::uuid AS plate_key, NULL::uuid AS photo_key FROM cars WITH NO DATA"
+        )
+        self.cur.execute("ALTER TABLE cars_staging ADD url_hash uuid GENERATED ALWAYS AS (md5(url)::uuid) STORED")
+        # Planned once per connection instead of once per batch
+        self.cur.execute(f"PREPARE merge_batch AS {self.merge_sql()}")
+        self.conn.commit()
+
+    def merge_sql(self):
+        """
+        The statement that merges the staged batch (see save_items).
+        - Every CTE sees the same snapshot, so 'old' holds the values from before the merge.
+        - Lookups in the registries and in 'cars' are LATERAL ... LIMIT 1 subqueries, which keeps
+          them index probes per staged row: for a batch of a few hundred rows the planner would
+          otherwise often hash a whole table, and a merge would get slower as the tables grow.
+        """
+        columns = ", ".join(COLUMNS)
+        tracked = ", ".join(TRACKED_COLUMNS)
+        return (
+            f"WITH batch AS ("
+            f"  SELECT s.*, u.car_id AS known_id,"
+            f"         u.datetime_found AS known_found, u.content_hash AS known_hash"
+            f"  FROM cars_staging s LEFT JOIN LATERAL ("
+            f"    SELECT car_id, datetime_found, content_hash, last_seen FROM car_urls WHERE url_hash = s.url_hash LIMIT 1"
+            f"  ) u ON true"
+            # Rows whose URL and hash are already registered are dropped here, unless their
+            # last_seen is due for a refresh (at most hourly, so a repeated crawl stays read-only)
+            f"  WHERE u.content_hash IS DISTINCT FROM s.content_hash OR u.last_seen < {LAST_SEEN_DUE}"
+            f"), old AS ("
+            f"  SELECT b.known_id AS car_id, b.known_found AS datetime_found, b.url_hash,"
+            f"         {', '.join(f'c.{col}' for col in TRACKED_COLUMNS)}, b.known_hash AS content_hash, c.valid_from"
+            f"  FROM batch b CROSS JOIN LATERAL ("
+            f"    SELECT {tracked}, coalesce(content_changed_at, datetime_found) AS valid_from FROM cars"
+            f"    WHERE id = b.known_id AND datetime_found = b.known_found LIMIT 1"
+            f"  ) c"
+            f"  WHERE b.known_hash <> b.content_hash"
+            # Known URLs propose their registered id, so only new ones draw from cars_id_seq:
+            # a changed listing re-crawled every day would otherwise burn an INTEGER id per visit
+            f"), registered AS ("
+            f"  INSERT INTO car_urls (url_hash, car_id, datetime_found, content_hash)"
+            f"  SELECT url_hash, coalesce(known_id, nextval('cars_id_seq')), datetime_found, content_hash FROM batch"
+            f"  ON CONFLICT (url_hash) DO UPDATE SET content_hash = EXCLUDED.content_hash, last_seen = now()"
+            f"  WHERE car_urls.content_hash IS DISTINCT FROM EXCLUDED.content_hash OR car_urls.last_seen < {LAST_SEEN_DUE}"
+            f"  RETURNING url_hash, car_id, datetime_found, (xmax = 0) AS inserted"
+            f"), keys AS ("
+            f"  SELECT r.url_hash, r.car_id, r.datetime_found, b.username, k.priority, k.fingerprint"
+            f"  FROM registered r JOIN batch b ON b.url_hash = r.url_hash"
+            f"  CROSS JOIN LATERAL (VALUES (1, b.vin_key), (2, b.plate_key), (3, b.photo_key)) k (priority, fingerprint)"
+            f"  WHERE r.inserted AND k.fingerprint IS NOT NULL"
+            f"), matched AS ("
+            f"  SELECT DISTINCT ON (k.url_hash) k.url_hash, f.car_id, f.datetime_found, c.phone_number"
+            f"  FROM keys k CROSS JOIN LATERAL ("
+            f"    SELECT car_id, datetime_found FROM car_fingerprints WHERE fingerprint = k.fingerprint LIMIT 1"
+            f"  ) f"
+            # A resold vehicle keeps its fingerprints but not its seller: reuse the phone only
+            # from the same seller, or from a recent listing when the seller is unknown
+            f"  LEFT JOIN LATERAL ("
+            f"    SELECT phone_number FROM cars c WHERE c.id = f.car_id AND c.datetime_found = f.datetime_found"
+            f"      AND c.phone_status = 'success' AND c.phone_flag IS NULL"
+            f"      AND (c.username = k.username OR ((c.username IS NULL OR k.username IS NULL)"
+            f"        AND c.datetime_found > k.datetime_found - make_interval(days => {int(self.phone_reuse_days)})))"
+            f"    LIMIT 1"
+            f"  ) c ON true"
+            f"  ORDER BY k.url_hash, k.priority"
+            f"), fingerprinted AS ("
+            f"  INSERT INTO car_fingerprints (fingerprint, car_id, datetime_found)"
+            f"  SELECT k.fingerprint, coalesce(m.car_id, k.car_id), coalesce(m.datetime_found, k.datetime_found)"
+            f"  FROM keys k LEFT JOIN matched m ON m.url_hash = k.url_hash"
+            f"  ON CONFLICT DO NOTHING"
+            f"), inserted AS ("
+            f"  INSERT INTO cars (id, {columns}, duplicate_of, phone_number, phone_status, phone_checked_at)"
+            f"  SELECT r.car_id, {', '.join(f'b.{col}' for col in COLUMNS[:-1])}, r.datetime_found,"
+            f"         m.car_id, m.phone_number, CASE WHEN m.phone_number IS NULL THEN 'pending' ELSE 'success' END,"
+            f"         CASE WHEN m.phone_number IS NOT NULL THEN now() END"
+            f"  FROM registered r JOIN batch b ON b.url_hash = r.url_hash"
+            f"  LEFT JOIN matched m ON m.url_hash = r.url_hash WHERE r.inserted"
+            f"  RETURNING id, url, datetime_found, duplicate_of, phone_status"
+            f"), queued AS ("
+            f"  INSERT INTO phone_jobs (car_id, url, datetime_found)"
+            f"  SELECT id, url, datetime_found FROM inserted WHERE phone_status = 'pending'"
+            f"), history AS ("
+            f"  INSERT INTO cars_history (car_id, {tracked}, content_hash, valid_from)"
+            f"  SELECT old.car_id, {', '.join(f'old.{col}' for col in TRACKED_COLUMNS)}, old.content_hash, old.valid_from"
+            f"  FROM old JOIN registered r ON r.car_id = old.car_id AND NOT r.inserted"
+            f") "
+            # Changed listings are updated by save_items with a second statement (see UPDATE_SQL)
+            f"SELECT (SELECT count(*) FROM inserted),"
+            f"       (SELECT count(*) FROM inserted WHERE duplicate_of IS NOT NULL),"
+            f"       (SELECT count(*) FROM inserted WHERE phone_status = 'pending'),"
+            f"       array_agg(old.car_id), array_agg(old.datetime_found), array_agg(old.url_hash::text)"
+            f"FROM old JOIN registered r ON r.car_id = old.car_id AND NOT r.inserted"
+        )
+
+    def close(self):
+        """
+        Close the cursor and the connection.
+        """
+        self.cur.close()
+        self.conn.close()
+
     def open_spider(self, spider):
         """
         Called when the spider is opened.
         - Opens a database connection.
-        - Prepares a cursor and initializes the items buffer.
-        """
-        self.conn = psycopg2.connect(
-            dbname=db_name,
-            user=db_user,
-            password=db_pass,
-            host=db_host,
-            port=db_port,
-        )
-        self.cur = self.conn.cursor()
+        - Starts the writer thread and the timer that flushes idle buffers.
+        - Initializes the items buffer.
+        """
+        self.spider = spider
+        self.connect()
         self.items = []
+        self.first_buffered_at = None
+        self.pending = deque()
+        # One thread: psycopg2 connections must not be used concurrently, and it keeps batches ordered
+        self.pool = ThreadPool(minthreads=1, maxthreads=1, name="PostgresPipeline")
+        self.pool.start()
+        self.flusher = task.LoopingCall(self.flush_if_due)
+        self.flusher.start(self.flush_interval, now=False)
 
     def close_spider(self, spider):
         """
         Called when the spider is closed.
-        - Saves any remaining items that have not yet been inserted.
-        - Closes the cursor and the connection.
+        - Hands any remaining items to the writer.
+        - Waits for every queued batch to be written, then stops the writer
+          and closes the connection.
         """
+        self.flusher.stop()
         if self.items:
-            self.save_items()
-        self.cur.close()
-        self.conn.close()
+            self.flush()
+        d = defer.DeferredList(list(self.pending))
+        d.addBoth(self._shutdown)
+        return d
+
+    def _shutdown(self, _):
+        self.pool.stop()
+        self.close()
 
     def process_item(self, item, spider):
         """
         Called for every item pipeline component.
         - Adds the item to a buffer.
-        - Once the buffer reaches 100 items, saves all at once to the database.
+        - Flushes the buffer once it holds batch_size items or its oldest item
+          has waited flush_interval seconds, whichever comes first.
+        - Applies backpressure when too many batches are waiting to be written.
         """
+        if not self.items:
+            self.first_buffered_at = time.monotonic()
         self.items.append(item)
-        if len(self.items) >= 100:
-            self.save_items()
-            self.items = []
+        self.flush_if_due()
+        if len(self.pending) > self.max_pending:
+            return self._wait_for_oldest(item)
         return item
 
-    def save_items(self):
-        """
-        Bulk-inserts all buffered items into the 'cars' table.
-        - Uses ON CONFLICT DO NOTHING to avoid inserting duplicate URLs.
-        - Inserts all columns scraped by the spider (except phone_number, which is set to None here and updated later).
-        """
-        sql = """
-        INSERT INTO cars
-        (url, title, price_usd, odometer, username, phone_number, image_url, images_count, car_number, car_vin, datetime_found)
-        VALUES %s
-        ON CONFLICT (url) DO NOTHING
-        """
-        values = [
-            (
-                i.get("url"),
-                i.get("title"),
-                i.get("price_usd"),
-                i.get("odometer"),
-                i.get("username"),
-                None,  # phone_number is set by Selenium parser later
-                i.get("image_url"),
-                i.get("images_count"),
-                i.get("car_number"),
-                i.get("car_vin"),
-                i.get("datetime_found") or datetime.now()
+    def flush_if_due(self):
+        """
+        Flush the buffer if it reached either threshold.
+        """
+        if self.items and (
+            len(self.items) >= self.batch_size
+            or time.monotonic() - self.first_buffered_at >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self):
+        """
+        Hand the buffered items to the writer thread and return the Deferred of the write.
+        """
+        # Imported here so the pipeline module never installs a reactor before Scrapy does
+        from twisted.internet import reactor
+
+        batch, self.items = self.items, []
+        d = threads.deferToThreadPool(reactor, self.pool, self.save_items, batch)
+        self.pending.append(d)
+        PIPELINE_PENDING.set(len(self.pending))
+        d.addBoth(self._batch_done, d)
+        d.addCallback(self._record_write, len(batch))
+        d.addErrback(
+            lambda failure: self.spider.logger.error(f"Failed to save {len(batch)} items: {failure.value}")
+        )
+        return d
+
+    def _batch_done(self, result, d):
+        self.pending.remove(d)
+        PIPELINE_PENDING.set(len(self.pending))
+        return result
+
+    def _record_write(self, result, rows):
+        # Runs on the reactor thread, so the stats collector is never touched concurrently
+        seconds, inserted, changed, duplicates, phones_reused = result
+        if self.stats is not None:
+            self.stats.inc_value("pipeline/rows_written", rows)
+            self.stats.inc_value("pipeline/rows_inserted", inserted)
+            self.stats.inc_value("pipeline/rows_changed", changed)
+            self.stats.inc_value("dedup/hits", duplicates)
+            self.stats.inc_value("dedup/phones_reused", phones_reused)
+            total = self.stats.get_value("pipeline/rows_inserted")
+            if total:
+                self.stats.set_value("dedup/hit_rate", round(self.stats.get_value("dedup/hits") / total, 4))
+            self.stats.inc_value("pipeline/write_seconds", seconds)
+            self.stats.inc_value("pipeline/batches")
+        PIPELINE_BATCH_ITEMS.observe(rows)
+        PIPELINE_FLUSH_SECONDS.observe(seconds)
+        PIPELINE_ROWS.labels("inserted").inc(inserted)
+        PIPELINE_ROWS.labels("changed").inc(changed)
+        PIPELINE_ROWS.labels("unchanged").inc(rows - inserted - changed)
+        DEDUP_HITS.inc(duplicates)
+        DEDUP_PHONES_REUSED.inc(phones_reused)
+
+    def _wait_for_oldest(self, item):
+        waiter = defer.Deferred()
+
+        def release(result):
+            waiter.callback(item)
+            return result
+
+        self.pending[0].addBoth(release)
+        return waiter
+
+    def save_items(self, items):
+        """
+        Bulk-writes a batch of items into the 'cars' table (runs on the writer thread).
+        - Streams the batch with COPY FROM STDIN (CSV) into the staging table, with each item's content
+          hash and VIN/plate/photo fingerprints (a URL seen twice in the batch is written once).
+        - Merges it with the prepared merge_batch statement, keyed by the md5 of the URL in 'car_urls':
+          - rows whose URL and hash are already registered are dropped by an index probe; only their
+            'car_urls.last_seen' is refreshed, when it is over an hour old,
+          - new URLs are registered and inserted into 'cars',
+          - a new car whose VIN, plate or photo fingerprint is in 'car_fingerprints' is linked to that
+            vehicle's first listing (duplicate_of) and takes its valid (unflagged) phone number if
+            the seller is the same: same username, or, when either username is unknown (lite
+            mode), a first listing found at most phone_reuse_days earlier. Every other new car gets
+            a phone job in 'phone_jobs', and new fingerprints are registered (reposts within one
+            batch are only matched from the next batch on),
+          - known URLs with a different hash have the replaced version appended to 'cars_history',
+            and their keys are returned for UPDATE_SQL, which then sets the new tracked values.
+        - Notifies waiting phone workers (LISTEN cars_pending) if any phone jobs were queued.
+        - Rolls back and re-raises on error so the connection stays usable for the next batch.
+        Returns (seconds spent writing, rows inserted, rows changed, new rows matched to a known
+        vehicle, new rows that reused its phone number).
+        """
+        start = time.perf_counter()
+        # Keyed by URL, so a URL seen twice in the batch is written once (the last version)
+        rows = {}
+        for i in items:
+            rows[i["url"]] = (
+                [i.get(col) for col in COLUMNS[:-1]]
+                + [i.get("datetime_found") or datetime.now(timezone.utc).isoformat(), content_hash(i)]
+                + list(vehicle_keys(i))
             )
-            for i in self.items
-        ]
-        execute_values(self.cur, sql, values)
-        self.conn.commit()
+        buf = io.StringIO()
+        csv.writer(buf).writerows(rows.values())
+        buf.seek(0)
+        try:
+            with DB_ROUNDTRIP.labels("copy").time():
+                self.cur.copy_expert(f"COPY cars_staging ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buf)
+            merge_started = time.perf_counter()
+            self.cur.execute("EXECUTE merge_batch")
+            inserted, duplicates, queued, *changed_keys = self.cur.fetchone()
+            changed = len(changed_keys[0] or ())
+            if changed:
+                self.cur.execute(UPDATE_SQL, changed_keys)
+            DB_ROUNDTRIP.labels("merge").observe(time.perf_counter() - merge_started)
+            if queued:
+                # Delivered on commit, wakes idle phone workers instead of letting them poll
+                self.cur.execute("NOTIFY cars_pending")
+            with DB_ROUNDTRIP.labels("commit").time():
+                self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return time.perf_counter() - start, inserted, changed, duplicates, inserted - queued
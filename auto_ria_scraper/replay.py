@@ -0,0 +1,117 @@
+import gzip
+import hashlib
+import json
+import os
+
+from scrapy.exceptions import NotConfigured
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.decorators import defers
+
+
+class CorpusStore:
+    """
+    On-disk corpus of recorded responses.
+    - Bodies are gzip-compressed and content-addressed (blobs/<sha256[:2]>/<sha256>.gz),
+      so identical pages are stored once.
+    - index.jsonl maps each URL to its status, headers and body hash; the last entry for a URL wins.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = os.path.join(path, "index.jsonl")
+
+    def _blob_path(self, digest):
+        return os.path.join(self.path, "blobs", digest[:2], f"{digest}.gz")
+
+    def save(self, response):
+        """
+        Store a response body (if not already present) and append its index entry.
+        """
+        digest = hashlib.sha256(response.body).hexdigest()
+        blob_path = self._blob_path(digest)
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            with gzip.open(blob_path, "wb") as f:
+                f.write(response.body)
+        entry = {
+            "url": response.url,
+            "status": response.status,
+            "headers": {
+                k.decode("latin-1"): [v.decode("latin-1") for v in vs]
+                for k, vs in response.headers.items()
+            },
+            "body": digest,
+        }
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def load_index(self):
+        """
+        Return a {url: entry} dict of every recorded response.
+        """
+        index = {}
+        with open(self.index_path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    index[entry["url"]] = entry
+        return index
+
+    def read_body(self, digest):
+        with gzip.open(self._blob_path(digest), "rb") as f:
+            return f.read()
+
+
+class ResponseRecorderMiddleware:
+    """
+    Downloader middleware that records every downloaded response into a CorpusStore.
+    Enabled with REPLAY_RECORD = True; the corpus goes to REPLAY_CORPUS_DIR, e.g.
+    `scrapy crawl autoriaspider -s REPLAY_RECORD=1 -s REPLAY_CORPUS_DIR=corpus`.
+    """
+
+    def __init__(self, store, stats):
+        self.store = store
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("REPLAY_RECORD"):
+            raise NotConfigured
+        return cls(CorpusStore(crawler.settings.get("REPLAY_CORPUS_DIR")), crawler.stats)
+
+    def process_response(self, request, response, spider):
+        self.store.save(response)
+        self.stats.inc_value("replay/recorded", spider=spider)
+        return response
+
+
+class ReplayDownloadHandler:
+    """
+    Download handler that serves responses from a recorded corpus instead of the network.
+    Register it for http/https in DOWNLOAD_HANDLERS (the replaybench command does this).
+    URLs missing from the corpus get an empty 404 response.
+    """
+
+    lazy = False
+
+    def __init__(self, store, stats):
+        self.store = store
+        self.stats = stats
+        self.index = store.load_index()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(CorpusStore(crawler.settings.get("REPLAY_CORPUS_DIR")), crawler.stats)
+
+    @defers
+    def download_request(self, request, spider):
+        entry = self.index.get(request.url)
+        if entry is None:
+            self.stats.inc_value("replay/miss", spider=spider)
+            return responsetypes.from_args(url=request.url)(url=request.url, status=404, request=request)
+        self.stats.inc_value("replay/hit", spider=spider)
+        headers = Headers(entry["headers"])
+        body = self.store.read_body(entry["body"])
+        respcls = responsetypes.from_args(headers=headers, url=request.url, body=body)
+        return respcls(url=request.url, status=entry["status"], headers=headers, body=body, request=request)
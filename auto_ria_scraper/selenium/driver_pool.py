@@ -0,0 +1,214 @@
+import logging
+import os
+import queue
+import shutil
+import threading
+from contextlib import contextmanager
+
+import psutil
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+
+# Suppress webdriver-manager logs to avoid cluttering output
+os.environ["WDM_LOG"] = "0"
+
+# Sub-resources the phone lookup never needs; blocked in the browser's network stack via CDP
+BLOCKED_URL_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.css",
+]
+
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+
+def resolve_driver_path():
+    """
+    Return the ChromeDriver executable path, resolving it on first call.
+    - CHROMEDRIVER_PATH if set, else a chromedriver found on PATH (both work offline).
+    - Otherwise downloads a matching driver with webdriver-manager, which needs network access.
+    The result is cached per process; resolving it before forking workers shares it with all of them.
+    """
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path is None:
+            path = os.getenv("CHROMEDRIVER_PATH") or shutil.which("chromedriver")
+            if path is None:
+                from webdriver_manager.chrome import ChromeDriverManager
+                path = ChromeDriverManager().install()
+            _driver_path = path
+        return _driver_path
+
+
+def create_driver(block_resources=True):
+    """
+    Create and configure a headless Chrome WebDriver instance.
+    - With block_resources, images, fonts and stylesheets are never fetched (BLOCKED_URL_PATTERNS).
+    """
+    options = Options()
+    options.add_argument("--headless=new")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    service = Service(resolve_driver_path())
+    driver = webdriver.Chrome(service=service, options=options)
+    if block_resources:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+    return driver
+
+
+def browser_rss_mb(driver):
+    """
+    Return the resident memory of a driver's ChromeDriver process and all the Chrome
+    processes under it, in MB (0 if the processes are already gone).
+    """
+    try:
+        root = psutil.Process(driver.service.process.pid)
+        processes = [root] + root.children(recursive=True)
+    except (psutil.Error, AttributeError):
+        return 0.0
+    total = 0
+    for process in processes:
+        try:
+            total += process.memory_info().rss
+        except psutil.Error:
+            pass
+    return total / 1024**2
+
+
+class DriverPool:
+    """
+    Pool of up to `size` headless Chrome browsers shared by the threads of one worker process.
+    - Browsers are started on demand, or ahead of time with warm().
+    - A browser is recycled after `max_pages` lookups, once its process tree exceeds `max_rss_mb`
+      of RSS, or when a lookup fails with anything but a timeout (crashed or hung browser).
+    - A recycled browser is quit and its replacement started in the background right away,
+      so the next lookup finds a warm browser instead of paying Chrome's cold start.
+    """
+
+    def __init__(self, size=1, max_pages=200, max_rss_mb=1024, block_resources=True):
+        self.size = size
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.block_resources = block_resources
+        self.launched = 0
+        self.recycled = 0
+        self._idle = queue.Queue()
+        self._pages = {}
+        # Browsers alive or being started, idle or not; never exceeds `size`
+        self._slots = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def warm(self):
+        """
+        Start every browser the pool may use in the background.
+        """
+        with self._lock:
+            missing = self.size - self._slots
+            self._slots = self.size
+        for _ in range(missing):
+            threading.Thread(target=self._replace, daemon=True).start()
+
+    @contextmanager
+    def driver(self):
+        """
+        Check out a browser for one lookup, starting one if none is idle and the pool has room.
+        """
+        driver = self._take()
+        try:
+            yield driver
+        except TimeoutException:
+            # The page did not show a number in time; the browser itself is fine
+            self._release(driver)
+            raise
+        except Exception:
+            self._retire(driver, "lookup error")
+            raise
+        else:
+            self._release(driver)
+
+    def close(self):
+        """
+        Quit every idle browser; browsers still checked out are quit when released.
+        """
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._quit(driver)
+
+    def _take(self):
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            with self._lock:
+                launch = self._slots < self.size
+                if launch:
+                    self._slots += 1
+            if launch:
+                try:
+                    return self._launch()
+                except Exception:
+                    with self._lock:
+                        self._slots -= 1
+                    raise
+            # Every browser is busy or still starting: wait for one, re-checking for a free slot
+            try:
+                return self._idle.get(timeout=1)
+            except queue.Empty:
+                continue
+
+    def _launch(self):
+        driver = create_driver(self.block_resources)
+        self._pages[driver] = 0
+        self.launched += 1
+        return driver
+
+    def _release(self, driver):
+        self._pages[driver] += 1
+        if self._closed:
+            self._quit(driver)
+        elif self._pages[driver] >= self.max_pages:
+            self._retire(driver, f"{self._pages[driver]} pages")
+        else:
+            rss = browser_rss_mb(driver)
+            if rss > self.max_rss_mb:
+                self._retire(driver, f"{rss:.0f} MB RSS")
+            else:
+                self._idle.put(driver)
+
+    def _retire(self, driver, reason):
+        logging.info(f"Recycling browser after {self._pages.get(driver, 0)} pages ({reason})")
+        self.recycled += 1
+        # The slot passes to the replacement, which starts as soon as the old browser is gone
+        threading.Thread(target=self._replace, args=(driver,), daemon=True).start()
+
+    def _replace(self, old=None):
+        if old is not None:
+            # Quit first: a browser is usually retired for using too much memory
+            self._quit(old)
+        if self._closed:
+            with self._lock:
+                self._slots -= 1
+            return
+        try:
+            self._idle.put(self._launch())
+        except Exception as e:
+            logging.error(f"Failed to start a browser: {e}")
+            with self._lock:
+                self._slots -= 1
+
+    def _quit(self, driver):
+        self._pages.pop(driver, None)
+        try:
+            driver.quit()
+        except Exception as e:
+            logging.warning(f"Failed to quit browser cleanly: {e}")
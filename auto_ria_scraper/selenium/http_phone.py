@@ -0,0 +1,75 @@
+import re
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from auto_ria_scraper.utils import AUTO_ID_RE
+from phones import MASK_RE
+
+# The "show phone" link signs its request with the hash/expires pair rendered into this script tag
+SECURE_RE = re.compile(r'class="js-user-secure-\d+"[^>]*?data-hash="([^"]+)"[^>]*?data-expires="(\d+)"')
+
+USER_AGENT = (
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+)
+
+
+class PhoneLookupError(Exception):
+    """
+    Raised when the phone number cannot be obtained over plain HTTP.
+    """
+
+
+def create_session(pool_size=10):
+    """
+    Create a requests session with a pooled, keep-alive connection adapter.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"User-Agent": USER_AGENT})
+    return session
+
+
+def get_phone_number_http(session, url, timeout=10):
+    """
+    Fetch and return the phone number for a listing without a browser.
+    - Loads the listing HTML to read the signed hash/expires pair.
+    - Calls the same endpoint the 'show phone' link calls.
+    - Raises PhoneLookupError if any step does not yield an unmasked number.
+    """
+    match = AUTO_ID_RE.search(url)
+    if not match:
+        raise PhoneLookupError(f"cannot extract listing id from {url}")
+    auto_id = match.group(1)
+
+    page = session.get(url, timeout=timeout)
+    page.raise_for_status()
+    secure = SECURE_RE.search(page.text)
+    if not secure:
+        raise PhoneLookupError("phone hash not found on listing page")
+    phone_hash, expires = secure.groups()
+
+    # Resolve the endpoint against the listing URL so a local stub server works transparently
+    api_url = urljoin(url, f"/users/phones/{auto_id}")
+    resp = session.get(
+        api_url,
+        params={"hash": phone_hash, "expires": expires},
+        headers={"X-Requested-With": "XMLHttpRequest", "Referer": url},
+        timeout=timeout,
+    )
+    resp.raise_for_status()
+    try:
+        data = resp.json()
+    except ValueError:
+        raise PhoneLookupError("phone endpoint returned non-JSON response")
+
+    phone = data.get("formattedPhoneNumber")
+    if not phone and data.get("phones"):
+        phone = data["phones"][0].get("phoneFormatted")
+    if not phone or MASK_RE.search(phone):
+        raise PhoneLookupError("phone endpoint returned no unmasked number")
+    return phone
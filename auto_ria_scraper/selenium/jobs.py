@@ -0,0 +1,189 @@
+import os
+import select
+import socket
+
+from psycopg2.extras import execute_values
+
+# Channel PostgresPipeline notifies after enqueueing phone jobs for new cars
+CHANNEL = "cars_pending"
+
+
+def worker_tag(pid=None):
+    """
+    Return the phone_jobs.claimed_by tag of a worker process on this host (the current one by default).
+    """
+    return f"{socket.gethostname()}:{pid or os.getpid()}"
+
+
+def _fail_cars(cur, car_ids):
+    # Terminal failures leave the queue; the car records the outcome
+    if car_ids:
+        cur.execute(
+            "UPDATE cars SET phone_status='failed', phone_checked_at=now(), updated_at=now() WHERE id = ANY(%s)",
+            (car_ids,),
+        )
+
+
+def claim_jobs(conn, limit, lease_seconds=300, max_attempts=5, worker=None):
+    """
+    Atomically lease up to `limit` due jobs from the phone_jobs queue.
+    A job is due when its next_attempt_at has passed: it is new, waiting for a retry,
+    or its lease expired (the worker died).
+    - Expired jobs that used up their retry budget are removed first and their cars marked 'failed'.
+    - Locks candidate rows with SKIP LOCKED so concurrent workers never pick the same car.
+    - Bumps the attempt counter and sets the lease in one statement,
+      recording `worker` (see worker_tag; this process by default) as the lease holder.
+    - Returns a list of (car_id, url) tuples (empty if nothing is due).
+    While leased, next_attempt_at mirrors the lease expiry, so a single range scan
+    over phone_jobs_due_idx finds every kind of due job. 'cars' is not written to.
+    """
+    worker = worker or worker_tag()
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "DELETE FROM phone_jobs WHERE lease_expires_at <= now() AND attempts >= %s RETURNING car_id",
+                (max_attempts,),
+            )
+            _fail_cars(cur, [row[0] for row in cur.fetchall()])
+            cur.execute(
+                "UPDATE phone_jobs SET attempts = attempts + 1, "
+                "  lease_expires_at = now() + make_interval(secs => %s), "
+                "  next_attempt_at = now() + make_interval(secs => %s), "
+                "  claimed_by = %s "
+                "WHERE car_id IN ("
+                "  SELECT car_id FROM phone_jobs "
+                "  WHERE next_attempt_at <= now() "
+                "  ORDER BY next_attempt_at "
+                "  LIMIT %s "
+                "  FOR UPDATE SKIP LOCKED"
+                ") "
+                "RETURNING car_id, url",
+                (lease_seconds, lease_seconds, worker, limit),
+            )
+            return cur.fetchall()
+
+
+def flush_results(conn, results, max_attempts=5, backoff=60, max_backoff=6 * 3600, worker=None):
+    """
+    Acknowledge a batch of (car_id, phone, status) results in one statement.
+    - Only jobs still leased by `worker` (this process by default) are acknowledged: a job whose
+      lease expired and was claimed by another worker belongs to that worker, and this late
+      result is dropped.
+    - Successes, and errors that exhausted max_attempts, are deleted from the queue and their
+      phone number, final status ('success' or 'failed') and phone_checked_at written to 'cars'.
+    - Other errors stay queued, unleased, and are retried with exponential backoff
+      (backoff * 2^(attempts-1), capped at max_backoff).
+    Returns the discovery-to-phone latency (seconds since datetime_found) of every success.
+    """
+    if not results:
+        return []
+    # execute_values only takes the VALUES placeholder, so the numeric knobs are inlined
+    max_attempts, backoff, max_backoff = int(max_attempts), float(backoff), float(max_backoff)
+    with conn:
+        with conn.cursor() as cur:
+            holder = cur.mogrify("%s", (worker or worker_tag(),)).decode()
+            rows = execute_values(
+                cur,
+                "WITH v (id, phone, status) AS (VALUES %s), "
+                "retried AS ("
+                "  UPDATE phone_jobs j SET lease_expires_at = NULL, claimed_by = NULL, "
+                "    next_attempt_at = now() + make_interval("
+                f"      secs => least({backoff} * power(2, greatest(j.attempts - 1, 0)), {max_backoff})"
+                "    ) "
+                f"  FROM v WHERE j.car_id = v.id AND j.claimed_by = {holder} AND v.status = 'error'"
+                f"    AND j.attempts < {max_attempts}"
+                "), done AS ("
+                "  DELETE FROM phone_jobs j USING v "
+                f"  WHERE j.car_id = v.id AND j.claimed_by = {holder}"
+                f"    AND (v.status <> 'error' OR j.attempts >= {max_attempts}) "
+                "  RETURNING j.car_id, j.datetime_found, v.phone, "
+                "    CASE WHEN v.status = 'error' THEN 'failed' ELSE v.status END AS status"
+                ") "
+                "UPDATE cars SET phone_number = done.phone, phone_flag = NULL, phone_status = done.status, phone_checked_at = now(), updated_at = now() "
+                "FROM done WHERE cars.id = done.car_id AND cars.datetime_found = done.datetime_found "
+                "RETURNING CASE WHEN done.status = 'success' "
+                "  THEN extract(epoch FROM now() - done.datetime_found)::float8 END",
+                results,
+                template="(%s::integer, %s::text, %s::varchar)",
+                page_size=len(results),
+                fetch=True,
+            )
+            return [row[0] for row in rows if row[0] is not None]
+
+
+def release_jobs(conn, car_ids, worker=None):
+    """
+    Hand jobs leased by `worker` (this process by default) that were never started back to the
+    queue (e.g. when a worker drains). They become due immediately and get back the attempt the claim counted.
+    """
+    if not car_ids:
+        return 0
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE phone_jobs SET attempts = greatest(attempts - 1, 0), "
+                "  lease_expires_at=NULL, next_attempt_at=now(), claimed_by=NULL "
+                "WHERE car_id = ANY(%s) AND lease_expires_at IS NOT NULL AND claimed_by = %s",
+                (list(car_ids), worker or worker_tag()),
+            )
+            return cur.rowcount
+
+
+def release_worker_jobs(conn, worker, max_attempts=5):
+    """
+    Hand back every job leased by a worker that crashed or was killed, without waiting for the lease.
+    The interrupted attempt still counts: the job is due again at once,
+    or leaves the queue as 'failed' if that was its last attempt.
+    Returns the number of jobs released.
+    """
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "DELETE FROM phone_jobs "
+                "WHERE lease_expires_at IS NOT NULL AND claimed_by = %s AND attempts >= %s "
+                "RETURNING car_id",
+                (worker, max_attempts),
+            )
+            failed = [row[0] for row in cur.fetchall()]
+            _fail_cars(cur, failed)
+            cur.execute(
+                "UPDATE phone_jobs SET lease_expires_at=NULL, next_attempt_at=now(), claimed_by=NULL "
+                "WHERE lease_expires_at IS NOT NULL AND claimed_by = %s",
+                (worker,),
+            )
+            return cur.rowcount + len(failed)
+
+
+def count_due(conn):
+    """
+    Return the number of phone jobs that are due and not leased, i.e. the queue depth.
+    """
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) FROM phone_jobs WHERE next_attempt_at <= now()")
+            return cur.fetchone()[0]
+
+
+def listen(conn):
+    """
+    Subscribe a dedicated connection to new-car notifications.
+    The connection is switched to autocommit so LISTEN takes effect immediately.
+    """
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f"LISTEN {CHANNEL}")
+    return conn
+
+
+def wait_for_jobs(conn, timeout):
+    """
+    Block until a notification arrives on a listening connection or `timeout` seconds pass.
+    Returns True if woken by a notification.
+    """
+    conn.poll()
+    if not conn.notifies:
+        select.select([conn], [], [], timeout)
+        conn.poll()
+    notified = bool(conn.notifies)
+    conn.notifies.clear()
+    return notified
@@ -0,0 +1,65 @@
+import glob
+import os
+import tempfile
+
+# Worker processes keep their samples in files under this directory (prometheus_client's
+# multiprocess mode), and the supervisor serves the sum. The variable must be set before
+# prometheus_client is imported, so this module is the only one importing it.
+_multiproc_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+if _multiproc_dir:
+    # Samples left over from a previous run
+    for _stale in glob.glob(os.path.join(_multiproc_dir, "*.db")):
+        os.remove(_stale)
+else:
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="phone-metrics-")
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, multiprocess, start_http_server  # noqa: E402
+
+FETCH_SECONDS = Histogram(
+    "autoria_phone_fetch_seconds",
+    "Time of one phone lookup attempt, by engine and outcome",
+    ["engine", "outcome"],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60),
+)
+JOBS = Counter("autoria_phone_jobs", "Phone jobs finished, by resulting status", ["status"])
+HANDOFF_SECONDS = Histogram(
+    "autoria_phone_handoff_seconds",
+    "Time from a car's discovery (datetime_found) to its phone number being stored",
+    buckets=(1, 2, 5, 10, 30, 60, 120, 300, 900, 3600, 21600),
+)
+DB_ROUNDTRIP = Histogram(
+    "autoria_phone_db_roundtrip_seconds",
+    "Duration of one phone job queue statement",
+    ["statement"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+# Set by the supervisor process only
+QUEUE_DEPTH = Gauge("autoria_phone_queue_depth", "Due phone jobs not leased by any worker", multiprocess_mode="mostrecent")
+WORKERS = Gauge("autoria_phone_workers", "Worker processes running (draining ones included)", multiprocess_mode="mostrecent")
+RESTARTS = Counter("autoria_phone_worker_restarts", "Workers replaced after a crash or a missed heartbeat")
+# Set by each worker's PhoneScheduler (PHONE_CONCURRENCY > 1), summed over live workers
+SCHEDULER_QUEUED = Gauge(
+    "autoria_phone_scheduler_queued", "Jobs claimed by worker schedulers and waiting for a lookup slot",
+    multiprocess_mode="livesum",
+)
+LOOKUPS_IN_FLIGHT = Gauge("autoria_phone_lookups_in_flight", "Phone lookups running in worker schedulers", multiprocess_mode="livesum")
+RESULTS_UNFLUSHED = Gauge(
+    "autoria_phone_results_unflushed", "Finished lookups not yet written back by worker schedulers",
+    multiprocess_mode="livesum",
+)
+
+
+def start_metrics_server(port, addr="0.0.0.0"):
+    """
+    Serve the metrics of this process and all its workers on http://addr:port/metrics.
+    """
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    start_http_server(port, addr, registry=registry)
+
+
+def worker_exited(pid):
+    """
+    Drop the live-only samples of a worker that is gone; its counters and histograms are kept.
+    """
+    multiprocess.mark_process_dead(pid)
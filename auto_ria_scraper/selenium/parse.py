@@ -1,20 +1,30 @@
-import re
 import time
+import asyncio
 import psycopg2
 import os
 import multiprocessing
 import datetime
 import logging
-from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
 
-# Suppress webdriver-manager logs to avoid cluttering output
-os.environ["WDM_LOG"] = "0"
+import metrics
+from driver_pool import DriverPool, resolve_driver_path
+from http_phone import create_session, get_phone_number_http
+from jobs import (
+    claim_jobs,
+    count_due,
+    flush_results,
+    listen,
+    release_jobs,
+    release_worker_jobs,
+    wait_for_jobs,
+    worker_tag,
+)
+from phones import MASK_RE, to_e164
+from scheduler import PhoneScheduler
+from supervisor import Supervisor
 
 # Configure logging to display messages with timestamp
 logging.basicConfig(
@@ -32,8 +42,44 @@ DB_CONFIG = {
     "port": os.getenv("DB_PORT", "5432"),
 }
 
-# Download and set up ChromeDriver for all workers (to avoid race conditions)
-DRIVER_PATH = ChromeDriverManager().install()
+# Phone lookup engine: 'http' calls the phone endpoint directly (Selenium is used only as a fallback),
+# 'selenium' always drives a headless browser
+FETCH_MODE = os.getenv("PHONE_FETCH_MODE", "http").lower()
+
+# Concurrent lookups per worker process (1 keeps the sequential loop) and per-domain cap
+CONCURRENCY = int(os.getenv("PHONE_CONCURRENCY", "1"))
+PER_DOMAIN_LIMIT = int(os.getenv("PHONE_PER_DOMAIN_LIMIT", "8"))
+
+# Jobs claimed per round trip by the sequential loop, and the longest idle wait between
+# claims when no NOTIFY arrives (error rows become claimable again without one)
+CLAIM_BATCH = int(os.getenv("PHONE_CLAIM_BATCH", "10"))
+IDLE_TIMEOUT = float(os.getenv("PHONE_IDLE_TIMEOUT", "60"))
+
+# Job lease length, retry budget and base delay (doubled per attempt) before an error is retried
+LEASE_SECONDS = int(os.getenv("PHONE_LEASE_SECONDS", "300"))
+MAX_ATTEMPTS = int(os.getenv("PHONE_MAX_ATTEMPTS", "5"))
+RETRY_BACKOFF = float(os.getenv("PHONE_RETRY_BACKOFF", "60"))
+
+# Worker count bounds (scaled with the number of due jobs, one worker per PHONE_JOBS_PER_WORKER),
+# how long a worker may go without a heartbeat before it is restarted, and how long it gets to
+# finish or release its claimed jobs on shutdown
+MIN_WORKERS = int(os.getenv("PHONE_MIN_WORKERS", "1"))
+NUM_WORKERS = int(os.getenv("NUM_WORKERS", "4"))
+JOBS_PER_WORKER = int(os.getenv("PHONE_JOBS_PER_WORKER", "100"))
+HEARTBEAT_TIMEOUT = float(os.getenv("WORKER_HEARTBEAT_TIMEOUT", "300"))
+DRAIN_TIMEOUT = float(os.getenv("WORKER_DRAIN_TIMEOUT", "60"))
+# Longest a worker blocks without beating while idle
+HEARTBEAT_INTERVAL = 5
+
+# Port of the supervisor's Prometheus endpoint, covering every worker (0 disables it)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9411"))
+
+# Browsers per worker process, and the page count / RSS (MB, whole Chrome process tree) after
+# which a browser is replaced; images, fonts and CSS are not loaded unless BROWSER_BLOCK_RESOURCES=0
+BROWSERS = int(os.getenv("PHONE_BROWSERS", "1"))
+BROWSER_MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", "200"))
+BROWSER_MAX_RSS_MB = float(os.getenv("BROWSER_MAX_RSS_MB", "1024"))
+BLOCK_RESOURCES = os.getenv("BROWSER_BLOCK_RESOURCES", "1") == "1"
 
 # Set multiprocessing to 'fork' to allow driver sharing between processes (Linux/Unix)
 multiprocessing.set_start_method('fork', force=True)
@@ -44,42 +90,6 @@ def get_db_connection():
     """
     return psycopg2.connect(**DB_CONFIG)
 
-def format_phone_number(phone):
-    """
-    Normalize and format a phone number.
-    - If phone is None or empty, returns None.
-    - Strips non-digit characters.
-    - Adds '38' country code for Ukrainian numbers starting with '0' and 10 digits.
-    """
-    if not phone:
-        return None
-    digits = re.sub(r"\D", "", phone)
-    if digits.startswith("0") and len(digits) == 10:
-        return "38" + digits
-    return digits
-
-def update_phone_number(conn, car_id, phone, status):
-    """
-    Update the phone number and phone status for a specific car in the database.
-    """
-    with conn.cursor() as cur:
-        cur.execute(
-            "UPDATE cars SET phone_number=%s, phone_status=%s WHERE id=%s",
-            (phone, status, car_id),
-        )
-    conn.commit()
-
-def create_driver():
-    """
-    Create and configure a headless Chrome WebDriver instance.
-    """
-    options = Options()
-    options.add_argument("--headless=new")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    service = Service(DRIVER_PATH)
-    return webdriver.Chrome(service=service, options=options)
-
 def get_phone_number(driver, url):
     """
     Fetch and return the phone number from a car listing page using Selenium.
@@ -101,90 +111,223 @@ def get_phone_number(driver, url):
         pass
     # Wait until the phone number is available and not masked
     WebDriverWait(driver, 10).until(
-        lambda d: span.get_attribute("data-phone-number") and "xxx" not in span.get_attribute("data-phone-number")
+        lambda d: span.get_attribute("data-phone-number") and not MASK_RE.search(span.get_attribute("data-phone-number"))
     )
     return span.get_attribute("data-phone-number")
 
-def worker():
+class PhoneFetcher:
+    """
+    Phone lookup engine shared by the sequential worker loop and the async scheduler.
+    - In 'http' mode tries the browserless lookup first over a pooled session.
+    - Falls back to Selenium if the HTTP path fails; browsers come from a DriverPool
+      (started on first use, or warmed up front in 'selenium' mode) and are recycled as they age.
+    - fetch() is safe to call from many threads; at most `browsers` Selenium lookups run at once.
+      A WebDriver session drives one window at a time, so Selenium lookups scale with browsers,
+      not with tabs of one browser.
+    """
+
+    def __init__(self, mode, pool_size=10, browsers=1):
+        self.session = create_session(pool_size) if mode == "http" else None
+        self.pool = DriverPool(browsers, BROWSER_MAX_PAGES, BROWSER_MAX_RSS_MB, BLOCK_RESOURCES)
+        if mode == "selenium":
+            self.pool.warm()
+
+    def fetch(self, url):
+        """
+        Return the phone number of a listing URL in E.164; a masked or invalid number counts as a
+        failed lookup (the HTTP path falls back to Selenium, and the job is retried).
+        Every attempt is timed in autoria_phone_fetch_seconds, labelled with its engine and outcome.
+        """
+        if self.session is not None:
+            start = time.perf_counter()
+            try:
+                phone = to_e164(get_phone_number_http(self.session, url))
+                metrics.FETCH_SECONDS.labels("http", "success").observe(time.perf_counter() - start)
+                return phone
+            except Exception as e:
+                metrics.FETCH_SECONDS.labels("http", "error").observe(time.perf_counter() - start)
+                logging.warning(f"HTTP phone lookup failed for {url}, falling back to Selenium: {e}")
+        start = time.perf_counter()
+        try:
+            with self.pool.driver() as driver:
+                phone = to_e164(get_phone_number(driver, url))
+        except Exception:
+            metrics.FETCH_SECONDS.labels("selenium", "error").observe(time.perf_counter() - start)
+            raise
+        metrics.FETCH_SECONDS.labels("selenium", "success").observe(time.perf_counter() - start)
+        return phone
+
+    def close(self):
+        """
+        Quit the browsers (if any were started) and close the HTTP session.
+        """
+        self.pool.close()
+        if self.session is not None:
+            self.session.close()
+
+def publish_scheduler_metrics(snapshot):
+    """
+    Export a PhoneScheduler.metrics() snapshot as this worker's scheduler gauges.
+    """
+    metrics.SCHEDULER_QUEUED.set(snapshot["queue_depth"])
+    metrics.LOOKUPS_IN_FLIGHT.set(snapshot["in_flight"])
+    metrics.RESULTS_UNFLUSHED.set(snapshot["unflushed"])
+
+def wait_idle(listener, heartbeat, timeout):
     """
-    Worker process that:
-    - Fetches pending/error car records from DB
-    - Updates status to 'in_progress'
-    - Extracts phone number from the page via Selenium
-    - Updates the DB with the fetched number and status
-    - Runs in a loop until no jobs left (then sleeps)
+    Wait up to `timeout` seconds for a new-car NOTIFY, beating and checking
+    for a drain request every HEARTBEAT_INTERVAL seconds.
+    """
+    deadline = time.monotonic() + timeout
+    while not heartbeat.stopping():
+        heartbeat.beat()
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or wait_for_jobs(listener, min(remaining, HEARTBEAT_INTERVAL)):
+            return
+
+def timed(statement, func, *args, **kwargs):
+    """
+    Run one job queue DB call, timing it in autoria_phone_db_roundtrip_seconds.
+    """
+    with metrics.DB_ROUNDTRIP.labels(statement).time():
+        return func(*args, **kwargs)
+
+def store_results(conn, results, tag):
+    """
+    Acknowledge a batch of (car_id, phone, status) results of the jobs leased by worker `tag`,
+    counting them by status and observing the discovery-to-phone latency of the successes.
+    """
+    latencies = timed("flush", flush_results, conn, results, MAX_ATTEMPTS, RETRY_BACKOFF, worker=tag)
+    for _, _, status in results:
+        metrics.JOBS.labels(status).inc()
+    for seconds in latencies:
+        metrics.HANDOFF_SECONDS.observe(seconds)
+
+def worker(heartbeat, make_fetcher=None):
+    """
+    Worker process (run by the Supervisor) that:
+    - Leases a batch of due jobs from the phone_jobs queue (atomically, with SKIP LOCKED)
+    - Extracts phone numbers via the HTTP engine or Selenium (see PHONE_FETCH_MODE)
+    - Acknowledges the whole batch in one statement (numbers and statuses written to 'cars')
+    - When no jobs are left, waits for a NOTIFY from the Scrapy pipeline instead of polling
+    - Beats its heartbeat before every lookup and while idle
+    - When asked to drain, finishes the lookup in progress, hands the rest of its batch
+      back to the queue and exits
+    With PHONE_CONCURRENCY > 1 the loop is replaced by an asyncio scheduler
+    that keeps that many lookups in flight from this process.
+    make_fetcher() may supply another object with fetch(url)/close(), e.g. a fake one for load tests.
     """
     name = multiprocessing.current_process().name
-    logging.info(f"Worker {name} started, polling for jobs")
-    driver = create_driver()
+    tag = worker_tag()
+    logging.info(f"Worker {name} ({tag}) started, polling for jobs")
+    if make_fetcher is None:
+        if FETCH_MODE == "selenium" and CONCURRENCY > BROWSERS:
+            logging.warning(
+                f"Worker {name}: PHONE_CONCURRENCY={CONCURRENCY} but PHONE_BROWSERS={BROWSERS}; "
+                f"Selenium lookups beyond {BROWSERS} wait for a free browser"
+            )
+        fetcher = PhoneFetcher(FETCH_MODE, pool_size=CONCURRENCY, browsers=BROWSERS)
+    else:
+        fetcher = make_fetcher()
     conn = get_db_connection()
+    listener = listen(get_db_connection())
     try:
-        while True:
-            # Fetch next car with pending/error phone status (locked for this transaction)
-            with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT id, url FROM cars "
-                    "WHERE phone_status IN ('pending','error') "
-                    "ORDER BY CASE WHEN phone_status='pending' THEN 0 ELSE 1 END "
-                    "LIMIT 1 "
-                    "FOR UPDATE SKIP LOCKED"
-                )
-                row = cur.fetchone()
-            if not row:
-                # No jobs left, sleep before next poll
-                time.sleep(5)
+        if CONCURRENCY > 1:
+            scheduler = PhoneScheduler(
+                claim_jobs=lambda limit: timed("claim", claim_jobs, conn, limit, LEASE_SECONDS, MAX_ATTEMPTS, tag),
+                fetch_phone=fetcher.fetch,
+                store_results=lambda results: store_results(conn, results, tag),
+                wait_for_jobs=lambda timeout: wait_idle(listener, heartbeat, timeout),
+                concurrency=CONCURRENCY,
+                per_domain=PER_DOMAIN_LIMIT,
+                idle_timeout=IDLE_TIMEOUT,
+                release_jobs=lambda car_ids: timed("release", release_jobs, conn, car_ids, tag),
+                heartbeat=heartbeat.beat,
+                should_stop=heartbeat.stopping,
+                metrics_interval=HEARTBEAT_INTERVAL,
+                publish_metrics=publish_scheduler_metrics,
+            )
+            asyncio.run(scheduler.run())
+            return
+        while not heartbeat.stopping():
+            heartbeat.beat()
+            jobs = timed("claim", claim_jobs, conn, CLAIM_BATCH, LEASE_SECONDS, MAX_ATTEMPTS, tag)
+            if not jobs:
+                # No jobs left, sleep until new cars are announced (or the idle timeout passes)
+                wait_idle(listener, heartbeat, IDLE_TIMEOUT)
                 continue
-            car_id, url = row
-            # Mark the record as 'in_progress'
-            with conn:
-                cur2 = conn.cursor()
-                cur2.execute(
-                    "UPDATE cars SET phone_status='in_progress' WHERE id=%s",
-                    (car_id,),
-                )
-            try:
-                # Try to extract phone number using Selenium
-                phone = get_phone_number(driver, url)
-                phone = format_phone_number(phone)
-                status = "success"
-            except Exception as e:
-                # Log any errors and mark status as 'error'
-                logging.error(f"Worker {name}: error fetching phone for car {car_id}: {e}")
-                phone = None
-                status = "error"
-            # Update DB with result (phone number and new status)
-            update_phone_number(conn, car_id, phone, status)
+            results = []
+            for index, (car_id, url) in enumerate(jobs):
+                if heartbeat.stopping():
+                    # Draining: hand the rest of the batch back instead of fetching it
+                    timed("release", release_jobs, conn, [job[0] for job in jobs[index:]], tag)
+                    break
+                heartbeat.beat()
+                try:
+                    # Try to extract phone number (HTTP first, Selenium as fallback)
+                    phone = fetcher.fetch(url)
+                    status = "success"
+                except Exception as e:
+                    # Log any errors and mark status as 'error' (retried later with backoff)
+                    logging.error(f"Worker {name}: error fetching phone for car {car_id}: {e}")
+                    phone = None
+                    status = "error"
+                results.append((car_id, phone, status))
+            # Update DB with the whole batch (phone numbers and new statuses)
+            store_results(conn, results, tag)
     finally:
-        # Cleanup: close browser and DB connection
-        driver.quit()
+        # Cleanup: close browser, HTTP session and DB connections
+        fetcher.close()
+        listener.close()
         conn.close()
         logging.info(f"Worker {name} shutdown")
 
+def count_due_jobs():
+    conn = get_db_connection()
+    try:
+        due = count_due(conn)
+    finally:
+        conn.close()
+    metrics.QUEUE_DEPTH.set(due)
+    return due
+
+def release_dead_worker(pid):
+    conn = get_db_connection()
+    try:
+        return release_worker_jobs(conn, worker_tag(pid), MAX_ATTEMPTS)
+    finally:
+        conn.close()
+
 def main():
     """
-    Main process that spawns multiple worker processes and keeps the script alive.
-    Handles graceful shutdown on keyboard interrupt.
+    Main process that runs the worker processes under a Supervisor until SIGTERM or Ctrl+C:
+    crashed or hung workers are restarted, the worker count follows the queue depth,
+    and on shutdown workers finish or release their claimed jobs before exiting.
     """
     start_time = datetime.datetime.now()
-    logging.info("Spawning workers")
-    num_workers = int(os.getenv("NUM_WORKERS", "4"))
-    processes = []
-    for i in range(num_workers):
-        p = multiprocessing.Process(target=worker, name=f"worker-{i+1}")
-        p.daemon = True
-        p.start()
-        processes.append(p)
-    # Main loop keeps script alive while workers do their job
-    try:
-        while True:
-            time.sleep(60)
-    except KeyboardInterrupt:
-        # Graceful shutdown on Ctrl+C
-        logging.info("Shutdown signal received, terminating workers")
-        for p in processes:
-            p.terminate()
-        elapsed = (datetime.datetime.now() - start_time).total_seconds()
-        logging.info(f"Total runtime: {elapsed:.2f} seconds")
+    # In Selenium mode resolve ChromeDriver once, before forking, so workers do not race to download it.
+    # The HTTP engine only needs it for a fallback, which resolves it on first browser use.
+    if FETCH_MODE == "selenium":
+        try:
+            logging.info(f"Using ChromeDriver at {resolve_driver_path()}")
+        except Exception as e:
+            logging.warning(f"ChromeDriver not available yet, workers will retry on first browser use: {e}")
+    if METRICS_PORT:
+        metrics.start_metrics_server(METRICS_PORT)
+        logging.info(f"Serving metrics on port {METRICS_PORT}")
+    supervisor = Supervisor(
+        target=worker,
+        count_due=count_due_jobs,
+        release_jobs=release_dead_worker,
+        min_workers=MIN_WORKERS,
+        max_workers=NUM_WORKERS,
+        jobs_per_worker=JOBS_PER_WORKER,
+        heartbeat_timeout=HEARTBEAT_TIMEOUT,
+        drain_timeout=DRAIN_TIMEOUT,
+    )
+    supervisor.run()
+    elapsed = (datetime.datetime.now() - start_time).total_seconds()
+    logging.info(f"Total runtime: {elapsed:.2f} seconds")
 
 if __name__ == "__main__":
     main()
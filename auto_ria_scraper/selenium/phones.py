@@ -0,0 +1,202 @@
+import argparse
+import io
+import os
+import re
+from functools import lru_cache
+
+import psycopg2
+
+# Ukrainian numbers are +380 followed by a 9-digit national number whose first two digits
+# are a mobile operator code or a geographic (fixed-line) area code
+OPERATOR_CODES = {
+    "39": "Kyivstar", "67": "Kyivstar", "68": "Kyivstar", "77": "Kyivstar",
+    "96": "Kyivstar", "97": "Kyivstar", "98": "Kyivstar",
+    "50": "Vodafone", "66": "Vodafone", "75": "Vodafone", "95": "Vodafone", "99": "Vodafone",
+    "63": "lifecell", "73": "lifecell", "93": "lifecell",
+    "91": "3Mob",
+    "92": "PEOPLEnet",
+    "89": "Intertelecom", "94": "Intertelecom",
+}
+AREA_CODES = frozenset((
+    "31", "32", "33", "34", "35", "36", "37", "38", "41", "43", "44", "45", "46", "47", "48",
+    "51", "52", "53", "54", "55", "56", "57", "61", "62", "64", "65", "69",
+))
+
+# Flags for numbers that cannot be stored as E.164
+MASKED = "masked"
+INVALID = "invalid"
+
+# Digits hidden by the site until "show phone" is clicked: "(067) xxx xx xx", "067 ***-**-**".
+# A single x is not a mask ("ext 2"), so it takes a run of at least two
+MASK_RE = re.compile(r"[xXхХ*•]{2,}")
+# Everything a phone number may be written with; any other character (letters, "ext") makes it invalid
+PHONE_RE = re.compile(r"[\d\s+()./-]+")
+NON_DIGITS = re.compile(r"\D")
+# NULL in COPY text format
+NULL = "\\N"
+
+
+@lru_cache(maxsize=1 << 16)
+def normalize_phone(raw):
+    """
+    Map a phone number as shown on the site ("(067) 123 45 67", "+38 067 123-45-67",
+    "80671234567"...) to E.164 ("+380671234567").
+    Returns (e164, flag):
+    - (e164, None) for a Ukrainian mobile (known operator code) or fixed-line (area code) number,
+      or for a foreign number written with an explicit + or 00 prefix;
+    - (None, 'masked') if digits are hidden by a run of x, * or •;
+    - (None, 'invalid') for anything else, including empty values and values with letters.
+    Results are cached, since dealers repeat the same numbers across many listings.
+    """
+    if not raw or not raw.strip():
+        return None, INVALID
+    if MASK_RE.search(raw):
+        return None, MASKED
+    if not PHONE_RE.fullmatch(raw):
+        return None, INVALID
+    digits = NON_DIGITS.sub("", raw)
+    international = raw.lstrip().startswith("+")
+    if digits.startswith("00"):
+        digits, international = digits[2:], True
+
+    if digits.startswith("380") and len(digits) == 12:
+        national = digits[3:]
+    elif international:
+        # Foreign number: country codes are not checked, only the E.164 length
+        return ("+" + digits, None) if 8 <= len(digits) <= 15 else (None, INVALID)
+    elif digits.startswith("80") and len(digits) == 11:
+        # Old domestic trunk prefix, "8 0XX ..."
+        national = digits[2:]
+    elif digits.startswith("0") and len(digits) == 10:
+        national = digits[1:]
+    elif len(digits) == 9:
+        national = digits
+    else:
+        return None, INVALID
+
+    code = national[:2]
+    if code in OPERATOR_CODES or code in AREA_CODES:
+        return "+380" + national, None
+    return None, INVALID
+
+
+def operator(e164):
+    """
+    Return the mobile operator of a +380 number, or None for fixed-line and foreign numbers.
+    """
+    if e164 and e164.startswith("+380"):
+        return OPERATOR_CODES.get(e164[4:6])
+    return None
+
+
+def to_e164(raw):
+    """
+    Return the E.164 form of a looked-up phone number, raising ValueError if it is masked or invalid
+    (the worker then retries the job like any other failed lookup).
+    """
+    phone, flag = normalize_phone(raw)
+    if flag is not None:
+        raise ValueError(f"{flag} phone number {raw!r}")
+    return phone
+
+
+def renormalize(conn, chunk_rows=50_000, log=print):
+    """
+    Re-normalize the stored phone numbers of 'cars' in set-based chunks.
+    - Walks the table in id order, `chunk_rows` rows per chunk, one short transaction each,
+      so it can run next to the phone workers and be interrupted at any point.
+    - Each distinct number in a chunk is normalized once; only rows whose value changes are
+      streamed with COPY into a temporary table and applied with one UPDATE ... FROM.
+    - Valid numbers become E.164; masked ones are flagged (phone_flag) and their cars are queued
+      for a new lookup; invalid ones are flagged and left as they are.
+    Returns a dict of counts: scanned, normalized, masked, invalid.
+    """
+    counts = {"scanned": 0, "normalized": 0, "masked": 0, "invalid": 0}
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "CREATE TEMP TABLE phone_fixes (id INTEGER, datetime_found TIMESTAMPTZ, phone TEXT, flag VARCHAR(16)) "
+                "ON COMMIT DELETE ROWS"
+            )
+    last_id = 0
+    try:
+        while True:
+            with conn:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "SELECT id, datetime_found, phone_number, phone_flag FROM cars "
+                        "WHERE id > %s AND phone_number IS NOT NULL ORDER BY id LIMIT %s",
+                        (last_id, chunk_rows),
+                    )
+                    rows = cur.fetchall()
+                    if not rows:
+                        break
+                    last_id = rows[-1][0]
+                    counts["scanned"] += len(rows)
+                    fixes = {value: normalize_phone(value) for value in {row[2] for row in rows}}
+                    buf = io.StringIO()
+                    for car_id, found, value, old_flag in rows:
+                        phone, flag = fixes[value]
+                        if flag is None:
+                            if phone == value and old_flag is None:
+                                continue
+                            counts["normalized"] += 1
+                        else:
+                            counts[flag] += 1
+                            if flag == old_flag:
+                                continue
+                            phone = value
+                        buf.write(f"{car_id}\t{found.isoformat()}\t{_copy_text(phone)}\t{flag or NULL}\n")
+                    if buf.tell():
+                        buf.seek(0)
+                        cur.copy_expert("COPY phone_fixes FROM STDIN", buf)
+                        # Without statistics the planner hash-joins the whole of 'cars' for every chunk
+                        cur.execute("ANALYZE phone_fixes")
+                        cur.execute(
+                            "WITH fixed AS ("
+                            "  UPDATE cars c SET phone_number = f.phone, phone_flag = f.flag, updated_at = now(),"
+                            "    phone_status = CASE WHEN f.flag = 'masked' THEN 'pending' ELSE c.phone_status END"
+                            "  FROM phone_fixes f WHERE c.id = f.id AND c.datetime_found = f.datetime_found"
+                            "  RETURNING c.id, c.url, c.datetime_found, f.flag"
+                            ") "
+                            "INSERT INTO phone_jobs (car_id, url, datetime_found) "
+                            "SELECT id, url, datetime_found FROM fixed WHERE flag = 'masked' "
+                            "ON CONFLICT DO NOTHING"
+                        )
+            log(f"Checked {counts['scanned']} phone numbers (up to car {last_id})")
+    finally:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute("DROP TABLE IF EXISTS phone_fixes")
+    return counts
+
+
+def _copy_text(value):
+    # COPY text format: escape the characters with a meaning in it
+    return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-normalize the stored phone numbers to E.164")
+    parser.add_argument("--chunk-rows", type=int, default=50_000, help="rows read and updated per transaction")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(
+        dbname=os.getenv("DB_NAME", "autodb"),
+        user=os.getenv("DB_USER", "autoria"),
+        password=os.getenv("DB_PASS", "autoria"),
+        host=os.getenv("DB_HOST", "postgres"),
+        port=os.getenv("DB_PORT", "5432"),
+    )
+    try:
+        counts = renormalize(conn, chunk_rows=args.chunk_rows)
+    finally:
+        conn.close()
+    print(
+        f"Checked {counts['scanned']} phone numbers: {counts['normalized']} normalized, "
+        f"{counts['masked']} masked (queued for a new lookup), {counts['invalid']} invalid"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+
+class PhoneScheduler:
+    """
+    Asyncio scheduler that keeps many phone lookups in flight from a single process.
+    - A producer task claims batches of jobs from the DB into a bounded in-memory queue.
+    - `concurrency` consumer tasks pull from the queue, each holding a per-domain slot while fetching.
+    - Results are buffered and written back in batches.
+    - Blocking calls (DB, HTTP, Selenium) run on executors so the event loop never stalls.
+    - Once should_stop() returns True, claiming stops, queued jobs are released,
+      lookups in flight finish and run() returns after the final flush.
+    """
+
+    def __init__(
+        self,
+        claim_jobs,
+        fetch_phone,
+        store_results,
+        wait_for_jobs,
+        concurrency=20,
+        per_domain=8,
+        idle_timeout=60,
+        flush_interval=5,
+        metrics_interval=30,
+        release_jobs=None,
+        heartbeat=None,
+        should_stop=None,
+        publish_metrics=None,
+    ):
+        """
+        - claim_jobs(limit): returns a list of claimed (car_id, url) tuples.
+        - fetch_phone(url): returns the formatted phone number or raises.
+        - store_results(results): persists a list of (car_id, phone, status) tuples.
+        - wait_for_jobs(timeout): blocks until new jobs are announced or the timeout passes.
+        - release_jobs(car_ids): hands claimed jobs that were never started back to the queue.
+        - heartbeat(): called on every claim round, so a supervisor can tell the worker is alive.
+        - should_stop(): returns True once the worker should drain.
+        - publish_metrics(snapshot): receives metrics() every metrics_interval seconds, e.g. to
+          export it; without it the snapshot is logged.
+        claim_jobs/store_results/release_jobs run on a single thread, so they may share one connection.
+        """
+        self.claim_jobs = claim_jobs
+        self.fetch_phone = fetch_phone
+        self.store_results = store_results
+        self.wait_for_jobs = wait_for_jobs
+        self.concurrency = concurrency
+        self.per_domain = per_domain
+        self.idle_timeout = idle_timeout
+        self.flush_interval = flush_interval
+        self.metrics_interval = metrics_interval
+        self.release_jobs = release_jobs
+        self.heartbeat = heartbeat or (lambda: None)
+        self.should_stop = should_stop or (lambda: False)
+        self.publish_metrics = publish_metrics
+
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.queue = None
+        self._results = []
+        self._domain_slots = None
+        self._db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+        self._wait_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="listen")
+        self._fetch_executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="fetch")
+
+    def metrics(self):
+        """
+        Return a snapshot of queue depth and job counters.
+        """
+        return {
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "unflushed": len(self._results),
+        }
+
+    async def run(self):
+        """
+        Run the producer, consumers, flusher and metrics reporter until cancelled or drained.
+        """
+        # Keep claimed-but-unstarted jobs bounded so a crash strands at most a few rows
+        self.queue = asyncio.Queue(maxsize=self.concurrency)
+        self._domain_slots = defaultdict(lambda: asyncio.Semaphore(self.per_domain))
+        tasks = [
+            asyncio.create_task(self._flush_periodically()),
+            asyncio.create_task(self._report()),
+        ]
+        tasks += [asyncio.create_task(self._consume()) for _ in range(self.concurrency)]
+        try:
+            await self._produce()
+            await self._drain()
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._fetch_executor.shutdown(wait=False, cancel_futures=True)
+            self._wait_executor.shutdown(wait=False, cancel_futures=True)
+            self._db_executor.shutdown(wait=True)
+            # Persist whatever finished before shutdown
+            if self._results:
+                self.store_results(self._results)
+                self._results = []
+
+    async def _produce(self):
+        loop = asyncio.get_running_loop()
+        while not self.should_stop():
+            self.heartbeat()
+            jobs = await loop.run_in_executor(self._db_executor, self.claim_jobs, self.concurrency)
+            if not jobs:
+                # No jobs left: write out pending results, then wait for a NOTIFY instead of polling
+                await self._flush()
+                await loop.run_in_executor(self._wait_executor, self.wait_for_jobs, self.idle_timeout)
+                continue
+            for index, job in enumerate(jobs):
+                if self.should_stop():
+                    await self._release([car_id for car_id, _ in jobs[index:]])
+                    break
+                await self.queue.put(job)
+
+    async def _drain(self):
+        # Jobs still queued were never started: hand them back, then let lookups in flight finish
+        queued = []
+        while not self.queue.empty():
+            car_id, _ = self.queue.get_nowait()
+            self.queue.task_done()
+            queued.append(car_id)
+        await self._release(queued)
+        await self.queue.join()
+
+    async def _release(self, car_ids):
+        if car_ids and self.release_jobs is not None:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self._db_executor, self.release_jobs, car_ids)
+
+    async def _consume(self):
+        while True:
+            car_id, url = await self.queue.get()
+            try:
+                await self._process(car_id, url)
+            finally:
+                self.queue.task_done()
+
+    async def _process(self, car_id, url):
+        loop = asyncio.get_running_loop()
+        async with self._domain_slots[urlparse(url).netloc]:
+            self.in_flight += 1
+            try:
+                phone = await loop.run_in_executor(self._fetch_executor, self.fetch_phone, url)
+                status = "success"
+                self.completed += 1
+            except Exception as e:
+                logging.error(f"Scheduler: error fetching phone for car {car_id}: {e}")
+                phone = None
+                status = "error"
+                self.failed += 1
+            finally:
+                self.in_flight -= 1
+        self._results.append((car_id, phone, status))
+        if len(self._results) >= self.concurrency:
+            await self._flush()
+
+    async def _flush(self):
+        results, self._results = self._results, []
+        if results:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self._db_executor, self.store_results, results)
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self._flush()
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(self.metrics_interval)
+            if self.publish_metrics is not None:
+                self.publish_metrics(self.metrics())
+            else:
+                logging.info("Scheduler metrics: %s", self.metrics())
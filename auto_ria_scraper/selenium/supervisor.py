@@ -0,0 +1,263 @@
+import logging
+import math
+import multiprocessing
+import signal
+import time
+
+import metrics
+
+
+class WorkerHandle:
+    """
+    A supervised worker process with its heartbeat and its own stop event.
+    """
+
+    def __init__(self, process, heartbeat, stop):
+        self.process = process
+        self.heartbeat = heartbeat
+        self.stop = stop
+        self.started_at = time.monotonic()
+        self.draining_since = None
+
+    @property
+    def name(self):
+        return self.process.name
+
+
+class Heartbeat:
+    """
+    Worker-side view of a WorkerHandle: beat() to report progress, stopping() to check for a drain request.
+    """
+
+    def __init__(self, value, stop):
+        self._value = value
+        self._stop = stop
+
+    def beat(self):
+        self._value.value = time.monotonic()
+
+    def stopping(self):
+        return self._stop.is_set()
+
+
+def _run_worker(target, heartbeat):
+    # The supervisor coordinates shutdown: Ctrl+C reaches the whole process group, but workers
+    # drain when their stop event is set; SIGTERM from terminate() still kills them outright
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    target(heartbeat)
+
+
+class Supervisor:
+    """
+    Runs phone worker processes and keeps the right number of them healthy.
+    - Each worker calls heartbeat.beat() at least every `heartbeat_timeout` seconds;
+      a worker that exits or stops beating is killed, its leased jobs are released at once
+      (release_jobs(pid)) and a replacement is started, with exponential backoff while
+      workers keep dying within `min_uptime` seconds.
+    - Every `check_interval` seconds the worker count follows the queue depth (count_due()):
+      one worker per `jobs_per_worker` due jobs, between min_workers and max_workers.
+      Scaling up is immediate; scaling down waits for `scale_down_after` checks in a row and
+      drains one worker at a time.
+    - On SIGTERM/SIGINT every worker is asked to drain (finish or release its claimed jobs and
+      exit); workers still running after `drain_timeout` seconds are killed and their jobs released.
+    target(heartbeat) is the worker body and runs in a forked child, so it may be any callable,
+    including one wrapping a fake fetcher.
+    """
+
+    def __init__(
+        self,
+        target,
+        count_due,
+        release_jobs,
+        min_workers=1,
+        max_workers=4,
+        jobs_per_worker=100,
+        heartbeat_timeout=300,
+        check_interval=5,
+        scale_down_after=6,
+        drain_timeout=60,
+        min_uptime=30,
+        max_backoff=60,
+    ):
+        self.target = target
+        self.count_due = count_due
+        self.release_jobs = release_jobs
+        self.min_workers = min_workers
+        self.max_workers = max(max_workers, min_workers)
+        self.jobs_per_worker = jobs_per_worker
+        self.heartbeat_timeout = heartbeat_timeout
+        self.check_interval = check_interval
+        self.scale_down_after = scale_down_after
+        self.drain_timeout = drain_timeout
+        self.min_uptime = min_uptime
+        self.max_backoff = max_backoff
+
+        self.workers = []
+        self.desired = min_workers
+        self.restarts = 0
+        self.stopping = False
+        self._serial = 0
+        self._below_desired = 0
+        self._backoff = 0
+        self._next_spawn = 0.0
+
+    def run(self):
+        """
+        Supervise workers until SIGTERM/SIGINT, then drain them and return.
+        """
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+        logging.info(f"Supervisor started: {self.min_workers}-{self.max_workers} workers")
+        try:
+            while not self.stopping:
+                self.check()
+                self._sleep(self.check_interval)
+        finally:
+            self.drain()
+
+    def check(self):
+        """
+        Reap dead and hung workers, then start or drain workers to match the queue depth.
+        """
+        self._reap()
+        self._scale()
+        metrics.WORKERS.set(len(self.workers))
+
+    def drain(self):
+        """
+        Ask every worker to finish up and wait for them, killing those that do not exit in time.
+        """
+        logging.info(f"Draining {len(self.workers)} workers")
+        for handle in self.workers:
+            handle.stop.set()
+        deadline = time.monotonic() + self.drain_timeout
+        for handle in self.workers:
+            handle.process.join(max(deadline - time.monotonic(), 0))
+        for handle in self.workers:
+            if handle.process.is_alive():
+                logging.warning(f"{handle.name} did not drain in {self.drain_timeout}s, killing it")
+                self._kill(handle)
+            self._exited(handle)
+        self.workers = []
+        metrics.WORKERS.set(0)
+        logging.info("All workers stopped")
+
+    def metrics(self):
+        """
+        Return a snapshot of worker counts.
+        """
+        return {
+            "workers": len(self.workers),
+            "draining": sum(handle.draining_since is not None for handle in self.workers),
+            "desired": self.desired,
+            "restarts": self.restarts,
+        }
+
+    def _request_stop(self, signum, frame):
+        logging.info(f"Received signal {signum}, stopping")
+        self.stopping = True
+
+    def _sleep(self, seconds):
+        deadline = time.monotonic() + seconds
+        while not self.stopping and time.monotonic() < deadline:
+            time.sleep(min(0.5, deadline - time.monotonic()))
+
+    def _spawn(self):
+        self._serial += 1
+        value = multiprocessing.Value("d", time.monotonic(), lock=False)
+        stop = multiprocessing.Event()
+        process = multiprocessing.Process(
+            target=_run_worker,
+            args=(self.target, Heartbeat(value, stop)),
+            name=f"worker-{self._serial}",
+            daemon=True,
+        )
+        process.start()
+        self.workers.append(WorkerHandle(process, value, stop))
+        logging.info(f"Started {process.name} (pid {process.pid})")
+
+    def _kill(self, handle):
+        handle.process.kill()
+        handle.process.join(5)
+
+    def _release(self, handle):
+        try:
+            released = self.release_jobs(handle.process.pid)
+        except Exception as e:
+            logging.error(f"Failed to release jobs of {handle.name}: {e}")
+            return
+        if released:
+            logging.info(f"Released {released} jobs held by {handle.name}")
+
+    def _exited(self, handle):
+        metrics.worker_exited(handle.process.pid)
+        self._release(handle)
+
+    def _reap(self):
+        now = time.monotonic()
+        alive = []
+        for handle in self.workers:
+            process = handle.process
+            if handle.draining_since is not None:
+                if not process.is_alive():
+                    logging.info(f"{handle.name} drained")
+                elif now - handle.draining_since > self.drain_timeout:
+                    logging.warning(f"{handle.name} did not drain in {self.drain_timeout}s, killing it")
+                    self._kill(handle)
+                else:
+                    alive.append(handle)
+                    continue
+            elif not process.is_alive():
+                logging.error(f"{handle.name} exited with code {process.exitcode}, restarting")
+                self._crashed(now - handle.started_at)
+            elif now - handle.heartbeat.value > self.heartbeat_timeout:
+                logging.error(f"{handle.name} sent no heartbeat for {self.heartbeat_timeout}s, restarting")
+                self._kill(handle)
+                self._crashed(now - handle.started_at)
+            else:
+                alive.append(handle)
+                continue
+            self._exited(handle)
+        self.workers = alive
+
+    def _crashed(self, uptime):
+        self.restarts += 1
+        metrics.RESTARTS.inc()
+        # Back off while workers die right after starting (database down, broken config...)
+        if uptime < self.min_uptime:
+            self._backoff = min(max(self._backoff * 2, 1), self.max_backoff)
+        else:
+            self._backoff = 0
+        self._next_spawn = time.monotonic() + self._backoff
+
+    def _scale(self):
+        try:
+            due = self.count_due()
+        except Exception as e:
+            logging.error(f"Failed to read the queue depth: {e}")
+            due = None
+        previous = self.desired
+        if due is not None:
+            wanted = math.ceil(due / self.jobs_per_worker)
+            self.desired = min(max(wanted, self.min_workers), self.max_workers)
+        if self.desired > previous:
+            logging.info(f"{due} jobs due, scaling up to {self.desired} workers")
+
+        running = [handle for handle in self.workers if handle.draining_since is None]
+        if len(running) < self.desired:
+            self._below_desired = 0
+            if time.monotonic() < self._next_spawn:
+                return
+            for _ in range(self.desired - len(running)):
+                self._spawn()
+        elif len(running) > self.desired:
+            self._below_desired += 1
+            if self._below_desired >= self.scale_down_after:
+                self._below_desired = 0
+                handle = running[-1]
+                logging.info(f"{due} jobs due, draining {handle.name} ({len(running) - 1} workers left)")
+                handle.stop.set()
+                handle.draining_since = time.monotonic()
+        else:
+            self._below_desired = 0
@@ -11,6 +11,7 @@ BOT_NAME = "auto_ria_scraper"
 
 SPIDER_MODULES = ["auto_ria_scraper.spiders"]
 NEWSPIDER_MODULE = "auto_ria_scraper.spiders"
+COMMANDS_MODULE = "auto_ria_scraper.commands"
 
 ADDONS = {}
 
@@ -22,14 +23,15 @@ ADDONS = {}
 ROBOTSTXT_OBEY = True
 
 # Configure maximum concurrent requests performed by Scrapy (default: 16)
-#CONCURRENT_REQUESTS = 32
+CONCURRENT_REQUESTS = 32
 
 # Configure a delay for requests for the same website (default: 0)
 # See https://docs.scrapy.org/en/latest/topics/settings.html#download-delay
 # See also autothrottle settings and docs
-#DOWNLOAD_DELAY = 3
+# Starting point only: AdaptiveConcurrencyMiddleware tunes both per slot at runtime
+DOWNLOAD_DELAY = 0.5
 # The download delay setting will honor only one of:
-#CONCURRENT_REQUESTS_PER_DOMAIN = 16
+CONCURRENT_REQUESTS_PER_DOMAIN = 4
 #CONCURRENT_REQUESTS_PER_IP = 16
 
 # Disable cookies (enabled by default)
@@ -46,21 +48,59 @@ ROBOTSTXT_OBEY = True
 
 # Enable or disable spider middlewares
 # See https://docs.scrapy.org/en/latest/topics/spider-middleware.html
-#SPIDER_MIDDLEWARES = {
-#    "auto_ria_scraper.middlewares.AutoRiaScraperSpiderMiddleware": 543,
-#}
+SPIDER_MIDDLEWARES = {
+    "auto_ria_scraper.middlewares.IncrementalSpiderMiddleware": 543,
+    "auto_ria_scraper.middlewares.CallbackTimerSpiderMiddleware": 990,
+}
+
+# Incremental re-crawl: skip detail pages of listings already seen within the freshness window
+INCREMENTAL_CRAWL = False
+INCREMENTAL_FRESHNESS_DAYS = 7
+# Switch from an exact set to a Bloom filter above this many known listings
+INCREMENTAL_BLOOM_THRESHOLD = 1_000_000
+INCREMENTAL_BLOOM_ERROR_RATE = 0.001
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-#DOWNLOADER_MIDDLEWARES = {
-#    "auto_ria_scraper.middlewares.AutoRiaScraperDownloaderMiddleware": 543,
-#}
+DOWNLOADER_MIDDLEWARES = {
+    "auto_ria_scraper.middlewares.PaginationCutoffMiddleware": 50,
+    # Closer to the downloader than RetryMiddleware (550), so it sees every ban before a retry
+    "auto_ria_scraper.middlewares.AdaptiveConcurrencyMiddleware": 560,
+    "scrapy.downloadermiddlewares.httpcache.HttpCacheMiddleware": None,
+    "auto_ria_scraper.httpcache.AutoRiaHttpCacheMiddleware": 900,
+    # Next to the downloader, so raw responses (redirects, compressed bodies) are recorded
+    "auto_ria_scraper.replay.ResponseRecorderMiddleware": 950,
+}
+
+# AIMD rate/concurrency control per download slot (replaces AutoThrottle, keep that disabled)
+ADAPTIVE_CONCURRENCY_ENABLED = True
+ADAPTIVE_MIN_CONCURRENCY = 1
+ADAPTIVE_MAX_CONCURRENCY = 16
+# Delay bounds, i.e. at most 20 and at least 1/30 requests/sec per slot
+ADAPTIVE_MIN_DELAY = 0.05
+ADAPTIVE_MAX_DELAY = 30.0
+# Requests/sec added after every clean window
+ADAPTIVE_RATE_STEP = 1.0
+ADAPTIVE_TARGET_LATENCY = 2.0
+ADAPTIVE_DECREASE_FACTOR = 0.5
+ADAPTIVE_COOLDOWN = 5.0
+ADAPTIVE_BAN_STATUSES = [429, 403]
+ADAPTIVE_BAN_MARKERS = ["g-recaptcha", "/captcha"]
+
+# Record downloaded responses into an offline corpus for `scrapy replaybench`
+REPLAY_RECORD = False
+REPLAY_CORPUS_DIR = "corpus"
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-#EXTENSIONS = {
-#    "scrapy.extensions.telnet.TelnetConsole": None,
-#}
+EXTENSIONS = {
+    "auto_ria_scraper.metrics.PrometheusExporter": 500,
+}
+
+# Prometheus metrics endpoint (http://METRICS_HOST:METRICS_PORT/metrics)
+METRICS_ENABLED = True
+METRICS_HOST = "0.0.0.0"
+METRICS_PORT = 9410
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
@@ -83,17 +123,49 @@ ROBOTSTXT_OBEY = True
 
 # Enable and configure HTTP caching (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html#httpcache-middleware-settings
-#HTTPCACHE_ENABLED = True
-#HTTPCACHE_EXPIRATION_SECS = 0
-#HTTPCACHE_DIR = "httpcache"
+# Detail pages only, revalidated with conditional requests (see auto_ria_scraper.httpcache)
+HTTPCACHE_ENABLED = True
+HTTPCACHE_EXPIRATION_SECS = 0
+HTTPCACHE_DIR = "httpcache"
 #HTTPCACHE_IGNORE_HTTP_CODES = []
-#HTTPCACHE_STORAGE = "scrapy.extensions.httpcache.FilesystemCacheStorage"
+HTTPCACHE_STORAGE = "auto_ria_scraper.httpcache.LruCacheStorage"
+HTTPCACHE_POLICY = "auto_ria_scraper.httpcache.AutoRiaCachePolicy"
+# Least recently used pages are evicted above this size
+HTTPCACHE_MAX_BYTES = 2 * 1024**3
+# Reuse detail pages without ETag/Last-Modified this long: repeated runs on the same day skip
+# them, the next daily crawl downloads them again
+HTTPCACHE_DETAIL_MAX_AGE = 12 * 3600
+# Drop cached/304 detail pages instead of parsing them again. Off: a page whose last write to
+# the DB failed would be skipped for as long as it stays cached, and parsing a cached page is
+# cheap (the pipeline does not rewrite unchanged cars). Lite-mode detail requests are never dropped.
+HTTPCACHE_SKIP_UNCHANGED = False
 
 # Set settings whose default value is deprecated to a future-proof value
 FEED_EXPORT_ENCODING = "utf-8"
 
+# Columnar feed formats (`-O cars.parquet` / `-O cars.arrow`), with the columns of the
+# database export (python -m auto_ria_scraper.export)
+FEED_EXPORTERS = {
+    "parquet": "auto_ria_scraper.exporters.ParquetItemExporter",
+    "arrow": "auto_ria_scraper.exporters.ArrowItemExporter",
+}
+
 ITEM_PIPELINES = {
     "auto_ria_scraper.pipelines.PostgresPipeline": 100,
 }
 
+# PostgresPipeline flushes a batch when it reaches this many items
+# or when its oldest item has been buffered for this many seconds
+PIPELINE_BATCH_MAX_ITEMS = 2000
+PIPELINE_FLUSH_INTERVAL = 5.0
+# Batches allowed to queue for the background DB writer before the crawl is throttled
+PIPELINE_MAX_PENDING_BATCHES = 4
+# A repost of a known vehicle takes its phone number only from the same seller; when the
+# seller of either listing is unknown (lite mode), only if the first listing is this recent
+DEDUP_PHONE_REUSE_DAYS = 30
+
+# Sharded crawl (-a shards=1): initial USD price bands and how long a claimed shard stays leased
+SHARD_PRICE_BOUNDARIES = [0, 3000, 5000, 7000, 9000, 12000, 16000, 22000, 30000, 50000]
+SHARD_LEASE_MINUTES = 120
+
 LOG_LEVEL = "WARNING"
@@ -0,0 +1,29 @@
+# Resumable crawl profile: the project settings plus on-disk crawl state, for full crawls whose
+# request queue and dupefilter would otherwise grow in memory for the whole run.
+#
+#     SCRAPY_PROJECT=resumable scrapy crawl autoriaspider
+#
+# Stop it with a single Ctrl+C (or SIGTERM) and run the same command again to resume: queued
+# requests are read back from JOBDIR and pages already requested are not fetched again.
+# Remove the JOBDIR directory to start a new crawl from scratch.
+import os
+
+from auto_ria_scraper.settings import *  # noqa: F401,F403
+
+# Pending requests, seen fingerprints and spider.state live here between runs
+JOBDIR = os.getenv("SCRAPY_JOBDIR", "crawls/autoriaspider")
+
+# 8-byte fingerprints in a memory-mapped hash table (JOBDIR/requests.seen.bin)
+# instead of a set of hex strings that is also appended to JOBDIR/requests.seen
+DUPEFILTER_CLASS = "auto_ria_scraper.dupefilter.MmapDupeFilter"
+# Initial slots; the table doubles when 70% full (1M slots = 8 MB)
+DUPEFILTER_CAPACITY = 1 << 20
+
+# One disk queue per priority: listing pages (AutoRiaSpider.listing_priority) are dequeued
+# before detail pages. Both are FIFO, so detail pages are fetched in search-result order,
+# newest listings first, rather than from the last result page back (Scrapy's LIFO default).
+# Pickle, not marshal: lite-mode detail requests carry their partial item in meta.
+SCHEDULER_DISK_QUEUE = "scrapy.squeues.PickleFifoDiskQueue"
+SCHEDULER_MEMORY_QUEUE = "scrapy.squeues.FifoMemoryQueue"
+# Log requests that cannot be serialized: they stay in memory and are lost on resume
+SCHEDULER_DEBUG = True
@@ -0,0 +1,153 @@
+from collections import namedtuple
+from urllib.parse import parse_qs, urlencode, urlparse, urlunparse
+
+# A USD price band of the search; price_max is None for the open-ended top band
+Shard = namedtuple("Shard", ["id", "price_min", "price_max"])
+
+# Arbitrary constant for pg_advisory_xact_lock, serialises seeding across nodes
+SEED_LOCK_KEY = 4710
+
+
+def shard_url(url, shard):
+    """
+    Restrict a search URL to the shard's USD price band.
+    """
+    parsed = urlparse(url)
+    qs = parse_qs(parsed.query)
+    qs["price.USD.gte"] = [str(shard.price_min)]
+    if shard.price_max is not None:
+        qs["price.USD.lte"] = [str(shard.price_max)]
+    else:
+        qs.pop("price.USD.lte", None)
+    return urlunparse(parsed._replace(query=urlencode(qs, doseq=True)))
+
+
+class ShardCoordinator:
+    """
+    Postgres-backed coordinator that hands disjoint price-band shards of the search to crawler nodes.
+    - Shards live in 'crawl_shards' and move pending -> in_progress -> done (or split).
+    - Claims use SKIP LOCKED, so any number of nodes can claim concurrently without overlap.
+    - A node renews the lease of the shard it is crawling; a shard whose node died is
+      claimable again once its lease has expired.
+    - Shards with more results than the site will page through are split in two.
+    """
+
+    def __init__(self, conn, node, lease_minutes=120):
+        self.conn = conn
+        self.node = node
+        self.lease_minutes = lease_minutes
+
+    def seed(self, boundaries):
+        """
+        Start a new crawl round if the previous one is finished (or none exists).
+        - `boundaries` are ascending USD prices; consecutive pairs become shards and
+          the last value starts an open-ended top shard.
+        - Nodes that start while a round is still running join it instead.
+        Returns True if a new round was seeded.
+        """
+        with self.conn, self.conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (SEED_LOCK_KEY,))
+            cur.execute("SELECT 1 FROM crawl_shards WHERE status IN ('pending', 'in_progress') LIMIT 1")
+            if cur.fetchone():
+                return False
+            cur.execute("DELETE FROM crawl_shards")
+            # Price filters are inclusive on both ends, so each band stops one below the next
+            bands = [(low, high - 1) for low, high in zip(boundaries, boundaries[1:])]
+            bands.append((boundaries[-1], None))
+            cur.executemany(
+                "INSERT INTO crawl_shards (price_min, price_max) VALUES (%s, %s)",
+                bands,
+            )
+        return True
+
+    def claim(self):
+        """
+        Claim the next pending (or lease-expired) shard for this node, or return None if none are left.
+        """
+        with self.conn, self.conn.cursor() as cur:
+            cur.execute(
+                "UPDATE crawl_shards SET status='in_progress', claimed_by=%s, claimed_at=now() "
+                "WHERE id = ("
+                "  SELECT id FROM crawl_shards "
+                "  WHERE status='pending' "
+                "  OR (status='in_progress' AND claimed_at < now() - make_interval(mins => %s)) "
+                "  ORDER BY id LIMIT 1 FOR UPDATE SKIP LOCKED"
+                ") "
+                "RETURNING id, price_min, price_max",
+                (self.node, self.lease_minutes),
+            )
+            row = cur.fetchone()
+        return Shard(*row) if row else None
+
+    def renew(self, shard):
+        """
+        Extend the lease of a shard this node is crawling, so no other node claims it while the
+        crawl takes longer than lease_minutes.
+        Returns False if the shard is no longer held by this node (its lease expired and it was claimed again).
+        """
+        with self.conn, self.conn.cursor() as cur:
+            cur.execute(
+                "UPDATE crawl_shards SET claimed_at=now() "
+                "WHERE id=%s AND claimed_by=%s AND status='in_progress'",
+                (shard.id, self.node),
+            )
+            return cur.rowcount == 1
+
+    def complete(self, shard, result_count=None):
+        """
+        Mark a shard held by this node as fully crawled.
+        Returns False if the shard is no longer held by this node.
+        """
+        with self.conn, self.conn.cursor() as cur:
+            cur.execute(
+                "UPDATE crawl_shards SET status='done', result_count=%s "
+                "WHERE id=%s AND claimed_by=%s AND status='in_progress'",
+                (result_count, shard.id, self.node),
+            )
+            return cur.rowcount == 1
+
+    def release(self, shard):
+        """
+        Return an unfinished shard held by this node to the pool (e.g. when the node shuts down early).
+        """
+        with self.conn, self.conn.cursor() as cur:
+            cur.execute(
+                "UPDATE crawl_shards SET status='pending', claimed_by=NULL, claimed_at=NULL "
+                "WHERE id=%s AND claimed_by=%s AND status='in_progress'",
+                (shard.id, self.node),
+            )
+
+    def split(self, shard, result_count):
+        """
+        Replace a shard that exceeds the site's result cap with two pending halves.
+        Bounded bands are bisected; the open-ended top band [a, inf) becomes [a, 2a) and [2a, inf).
+        Returns False if the band is a single price and cannot be split further, or if this node
+        no longer holds the shard (its lease expired and another node may be crawling it).
+        """
+        if shard.price_max is None:
+            middle = max(shard.price_min * 2, shard.price_min + 1)
+            halves = [(shard.price_min, middle - 1), (middle, None)]
+        elif shard.price_max > shard.price_min:
+            middle = (shard.price_min + shard.price_max) // 2
+            halves = [(shard.price_min, middle), (middle + 1, shard.price_max)]
+        else:
+            return False
+        with self.conn, self.conn.cursor() as cur:
+            cur.execute(
+                "UPDATE crawl_shards SET status='split', result_count=%s "
+                "WHERE id=%s AND claimed_by=%s AND status='in_progress'",
+                (result_count, shard.id, self.node),
+            )
+            if cur.rowcount != 1:
+                return False
+            cur.executemany(
+                "INSERT INTO crawl_shards (price_min, price_max) VALUES (%s, %s)",
+                halves,
+            )
+        return True
+
+    def close(self):
+        """
+        Close the coordinator's connection.
+        """
+        self.conn.close()
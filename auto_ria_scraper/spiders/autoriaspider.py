@@ -1,9 +1,18 @@
 import scrapy
+from scrapy import signals
+from scrapy.exceptions import DontCloseSpider
+from twisted.internet import task
 from datetime import datetime, timezone, timedelta
+import math
+import os
 import re
+import socket
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
 
+from auto_ria_scraper.db import get_connection
+from auto_ria_scraper.extractors import extract_detail
 from auto_ria_scraper.items import AutoRiaItem
+from auto_ria_scraper.shards import ShardCoordinator, shard_url
 
 
 class AutoRiaSpider(scrapy.Spider):
@@ -13,118 +22,285 @@ class AutoRiaSpider(scrapy.Spider):
     allowed_domains = ["auto.ria.com"]
     # Starting URL (first page of the car listings)
     start_urls = ["https://auto.ria.com/uk/search/?lang_id=4&page=0&countpage=100&indexName=auto&custom=1&abroad=2"]
-    # Limit for maximum pages to crawl (for efficiency/testing)
-    max_pages = 30
+    # Fields a lite-mode card item must have; if any is missing the detail page is fetched for it
+    lite_detail_fields = ("car_vin", "car_number", "image_url")
+    # Listing pages outrank detail pages (priority 0) so the whole result set is requested early
+    listing_priority = 10
+
+    def __init__(self, lite=False, max_pages=30, shards=False, *args, **kwargs):
+        """
+        Spider arguments:
+        - lite: build items from the search-result cards and fetch detail pages only
+          for cards missing one of lite_detail_fields (`scrapy crawl autoriaspider -a lite=1`).
+        - max_pages: highest result page index to crawl (`-a max_pages=5`).
+        - shards: crawl price-band shards claimed from the 'crawl_shards' table, so several
+          nodes can split the search between them (`-a shards=1`).
+        """
+        super().__init__(*args, **kwargs)
+        self.lite = str(lite).lower() in ("1", "true", "yes")
+        self.max_pages = int(max_pages)
+        self.sharded = str(shards).lower() in ("1", "true", "yes")
+        # Highest page index that may still hold results; lowered once an empty page is seen
+        self.last_page = None
+        self.coordinator = None
+        self.shard = None
+        self.shard_results = None
+        self.lease_renewal = None
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        if spider.sharded:
+            crawler.signals.connect(spider.spider_idle, signal=signals.spider_idle)
+        return spider
+
+    async def start(self):
+        """
+        Request the first page of every start URL with listing-page priority.
+        In sharded mode, joins (or seeds) the current crawl round and requests the first claimed shard.
+        """
+        if self.sharded:
+            self.coordinator = ShardCoordinator(
+                get_connection(),
+                node=f"{socket.gethostname()}-{os.getpid()}",
+                lease_minutes=self.settings.getint("SHARD_LEASE_MINUTES", 120),
+            )
+            boundaries = [int(b) for b in self.settings.getlist("SHARD_PRICE_BOUNDARIES")]
+            if self.coordinator.seed(boundaries):
+                self.logger.info("Seeded a new sharded crawl round")
+            # Renew the current shard's lease four times per lease period
+            self.lease_renewal = task.LoopingCall(self.renew_shard)
+            self.lease_renewal.start(self.coordinator.lease_minutes * 60 / 4, now=False)
+            request = self.next_shard_request()
+            if request is not None:
+                yield request
+            return
+        for url in self.start_urls:
+            yield self.page_request(url, self.page_number(url))
+
+    def next_shard_request(self):
+        """
+        Claim the next shard and return the request for its first page, or None if all are taken.
+        """
+        self.shard = self.coordinator.claim()
+        self.shard_results = None
+        self.last_page = None
+        if self.shard is None:
+            return None
+        self.logger.info(f"Claimed shard {self.shard}")
+        request = self.page_request(shard_url(self.start_urls[0], self.shard), 0)
+        request.meta["shard"] = self.shard
+        return request
+
+    def renew_shard(self):
+        """
+        Sharded mode: extend the lease of the shard being crawled. If another node has taken it
+        over (the lease expired anyway, e.g. while the DB was unreachable), stop tracking it so
+        it is neither completed nor released by this node.
+        """
+        if self.shard is None:
+            return
+        try:
+            renewed = self.coordinator.renew(self.shard)
+        except Exception as e:
+            self.logger.warning(f"Could not renew the lease of shard {self.shard}: {e}")
+            return
+        if not renewed:
+            self.logger.warning(f"Lost the lease of shard {self.shard} to another node")
+            self.crawler.stats.inc_value("shards/lost")
+            self.shard = None
+
+    def spider_idle(self):
+        """
+        Sharded mode: once every request of the current shard is done, mark it complete
+        and keep the spider open with the next claimed shard.
+        """
+        if self.shard is not None:
+            if self.coordinator.complete(self.shard, self.shard_results):
+                self.crawler.stats.inc_value("shards/done")
+            else:
+                self.logger.warning(f"Shard {self.shard} was taken over by another node before it was completed")
+                self.crawler.stats.inc_value("shards/lost")
+        request = self.next_shard_request()
+        if request is not None:
+            self.crawler.engine.crawl(request)
+            raise DontCloseSpider
 
     def parse(self, response):
         """
         Main parse method for listing pages.
         - Extracts individual car links from the search results and schedules parsing their details.
-        - Handles pagination up to max_pages, constructing next page URLs dynamically.
+        - In lite mode builds items straight from the cards instead (see parse_card).
+        - On the first page, reads the total result count and schedules every remaining page
+          (up to max_pages) at once; falls back to next-page chaining if the count is missing.
         """
+        page = self.page_number(response.url)
         cars = response.css("div.content-bar")
         if not cars:
-            # If no car items found, stop parsing this page.
+            # If no car items found, stop parsing this page and cancel later pages still queued
+            if self.last_page is None or page - 1 < self.last_page:
+                self.last_page = page - 1
             return
+        first_page = not response.meta.get("fanned_out")
+        total = self.parse_total_count(response) if first_page else None
+        per_page = int(parse_qs(urlparse(response.url).query).get("countpage", ["10"])[0])
+        shard = response.meta.get("shard")
+        # A shard whose lease was lost (see renew_shard) is no longer this node's to split
+        if shard is not None and shard == self.shard:
+            self.shard_results = total
+            if total is not None and total > (self.max_pages + 1) * per_page and self.coordinator.split(shard, total):
+                # More results than max_pages can reach: let the two halves of the shard be crawled instead
+                self.logger.info(f"Shard {shard} has {total} results, split in two")
+                self.crawler.stats.inc_value("shards/split")
+                self.shard = None
+                return
+
         for car in cars:
             url = car.css("a.address::attr(href)").get()
-            if url:
+            if not url:
+                continue
+            self.crawler.stats.inc_value("listing/found")
+            if self.lite:
+                yield from self.parse_card(response, car, response.urljoin(url))
+            else:
                 # Schedule a request for the car detail page
                 yield response.follow(url, callback=self.parse_car_detail)
 
-        # Handle pagination: extract current page number, build next page URL
-        parsed = urlparse(response.url)
+        if not first_page:
+            # This page was scheduled by the first page's fan-out
+            return
+        if total is None:
+            # Count not found: fall back to requesting the next page only
+            if page < self.max_pages:
+                yield self.page_request(response.url, page + 1)
+            else:
+                self.logger.info(f"Reached max page {self.max_pages}, stopping pagination")
+            return
+        last_page = math.ceil(total / per_page) - 1
+        if last_page > self.max_pages:
+            self.logger.info(f"{total} results span {last_page + 1} pages, limiting to max page {self.max_pages}")
+            last_page = self.max_pages
+        for next_page in range(page + 1, last_page + 1):
+            yield self.page_request(response.url, next_page, fanned_out=True)
+
+    def parse_total_count(self, response):
+        """
+        Return the total number of search results shown on a listing page, or None if absent.
+        """
+        text = (
+            response.css("#staticResultsCount::text").get()
+            or response.css("#resultsCount strong::text").get()
+        )
+        digits = re.sub(r"\D", "", text) if text else ""
+        return int(digits) if digits else None
+
+    @staticmethod
+    def page_number(url):
+        """
+        Return the 'page' query parameter of a search URL (0 if absent).
+        """
+        return int(parse_qs(urlparse(url).query).get("page", ["0"])[0])
+
+    def page_request(self, url, page, fanned_out=False):
+        """
+        Build the request for result page `page` of the search in `url`.
+        The page index is kept in meta so PaginationCutoffMiddleware can drop pages past last_page.
+        """
+        parsed = urlparse(url)
         qs = parse_qs(parsed.query)
-        current_page = int(qs.get("page", ["0"])[0])
-        if current_page < self.max_pages:
-            next_page = current_page + 1
-            qs["page"] = [str(next_page)]
-            new_query = urlencode(qs, doseq=True)
-            next_url = urlunparse(parsed._replace(query=new_query))
-            # Schedule the next page for parsing
-            yield scrapy.Request(next_url, callback=self.parse)
+        qs["page"] = [str(page)]
+        page_url = urlunparse(parsed._replace(query=urlencode(qs, doseq=True)))
+        return scrapy.Request(
+            page_url,
+            callback=self.parse,
+            priority=self.listing_priority,
+            meta={"listing_page": page, "fanned_out": fanned_out},
+        )
+
+    def parse_card(self, response, car, url):
+        """
+        Build an item from a search-result card (lite mode).
+        - Extracts title, price, mileage, main image, plate number and VIN when the card shows them.
+        - Yields the item directly if every field in lite_detail_fields is present,
+          otherwise schedules the detail page with the partial item to fill the gaps.
+        """
+        item = AutoRiaItem()
+        item["url"] = url
+
+        title = car.css("a.address::attr(title)").get() or car.css("a.address span::text").get()
+        item["title"] = title.strip() if title else None
+
+        # Prefer the machine-readable main price when it is in USD, fall back to the USD label
+        price = None
+        if car.css("div.price-ticket::attr(data-main-currency)").get() == "USD":
+            price = car.css("div.price-ticket::attr(data-main-price)").get()
+        if not price:
+            price = car.css("span[data-currency='USD']::text").get()
+        price_clean = re.sub(r"[^\d]", "", price) if price else ""
+        item["price_usd"] = int(price_clean) if price_clean else None
+
+        # Mileage is shown as e.g. "95 тис. км"
+        race = car.css("li.item-char.js-race::text").get()
+        race_match = re.search(r"(\d+)", race) if race else None
+        item["odometer"] = int(race_match.group(1)) * 1000 if race_match else None
+
+        item["username"] = None
+        image = car.css("div.ticket-photo img::attr(src)").get()
+        item["image_url"] = image or None
+        item["images_count"] = None
+        car_number = car.css("span.state-num::text").get()
+        item["car_number"] = car_number.strip() if car_number else None
+        vin = car.css("span.label-vin span::text").get() or car.css("span.label-vin::text").get()
+        item["car_vin"] = vin.strip() if vin and vin.strip() else None
+        item["datetime_found"] = datetime.now(timezone(timedelta(hours=3))).isoformat()
+
+        if all(item.get(field) for field in self.lite_detail_fields):
+            self.crawler.stats.inc_value("lite/card_items")
+            yield item
         else:
-            # Log a message if maximum page limit reached
-            self.logger.info(f"Reached max page {self.max_pages}, stopping pagination")
+            self.crawler.stats.inc_value("lite/detail_requests")
+            yield response.follow(url, callback=self.parse_car_detail, cb_kwargs={"card_item": item})
 
-    def parse_car_detail(self, response):
+    def closed(self, reason):
+        """
+        Record how many requests were spent per listing found on search pages.
+        In sharded mode, hands an unfinished shard back to the pool.
+        """
+        stats = self.crawler.stats
+        listings = stats.get_value("listing/found", 0)
+        if listings:
+            requests = stats.get_value("downloader/request_count", 0)
+            stats.set_value("listing/requests_per_listing", round(requests / listings, 3))
+        if self.lease_renewal is not None and self.lease_renewal.running:
+            self.lease_renewal.stop()
+        if self.coordinator is not None:
+            if self.shard is not None:
+                self.coordinator.release(self.shard)
+            self.coordinator.close()
+
+    def parse_car_detail(self, response, card_item=None):
         """
         Parse the detail page for a single car.
         - Extracts car attributes (title, price, odometer, seller, images, VIN, etc.)
+          with the precompiled selector plan in auto_ria_scraper.extractors
+        - In lite mode, fills only the fields the search card (card_item) did not provide.
         - Returns an item with all scraped information.
         """
         item = AutoRiaItem()
         item["url"] = response.url
 
-        # Extract car title (strip whitespace, handle missing case)
-        item["title"] = response.css("h1.head::text").get().strip() if response.css("h1.head::text").get() else None
-
-        # Extract USD price (clean formatting, fallback if not found)
-        price_usd_text = response.css("div.price_value--additional span[data-currency='USD']::text").get()
-        if price_usd_text:
-            price_clean = re.sub(r"[^\d]", "", price_usd_text)
-            item["price_usd"] = int(price_clean) if price_clean.isdigit() else None
-        else:
-            price_text = response.css("div.price_value strong::text").get()
-            if price_text:
-                price_clean = re.sub(r"[^\d]", "", price_text)
-                item["price_usd"] = int(price_clean) if price_clean.isdigit() else None
-            else:
-                item["price_usd"] = None
-
-        # Extract odometer value (in thousands, handle parsing errors)
-        odometer_span = response.css("div.base-information.bold span.size18::text").get()
-        if odometer_span:
-            try:
-                odometer_val = int(odometer_span.strip())
-                odometer = odometer_val * 1000
-            except ValueError:
-                odometer = None
-        else:
-            odometer = None
-        item["odometer"] = odometer
-
-        # Extract seller username (prefer modern class, fallback to classic)
-        seller_area = response.css("div.seller_info_area")
-        name_node = seller_area.css(".seller_info_name")
-        if name_node:
-            username = name_node.xpath("normalize-space(string(.))").get()
-        else:
-            raw = seller_area.css("a.sellerPro::text").get()
-            username = raw.strip() if raw else None
-        item["username"] = username
-
-        # Extract main image from the photo blocks (first found)
-        photo_blocks = response.xpath("//div[@class='photo-620x465']")
-        main_image = None
-        for block in photo_blocks:
-            img_url = block.xpath(".//img[@class='outline m-auto']/@src").get()
-            if img_url:
-                main_image = img_url
-                break
-        item["image_url"] = main_image
-
-        # Extract the count of images (from text or fallback to number of blocks)
-        photos_text = response.css("a.show-all.link-dotted::text").get()
-        images_count = None
-        if photos_text:
-            match = re.search(r"(\d+)", photos_text)
-            if match:
-                images_count = int(match.group(1))
-        if images_count is None:
-            images_count = len(photo_blocks)
-        item["images_count"] = images_count
-
-        # Extract car plate number (if exists)
-        car_number = response.css("span.state-num.ua::text").get()
-        item["car_number"] = car_number.strip() if car_number else None
-
-        # Extract VIN number (if exists)
-        vin = response.css("span.label-vin::text").get()
-        item["car_vin"] = vin.strip() if vin else None
+        # Extract all attributes in one pass of precompiled queries over the lxml tree
+        item.update(extract_detail(response.selector.root))
 
         # Record datetime of when this car was scraped (ISO8601 with UTC+3 offset)
         item["datetime_found"] = datetime.now(timezone(timedelta(hours=3))).isoformat()
 
+        if card_item is not None:
+            # Keep what the card already had and take the rest from the detail page
+            for field, value in item.items():
+                if card_item.get(field) is None:
+                    card_item[field] = value
+            item = card_item
+
         # Return the filled item to the pipeline
         yield item
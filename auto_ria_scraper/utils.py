@@ -0,0 +1,13 @@
+import re
+
+# Listing id is the numeric suffix of the detail page URL (..._35123456.html).
+# Shared with the phone worker (selenium/http_phone.py), whose image copies this module.
+AUTO_ID_RE = re.compile(r"_(\d+)\.html")
+
+
+def listing_id(url):
+    """
+    Return the numeric auto.ria listing id of a detail page URL, or None for other URLs.
+    """
+    match = AUTO_ID_RE.search(url or "")
+    return int(match.group(1)) if match else None
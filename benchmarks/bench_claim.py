@@ -0,0 +1,108 @@
+"""
+Benchmark phone-job claiming against a local PostgreSQL.
+
+Compares the original one-row claim (SELECT ... FOR UPDATE, UPDATE, UPDATE per car)
+with batched claiming (UPDATE ... RETURNING) and batched acknowledgements on the phone_jobs queue.
+Phone lookups are replaced by a no-op so only DB overhead is measured.
+
+Runs in a scratch schema, so it never touches the real `cars` table:
+
+    DB_HOST=localhost python benchmarks/bench_claim.py --rows 20000 --batch 50
+"""
+import argparse
+import os
+import sys
+import time
+
+import psycopg2
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "auto_ria_scraper", "selenium"))
+from jobs import claim_jobs, flush_results  # noqa: E402
+
+from auto_ria_scraper.migrate import migrate  # noqa: E402
+
+SCHEMA = "bench_claim"
+
+
+def connect():
+    return psycopg2.connect(
+        dbname=os.getenv("DB_NAME", "autodb"),
+        user=os.getenv("DB_USER", "autoria"),
+        password=os.getenv("DB_PASS", "autoria"),
+        host=os.getenv("DB_HOST", "localhost"),
+        port=os.getenv("DB_PORT", "5432"),
+        options=f"-c search_path={SCHEMA}",
+    )
+
+
+def reset(conn, rows):
+    with conn, conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    migrate(conn, log=lambda message: None)
+    with conn, conn.cursor() as cur:
+        cur.execute(
+            "INSERT INTO cars (url) SELECT 'https://auto.ria.com/uk/auto_' || g || '.html' "
+            "FROM generate_series(1, %s) g",
+            (rows,),
+        )
+        cur.execute("INSERT INTO phone_jobs (car_id, url, datetime_found) SELECT id, url, datetime_found FROM cars")
+
+
+def legacy(conn):
+    done = 0
+    while True:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT id, url FROM cars "
+                "WHERE phone_status IN ('pending','error') "
+                "ORDER BY CASE WHEN phone_status='pending' THEN 0 ELSE 1 END "
+                "LIMIT 1 FOR UPDATE SKIP LOCKED"
+            )
+            row = cur.fetchone()
+        if not row:
+            conn.rollback()
+            return done
+        with conn:
+            conn.cursor().execute("UPDATE cars SET phone_status='in_progress' WHERE id=%s", (row[0],))
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE cars SET phone_number=%s, phone_status=%s WHERE id=%s",
+                ("380500000000", "success", row[0]),
+            )
+        conn.commit()
+        done += 1
+
+
+def batched(conn, batch):
+    done = 0
+    while True:
+        jobs = claim_jobs(conn, batch)
+        if not jobs:
+            return done
+        flush_results(conn, [(car_id, "380500000000", "success") for car_id, _ in jobs])
+        done += len(jobs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=50)
+    args = parser.parse_args()
+
+    conn = connect()
+    for label, run in (("legacy (1 row)", legacy), (f"batched ({args.batch} rows)", lambda c: batched(c, args.batch))):
+        reset(conn, args.rows)
+        start = time.perf_counter()
+        done = run(conn)
+        elapsed = time.perf_counter() - start
+        print(f"{label:<22} {done} jobs in {elapsed:.2f}s -> {done / elapsed:,.0f} jobs/s")
+    with conn, conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Measure the memory held by crawl state (scheduler queues and dupefilter) for many queued requests.
+
+For the default profile (in-memory queues, set-based dupefilter) and the resumable profile
+(auto_ria_scraper.settings_resumable: JOBDIR disk queues, memory-mapped dupefilter), a fresh
+process opens Scrapy's scheduler for AutoRiaSpider and enqueues --requests detail-page requests
+plus --pages listing pages, the way a full crawl queues them, and reports the RSS growth and
+enqueue/dequeue rates. The resumable profile is then "interrupted" halfway: the scheduler is
+closed after dequeuing half of the requests and reopened from JOBDIR, and the bench checks that
+exactly the other half is still queued and that re-yielding the fetched half is filtered out:
+
+    python benchmarks/bench_crawl_state.py --requests 100000
+"""
+import argparse
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+
+PROFILES = {
+    "default": "auto_ria_scraper.settings",
+    "resumable": "auto_ria_scraper.settings_resumable",
+}
+
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def open_scheduler(module, jobdir):
+    from scrapy import Request
+    from scrapy.core.scheduler import Scheduler
+    from scrapy.settings import Settings
+    from scrapy.utils.reactor import install_reactor, is_reactor_installed
+    from scrapy.utils.test import get_crawler
+
+    from auto_ria_scraper.spiders.autoriaspider import AutoRiaSpider
+
+    settings = Settings()
+    settings.setmodule(module)
+    overrides = {key: settings[key] for key in settings}
+    overrides.update({"JOBDIR": jobdir, "METRICS_ENABLED": False, "LOG_LEVEL": "ERROR"})
+    if module == PROFILES["default"]:
+        overrides["JOBDIR"] = None
+    if not is_reactor_installed():
+        install_reactor(settings["TWISTED_REACTOR"])
+    crawler = get_crawler(AutoRiaSpider, overrides)
+    spider = crawler.spider = AutoRiaSpider.from_crawler(crawler)
+    scheduler = Scheduler.from_crawler(crawler)
+    scheduler.open(spider)
+    return scheduler, spider, Request
+
+
+def requests_for(spider, request_cls, pages, count):
+    search = spider.start_urls[0]
+    for page in range(pages):
+        yield spider.page_request(search, page, fanned_out=page > 0)
+    for n in range(count):
+        yield request_cls(f"https://auto.ria.com/uk/auto_bench_model_{30_000_000 + n}.html", callback=spider.parse_car_detail)
+
+
+def child(profile, count, pages, jobdir):
+    scheduler, spider, request_cls = open_scheduler(PROFILES[profile], jobdir)
+    before = rss_mb()
+    start = time.perf_counter()
+    for request in requests_for(spider, request_cls, pages, count):
+        scheduler.enqueue_request(request)
+    enqueued = time.perf_counter() - start
+    queued_rss = rss_mb() - before
+    total = len(scheduler)
+
+    start = time.perf_counter()
+    half = total // 2
+    for _ in range(half):
+        scheduler.next_request()
+    dequeued = time.perf_counter() - start
+    print(
+        f"{profile:<10} {total:,} queued: RSS +{queued_rss:.0f} MB, "
+        f"enqueue {total / enqueued:,.0f}/s, dequeue {half / dequeued:,.0f}/s",
+        flush=True,
+    )
+    scheduler.close("shutdown")
+    if profile != "resumable":
+        return
+
+    # Resume from JOBDIR: the undequeued half is still queued, the fetched half is filtered out
+    scheduler, spider, request_cls = open_scheduler(PROFILES[profile], jobdir)
+    remaining = len(scheduler)
+    accepted = sum(scheduler.enqueue_request(r) for r in requests_for(spider, request_cls, pages, count))
+    size = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(jobdir) for f in files)
+    print(
+        f"{'':<10} resumed: {remaining:,} still queued (expected {total - half:,}), "
+        f"{accepted} of {total:,} re-yielded requests accepted (expected 0), JOBDIR {size / 1024**2:.1f} MB",
+        flush=True,
+    )
+    scheduler.close("finished")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100_000, help="detail-page requests to queue")
+    parser.add_argument("--pages", type=int, default=1000, help="listing-page requests to queue")
+    parser.add_argument("--child", choices=sorted(PROFILES), help=argparse.SUPPRESS)
+    parser.add_argument("--jobdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.requests, args.pages, args.jobdir)
+        return
+    jobdir = tempfile.mkdtemp(prefix="crawl-state-")
+    try:
+        # One process per profile, so each starts from the same baseline RSS
+        for profile in PROFILES:
+            subprocess.run(
+                [sys.executable, __file__, "--child", profile, "--requests", str(args.requests),
+                 "--pages", str(args.pages), "--jobdir", jobdir],
+                check=True,
+            )
+    finally:
+        shutil.rmtree(jobdir)
+
+
+if __name__ == "__main__":
+    main()
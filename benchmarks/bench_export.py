@@ -0,0 +1,102 @@
+"""
+Benchmark the columnar export of 'cars' (python -m auto_ria_scraper.export) against a local PostgreSQL.
+
+Loads --rows cars spread over the last --months months into a scratch schema, exports them to
+Parquet and to Arrow in a temporary directory, then adds --increment newer rows and runs an
+incremental Parquet export. Reports rows/s, file sizes, the peak Arrow memory pool allocation and
+the process peak RSS, which should stay flat as --rows grows (only --chunk-rows rows are held):
+
+    DB_HOST=localhost python benchmarks/bench_export.py --rows 2000000 --chunk-rows 50000
+"""
+import argparse
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+SCHEMA = "bench_export"
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+os.environ["PGOPTIONS"] = f"-c search_path={SCHEMA}"
+os.environ.setdefault("DB_HOST", "localhost")
+sys.path.insert(0, ROOT)
+
+import pyarrow as pa  # noqa: E402
+import pyarrow.dataset as ds  # noqa: E402
+
+from auto_ria_scraper.db import get_connection  # noqa: E402
+from auto_ria_scraper.export import export_cars  # noqa: E402
+from auto_ria_scraper.migrate import migrate  # noqa: E402
+
+
+def load(conn, first, last, months, offset_months):
+    # Row g is found (g / last) of the way through the window, so ids follow datetime_found
+    with conn, conn.cursor() as cur:
+        cur.execute(
+            "INSERT INTO cars (id, url, title, price_usd, odometer, username, image_url, images_count,"
+            "                  datetime_found, phone_status, phone_number) "
+            "SELECT g, 'https://auto.ria.com/uk/auto_bench_' || g || '.html', 'Car ' || g, 3000 + g %% 40000,"
+            "  g %% 300 * 1000, 'seller ' || g %% 5000, 'https://cdn.riastatic.com/photos/' || g || 'f.jpg', g %% 40,"
+            "  now() - make_interval(months => %(offset)s) - make_interval(months => %(months)s) * (1 - g::float8 / %(last)s),"
+            "  'success', '+380500000000' "
+            "FROM generate_series(%(first)s, %(last)s) g",
+            {"first": first, "last": last, "months": months, "offset": offset_months},
+        )
+
+
+def dir_size(path):
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+
+
+def run(conn, label, out_dir, **kwargs):
+    start = time.perf_counter()
+    rows, files = export_cars(conn, out_dir, log=lambda message: None, **kwargs)
+    elapsed = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(
+        f"{label:<22} {rows:,} rows, {files} files in {elapsed:.1f}s -> {rows / elapsed:,.0f} rows/s, "
+        f"{dir_size(out_dir) / 1024**2:.1f} MB on disk, arrow pool peak {pa.default_memory_pool().max_memory() / 1024**2:.0f} MB, "
+        f"process peak RSS {peak_rss:.0f} MB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--increment", type=int, default=100_000, help="rows added before the incremental run")
+    parser.add_argument("--chunk-rows", type=int, default=50_000)
+    args = parser.parse_args()
+
+    conn = get_connection()
+    with conn, conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    migrate(conn, log=lambda message: None)
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT ensure_cars_partitions(now() - make_interval(months => %s), 1)", (args.months + 1,))
+    # The first rows end a month ago, the increment fills the last month
+    load(conn, 1, args.rows, args.months, 1)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"loaded {args.rows:,} rows, process peak RSS before exporting {baseline:.0f} MB", flush=True)
+
+    out = tempfile.mkdtemp(prefix="cars-export-")
+    try:
+        run(conn, "parquet (full)", os.path.join(out, "parquet"), fmt="parquet", chunk_rows=args.chunk_rows)
+        run(conn, "arrow (full)", os.path.join(out, "arrow"), fmt="arrow", chunk_rows=args.chunk_rows)
+        load(conn, args.rows + 1, args.rows + args.increment, 1, 0)
+        run(conn, "parquet (incremental)", os.path.join(out, "parquet"), fmt="parquet", chunk_rows=args.chunk_rows)
+        dataset = ds.dataset(os.path.join(out, "parquet"), format="parquet", partitioning="hive")
+        # The last --lag (5 min) of the increment is left for the next run
+        print(f"parquet dataset: {dataset.count_rows():,} rows in {len(dataset.files)} files")
+    finally:
+        shutil.rmtree(out)
+        with conn, conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Micro-benchmark detail-page extraction over a corpus of saved pages.
+
+Compares the original parsel/CSS extraction of parse_car_detail with the precompiled
+lxml selector plan in auto_ria_scraper.extractors, reports pages/sec for each
+(HTML parsing included, since both start from the raw page) and checks that both
+produce the same fields.
+
+    python benchmarks/bench_extract.py path/to/detail_pages/ --rounds 5
+
+The corpus directory may hold plain `*.html` files or be a corpus recorded with
+`scrapy crawl autoriaspider -s REPLAY_RECORD=1 -s REPLAY_CORPUS_DIR=corpus`
+(only its detail pages are used).
+"""
+import argparse
+import gzip
+import os
+import re
+import sys
+import time
+import zlib
+
+from parsel import Selector
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from auto_ria_scraper.extractors import extract_detail  # noqa: E402
+from auto_ria_scraper.replay import CorpusStore  # noqa: E402
+from auto_ria_scraper.utils import listing_id  # noqa: E402
+
+
+def legacy_extract(response):
+    """
+    Field extraction exactly as parse_car_detail did it before the selector plan.
+    """
+    item = {}
+    item["title"] = response.css("h1.head::text").get().strip() if response.css("h1.head::text").get() else None
+
+    price_usd_text = response.css("div.price_value--additional span[data-currency='USD']::text").get()
+    if price_usd_text:
+        price_clean = re.sub(r"[^\d]", "", price_usd_text)
+        item["price_usd"] = int(price_clean) if price_clean.isdigit() else None
+    else:
+        price_text = response.css("div.price_value strong::text").get()
+        if price_text:
+            price_clean = re.sub(r"[^\d]", "", price_text)
+            item["price_usd"] = int(price_clean) if price_clean.isdigit() else None
+        else:
+            item["price_usd"] = None
+
+    odometer_span = response.css("div.base-information.bold span.size18::text").get()
+    if odometer_span:
+        try:
+            odometer = int(odometer_span.strip()) * 1000
+        except ValueError:
+            odometer = None
+    else:
+        odometer = None
+    item["odometer"] = odometer
+
+    seller_area = response.css("div.seller_info_area")
+    name_node = seller_area.css(".seller_info_name")
+    if name_node:
+        username = name_node.xpath("normalize-space(string(.))").get()
+    else:
+        raw = seller_area.css("a.sellerPro::text").get()
+        username = raw.strip() if raw else None
+    item["username"] = username
+
+    photo_blocks = response.xpath("//div[@class='photo-620x465']")
+    main_image = None
+    for block in photo_blocks:
+        img_url = block.xpath(".//img[@class='outline m-auto']/@src").get()
+        if img_url:
+            main_image = img_url
+            break
+    item["image_url"] = main_image
+
+    photos_text = response.css("a.show-all.link-dotted::text").get()
+    images_count = None
+    if photos_text:
+        match = re.search(r"(\d+)", photos_text)
+        if match:
+            images_count = int(match.group(1))
+    if images_count is None:
+        images_count = len(photo_blocks)
+    item["images_count"] = images_count
+
+    car_number = response.css("span.state-num.ua::text").get()
+    item["car_number"] = car_number.strip() if car_number else None
+    vin = response.css("span.label-vin::text").get()
+    item["car_vin"] = vin.strip() if vin else None
+    return item
+
+
+def load_recorded(store):
+    pages = []
+    for url, entry in store.load_index().items():
+        if entry["status"] != 200 or listing_id(url) is None:
+            continue
+        body = store.read_body(entry["body"])
+        # Bodies are recorded as they came off the wire
+        encoding = entry["headers"].get("Content-Encoding", [""])[0].lower()
+        if encoding == "gzip":
+            body = gzip.decompress(body)
+        elif encoding == "deflate":
+            body = zlib.decompress(body)
+        elif encoding:
+            continue
+        pages.append(body.decode("utf-8", errors="replace"))
+    return pages
+
+
+def load_corpus(path):
+    store = CorpusStore(path)
+    if os.path.exists(store.index_path):
+        return load_recorded(store)
+    pages = []
+    for name in sorted(os.listdir(path)):
+        if name.endswith(".html"):
+            with open(os.path.join(path, name), encoding="utf-8", errors="replace") as f:
+                pages.append(f.read())
+    return pages
+
+
+def run(label, pages, rounds, extract):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for html in pages:
+            extract(html)
+    elapsed = time.perf_counter() - start
+    total = len(pages) * rounds
+    print(f"{label:<10} {total} pages in {elapsed:.2f}s -> {total / elapsed:,.1f} pages/s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("corpus", help="directory with saved detail pages")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus)
+    if not pages:
+        sys.exit(f"No detail pages found in {args.corpus}")
+
+    mismatches = sum(
+        legacy_extract(Selector(text=html)) != extract_detail(Selector(text=html).root) for html in pages
+    )
+    print(f"{len(pages)} pages, {mismatches} with differing fields")
+
+    legacy = run("legacy", pages, args.rounds, lambda html: legacy_extract(Selector(text=html)))
+    plan = run("plan", pages, args.rounds, lambda html: extract_detail(Selector(text=html).root))
+    print(f"speedup: {legacy / plan:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
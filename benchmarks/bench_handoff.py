@@ -0,0 +1,143 @@
+"""
+Measure the discovery-to-phone latency of the Scrapy -> phone worker handoff end to end.
+
+Feeds synthetic listings through the real PostgresPipeline.save_items at --rate items/s
+(in --batch sized batches, like the pipeline's writer thread) while the real parse.py workers
+run under the Supervisor with a fake fetcher that sleeps --latency seconds per lookup. New cars
+reach the workers only through the phone_jobs queue and the cars_pending NOTIFY. Once the feed
+stops and the queue is empty the supervisor drains, and the p50/p95/max of
+phone_checked_at - datetime_found is read back from 'cars':
+
+    DB_HOST=localhost python benchmarks/bench_handoff.py --rate 50 --duration 30 --max-workers 4
+"""
+import argparse
+import functools
+import os
+import signal
+import sys
+import threading
+import time
+
+SCHEMA = "bench_handoff"
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+# Worker settings are read by parse.py at import time; the workers inherit the search_path
+os.environ["PGOPTIONS"] = f"-c search_path={SCHEMA}"
+os.environ.setdefault("DB_HOST", "localhost")
+os.environ.setdefault("PHONE_CLAIM_BATCH", "10")
+os.environ.setdefault("PHONE_IDLE_TIMEOUT", "60")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "auto_ria_scraper", "selenium"))
+
+# parse first: its metrics module must set up multiprocess mode before prometheus_client is imported
+import parse  # noqa: E402
+from supervisor import Supervisor  # noqa: E402
+
+from auto_ria_scraper.migrate import migrate  # noqa: E402
+from auto_ria_scraper.pipelines import PostgresPipeline  # noqa: E402
+
+
+class FakeFetcher:
+    """
+    Stand-in for PhoneFetcher that sleeps like a lookup and always finds a number.
+    """
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def fetch(self, url):
+        time.sleep(self.latency)
+        return "380500000000"
+
+    def close(self):
+        pass
+
+
+def reset():
+    conn = parse.get_db_connection()
+    with conn, conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    migrate(conn, log=lambda message: None)
+    return conn
+
+
+def feed(args, conn, done):
+    # Drive save_items directly, at a steady rate; datetime_found is left to the pipeline (now())
+    pipeline = PostgresPipeline(batch_size=args.batch)
+    pipeline.connect()
+    interval = args.batch / args.rate
+    start = time.monotonic()
+    n = 0
+    while time.monotonic() - start < args.duration:
+        items = [
+            {"url": f"https://auto.ria.com/uk/auto_handoff_{n + k}.html", "title": f"Car {n + k}", "price_usd": 10000}
+            for k in range(args.batch)
+        ]
+        pipeline.save_items(items)
+        n += args.batch
+        time.sleep(max(start + n / args.rate - time.monotonic(), 0))
+    pipeline.close()
+    done["fed"] = n
+    # Let the workers empty the queue, then stop the supervisor
+    deadline = time.monotonic() + args.settle
+    with conn.cursor() as cur:
+        while time.monotonic() < deadline:
+            cur.execute("SELECT count(*) FROM phone_jobs")
+            if cur.fetchone()[0] == 0:
+                break
+            conn.commit()
+            time.sleep(interval)
+    conn.commit()
+    os.kill(os.getpid(), signal.SIGTERM)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rate", type=float, default=50, help="new listings per second")
+    parser.add_argument("--batch", type=int, default=10, help="items per pipeline batch")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of feeding")
+    parser.add_argument("--settle", type=float, default=60, help="max seconds to wait for the queue to empty")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake lookup time, seconds")
+    parser.add_argument("--min-workers", type=int, default=1)
+    parser.add_argument("--max-workers", type=int, default=4)
+    parser.add_argument("--jobs-per-worker", type=int, default=20)
+    args = parser.parse_args()
+
+    conn = reset()
+    supervisor = Supervisor(
+        target=functools.partial(parse.worker, make_fetcher=functools.partial(FakeFetcher, args.latency)),
+        count_due=parse.count_due_jobs,
+        release_jobs=parse.release_dead_worker,
+        min_workers=args.min_workers,
+        max_workers=args.max_workers,
+        jobs_per_worker=args.jobs_per_worker,
+        check_interval=1,
+        scale_down_after=3,
+        drain_timeout=15,
+    )
+    done = {}
+    threading.Thread(target=feed, args=(args, parse.get_db_connection(), done), daemon=True).start()
+    supervisor.run()
+
+    with conn, conn.cursor() as cur:
+        cur.execute(
+            "SELECT count(*) FILTER (WHERE phone_status = 'success'),"
+            "       percentile_cont(ARRAY[0.5, 0.95]) WITHIN GROUP (ORDER BY extract(epoch FROM phone_checked_at - datetime_found)),"
+            "       max(extract(epoch FROM phone_checked_at - datetime_found))"
+            "  FROM cars"
+        )
+        stored, (p50, p95), worst = cur.fetchone()
+        cur.execute("SELECT count(*) FROM phone_jobs")
+        left = cur.fetchone()[0]
+    print(f"{done.get('fed', 0)} listings fed at {args.rate:g}/s, {stored} phones stored, {left} jobs left in the queue")
+    if stored:
+        print(f"discovery -> phone latency: p50 {p50 * 1000:.0f} ms, p95 {p95 * 1000:.0f} ms, max {float(worst) * 1000:.0f} ms")
+
+    with conn, conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark phone-number normalization (auto_ria_scraper/selenium/phones.py) against a local PostgreSQL.
+
+Loads --rows cars into a scratch schema with phone numbers in the formats found in the table:
+the old "380..." digits, "0XX...", "+38 (0XX) ...", "8 0XX ...", E.164, foreign, masked and junk
+values, --distinct different numbers in all. Reports the rate of normalize_phone alone and of a
+row-by-row UPDATE on --baseline-rows rows for comparison, then re-normalizes the whole table with
+renormalize() (chunked COPY + UPDATE ... FROM) and runs it a second time, when there is nothing
+left to change:
+
+    DB_HOST=localhost python benchmarks/bench_phones.py --rows 2000000
+"""
+import argparse
+import os
+import sys
+import time
+
+SCHEMA = "bench_phones"
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+os.environ["PGOPTIONS"] = f"-c search_path={SCHEMA}"
+os.environ.setdefault("DB_HOST", "localhost")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "auto_ria_scraper", "selenium"))
+
+from auto_ria_scraper.db import get_connection  # noqa: E402
+from auto_ria_scraper.migrate import migrate  # noqa: E402
+from phones import normalize_phone, renormalize  # noqa: E402
+
+# Number n of the --distinct ones, written the way row g writes it; n % 20 picks the operator or area code
+FORMATS = (
+    "'380' || code || body",
+    "'380' || code || body",
+    "'380' || code || body",
+    "'0' || code || body",
+    "'+38 (0' || code || ') ' || substr(body, 1, 3) || '-' || substr(body, 4, 2) || '-' || substr(body, 6, 2)",
+    "'8 0' || code || ' ' || body",
+    "'+380' || code || body",
+    "'+48 ' || code || body",
+    "'(0' || code || ') xxx xx xx'",
+    "'0' || code || left(body, 4)",
+)
+CODES = ("67", "50", "63", "93", "97", "66", "68", "95", "99", "73",
+         "44", "32", "57", "56", "48", "39", "91", "92", "94", "20")
+
+
+def load(conn, rows, distinct):
+    cases = " ".join(f"WHEN {i} THEN {fmt}" for i, fmt in enumerate(FORMATS))
+    codes = ", ".join(f"'{code}'" for code in CODES)
+    with conn, conn.cursor() as cur:
+        cur.execute(
+            "INSERT INTO cars (id, url, title, datetime_found, phone_status, phone_number) "
+            "SELECT g, 'https://auto.ria.com/uk/auto_bench_' || g || '.html', 'Car ' || g,"
+            "  now() - make_interval(secs => %(rows)s - g), 'success',"
+            f"  CASE g %% {len(FORMATS)} {cases} END "
+            "FROM generate_series(1, %(rows)s) g,"
+            f"  LATERAL (SELECT (ARRAY[{codes}])[1 + g %% %(distinct)s %% {len(CODES)}] AS code,"
+            "    lpad((g %% %(distinct)s * 7919 %% 10000000)::text, 7, '0') AS body) p",
+            {"rows": rows, "distinct": distinct},
+        )
+        cur.execute("ANALYZE cars")
+        cur.execute("SELECT phone_number FROM cars")
+        return [row[0] for row in cur.fetchall()]
+
+
+def row_by_row(conn, rows):
+    # The naive approach, one UPDATE per row; rolled back so renormalize() starts from the loaded values
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT id, datetime_found, phone_number FROM cars ORDER BY id LIMIT %s", (rows,))
+        cars = cur.fetchall()
+    normalize_phone.cache_clear()
+    start = time.perf_counter()
+    with conn.cursor() as cur:
+        for car_id, found, value in cars:
+            phone, flag = normalize_phone(value)
+            cur.execute(
+                "UPDATE cars SET phone_number = %s, phone_flag = %s WHERE id = %s AND datetime_found = %s",
+                (phone or value, flag, car_id, found),
+            )
+    elapsed = time.perf_counter() - start
+    conn.rollback()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--distinct", type=int, default=200_000, help="different phone numbers")
+    parser.add_argument("--baseline-rows", type=int, default=50_000, help="rows updated one by one for comparison")
+    parser.add_argument("--chunk-rows", type=int, default=50_000)
+    args = parser.parse_args()
+
+    conn = get_connection()
+    with conn, conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    migrate(conn, log=lambda message: None)
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT ensure_cars_partitions(now() - make_interval(secs => %s), 1)", (args.rows + 86400,))
+    try:
+        values = load(conn, args.rows, args.distinct)
+        print(f"loaded {args.rows:,} rows", flush=True)
+
+        normalize_phone.cache_clear()
+        start = time.perf_counter()
+        for value in values:
+            normalize_phone(value)
+        elapsed = time.perf_counter() - start
+        print(f"{'normalize_phone:':<25} {len(values) / elapsed:,.0f} values/s", flush=True)
+
+        elapsed = row_by_row(conn, args.baseline_rows)
+        print(f"{'row-by-row UPDATE:':<25} {args.baseline_rows / elapsed:,.0f} rows/s ({args.baseline_rows:,} rows)", flush=True)
+
+        for label in ("renormalize", "renormalize (again)"):
+            normalize_phone.cache_clear()
+            start = time.perf_counter()
+            counts = renormalize(conn, chunk_rows=args.chunk_rows, log=lambda message: None)
+            elapsed = time.perf_counter() - start
+            print(
+                f"{label + ':':<25} {counts['scanned'] / elapsed:,.0f} rows/s ({elapsed:.1f}s; "
+                f"{counts['normalized']:,} normalized, {counts['masked']:,} masked, {counts['invalid']:,} invalid)",
+                flush=True,
+            )
+        with conn, conn.cursor() as cur:
+            cur.execute(
+                "SELECT count(*) FILTER (WHERE phone_flag IS NULL AND phone_number !~ '^\\+[0-9]{8,15}$'),"
+                "  (SELECT count(*) FROM phone_jobs) FROM cars"
+            )
+            bad, queued = cur.fetchone()
+        print(f"unflagged non-E.164 numbers left: {bad} (expected 0), masked cars queued for lookup: {queued:,}")
+    finally:
+        with conn, conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
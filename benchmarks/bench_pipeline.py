@@ -0,0 +1,150 @@
+"""
+Benchmark PostgresPipeline write throughput against a local PostgreSQL.
+
+Replays a recorded item stream (JSON lines, e.g. from `scrapy crawl autoriaspider -O items.jsonl`)
+or a synthetic one through the original execute_values writer (100-item batches, one commit each,
+on the original single-table schema) and through the current COPY + merge pipeline (on the
+current partitioned schema), and reports rows/sec for each.
+Every pass is replayed three times: fresh inserts, an unchanged re-crawl (all conflicts), and a
+re-crawl where a tenth of the listings changed price (history writes). The tables are analyzed
+after the fresh pass, as autovacuum would have done long before a real re-crawl. The writers take turns for
+--rounds rounds, each on a fresh schema, and the median of each pass is reported, so background
+work of the server (autovacuum, checkpoints) does not decide the comparison.
+
+Runs in a scratch schema, so it never touches the real `cars` table:
+
+    DB_HOST=localhost python benchmarks/bench_pipeline.py --items items.jsonl
+    DB_HOST=localhost python benchmarks/bench_pipeline.py --synthetic 50000
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+SCHEMA = "bench_pipeline"
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+# Route every connection (including the pipeline's own) to the scratch schema
+os.environ["PGOPTIONS"] = f"-c search_path={SCHEMA}"
+os.environ.setdefault("DB_HOST", "localhost")
+sys.path.insert(0, ROOT)
+
+from psycopg2.extras import execute_values  # noqa: E402
+
+from auto_ria_scraper import pipelines  # noqa: E402
+from auto_ria_scraper.db import get_connection  # noqa: E402
+from auto_ria_scraper.migrate import migrate  # noqa: E402
+from auto_ria_scraper.pipelines import PostgresPipeline  # noqa: E402
+
+
+def load_items(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def synthetic_items(count):
+    now = datetime.now().isoformat()
+    return [
+        {
+            "url": f"https://auto.ria.com/uk/auto_bench_{n}.html",
+            "title": f"Car {n}",
+            "price_usd": 5000 + n % 20000,
+            "odometer": (n % 300) * 1000,
+            "username": f"seller {n % 500}",
+            "image_url": f"https://cdn.riastatic.com/photos/auto/photo/{n}f.jpg",
+            "images_count": n % 40,
+            "car_number": None,
+            "car_vin": None,
+            "datetime_found": now,
+        }
+        for n in range(count)
+    ]
+
+
+def with_price_changes(items, every=10):
+    return [
+        dict(item, price_usd=(item.get("price_usd") or 0) - 100) if n % every == 0 else item
+        for n, item in enumerate(items)
+    ]
+
+
+def reset(target=None):
+    conn = get_connection()
+    with conn, conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    migrate(conn, target=target, log=lambda message: None)
+    conn.close()
+
+
+def analyze():
+    conn = get_connection()
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("ANALYZE")
+    conn.close()
+
+
+class LegacyPipeline(PostgresPipeline):
+    """
+    The original writer: execute_values with ON CONFLICT DO NOTHING, commit per 100 items.
+    """
+
+    def connect(self):
+        # No staging table or prepared merge: the original schema has neither registry
+        self.conn = get_connection()
+        self.cur = self.conn.cursor()
+
+    def save_items(self, items):
+        execute_values(
+            self.cur,
+            f"INSERT INTO cars ({', '.join(pipelines.COLUMNS)}) VALUES %s ON CONFLICT (url) DO NOTHING",
+            [tuple(i.get(col) for col in pipelines.COLUMNS) for i in items],
+        )
+        self.conn.commit()
+
+
+def replay(pipeline, items):
+    # Drive save_items directly: the writer thread and timers need a running reactor,
+    # and only the DB write path is being measured here
+    pipeline.connect()
+    start = time.perf_counter()
+    for n in range(0, len(items), pipeline.batch_size):
+        pipeline.save_items(items[n:n + pipeline.batch_size])
+    elapsed = time.perf_counter() - start
+    pipeline.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", help="JSON lines file with recorded items")
+    parser.add_argument("--synthetic", type=int, default=20000, help="number of generated items if --items is not given")
+    parser.add_argument("--batch", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=3, help="runs of each writer; the median is reported")
+    args = parser.parse_args()
+
+    items = load_items(args.items) if args.items else synthetic_items(args.synthetic)
+    writers = (
+        ("execute_values/100", lambda: LegacyPipeline(batch_size=100), "0001"),
+        (f"copy+merge/{args.batch}", lambda: PostgresPipeline(batch_size=args.batch, flush_interval=5.0), None),
+    )
+    runs = (("fresh", items), ("re-crawl", items), ("changed", with_price_changes(items)))
+    timings = {(label, run): [] for label, _, _ in writers for run, _ in runs}
+    for _ in range(args.rounds):
+        for label, factory, schema in writers:
+            reset(schema)
+            for run, batch in runs:
+                timings[label, run].append(replay(factory(), batch))
+                if run == "fresh":
+                    analyze()
+    for (label, run), elapsed in timings.items():
+        elapsed = statistics.median(elapsed)
+        print(f"{label:<20} {run:<9} {len(items)} items in {elapsed:.2f}s -> {len(items) / elapsed:,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Load-test the partitioned schema: phone-job claim latency with a large 'cars' table.
+
+Builds the current schema (all migrations) in a scratch schema, loads --rows cars spread evenly
+over the last --months months (with their car_urls entries), queues --pending of them in
+phone_jobs, then claims and completes --claims batches of --batch jobs the way the
+Selenium workers do and reports claim latency percentiles, partition count and index sizes.
+
+    DB_HOST=localhost python benchmarks/bench_schema.py --rows 10000000 --pending 0.02
+
+Loading 10M rows takes a few minutes; the scratch schema is dropped at the end unless --keep is given.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+SCHEMA = "bench_schema"
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+os.environ["PGOPTIONS"] = f"-c search_path={SCHEMA}"
+os.environ.setdefault("DB_HOST", "localhost")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "auto_ria_scraper", "selenium"))
+
+from jobs import claim_jobs, flush_results  # noqa: E402
+
+from auto_ria_scraper.db import get_connection  # noqa: E402
+from auto_ria_scraper.migrate import migrate  # noqa: E402
+
+CHUNK = 1_000_000
+
+
+def load(conn, rows, months, pending):
+    with conn, conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    migrate(conn, log=lambda message: None)
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT ensure_cars_partitions(now() - make_interval(months => %s), 1)", (months,))
+
+    # Row g is found (g / rows) of the way through the window, so ids follow datetime_found like in production
+    start = time.perf_counter()
+    for low in range(1, rows + 1, CHUNK):
+        high = min(low + CHUNK - 1, rows)
+        with conn, conn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO cars (id, url, price_usd, odometer, datetime_found, phone_status, phone_number) "
+                "SELECT g, 'https://auto.ria.com/uk/auto_bench_' || g || '.html', 3000 + g %% 40000, g %% 300 * 1000, "
+                "  now() - make_interval(months => %(months)s) * (1 - g::float8 / %(rows)s), "
+                "  CASE WHEN g > %(rows)s * (1 - %(pending)s) THEN 'pending' ELSE 'success' END, "
+                "  CASE WHEN g > %(rows)s * (1 - %(pending)s) THEN NULL ELSE '+380500000000' END "
+                "FROM generate_series(%(low)s, %(high)s) g",
+                {"months": months, "rows": rows, "pending": pending, "low": low, "high": high},
+            )
+            cur.execute(
+                "INSERT INTO car_urls (url_hash, car_id, datetime_found, content_hash) "
+                "SELECT md5(url)::uuid, id, datetime_found, id FROM cars WHERE id BETWEEN %s AND %s",
+                (low, high),
+            )
+            cur.execute(
+                "INSERT INTO phone_jobs (car_id, url, datetime_found) "
+                "SELECT id, url, datetime_found FROM cars WHERE phone_status = 'pending' AND id BETWEEN %s AND %s",
+                (low, high),
+            )
+        print(f"loaded {high:,} rows ({time.perf_counter() - start:.0f}s)", flush=True)
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT setval('cars_id_seq', %s)", (rows,))
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("VACUUM ANALYZE cars")
+        cur.execute("VACUUM ANALYZE car_urls")
+        cur.execute("VACUUM ANALYZE phone_jobs")
+    conn.autocommit = False
+
+
+def report_sizes(conn):
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT count(*) FROM pg_inherits WHERE inhparent = 'cars'::regclass")
+        print(f"partitions: {cur.fetchone()[0]}")
+        cur.execute("SELECT count(*), pg_total_relation_size('phone_jobs') FROM phone_jobs")
+        jobs, size = cur.fetchone()
+        print(f"phone_jobs queue: {jobs:,} jobs, {size / 1024**2:,.1f} MB with indexes")
+        cur.execute("SELECT pg_relation_size('car_urls_pkey'), avg(octet_length(url)) FROM cars")
+        size, url_bytes = cur.fetchone()
+        print(f"car_urls_pkey (md5 + content hash): {size / 1024**2:,.1f} MB, URLs average {url_bytes:.0f} bytes as text")
+
+
+def run_claims(conn, claims, batch):
+    latencies = []
+    for _ in range(claims):
+        start = time.perf_counter()
+        jobs = claim_jobs(conn, batch)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if not jobs:
+            break
+        flush_results(conn, [(car_id, "+380500000000", "success") for car_id, _ in jobs])
+    latencies.sort()
+    print(
+        f"claim_jobs({batch}): {len(latencies)} claims, "
+        f"p50 {statistics.median(latencies):.2f} ms, "
+        f"p95 {latencies[int(len(latencies) * 0.95) - 1]:.2f} ms, "
+        f"max {latencies[-1]:.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--months", type=int, default=24, help="spread datetime_found over this many months")
+    parser.add_argument("--pending", type=float, default=0.02, help="fraction of cars still waiting for a phone")
+    parser.add_argument("--claims", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=10)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch schema")
+    args = parser.parse_args()
+
+    conn = get_connection()
+    load(conn, args.rows, args.months, args.pending)
+    report_sizes(conn)
+    run_claims(conn, args.claims, args.batch)
+    if not args.keep:
+        with conn, conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Exercise the phone worker Supervisor end to end with a fake fetcher (no browser or network).
+
+Loads --rows pending cars into a scratch schema and runs the real parse.py workers under the
+Supervisor, with lookups replaced by a fake that sleeps --latency seconds and, at the given
+rates, fails, crashes the worker process or hangs it. After --duration seconds the supervisor
+gets SIGTERM and drains. Reports throughput, restarts, the worker count over time and, the main
+check, how many phone_jobs were left leased after the drain (should be 0):
+
+    DB_HOST=localhost python benchmarks/bench_supervisor.py --rows 3000 --max-workers 6 --crash-rate 0.002
+"""
+import argparse
+import collections
+import functools
+import os
+import random
+import signal
+import sys
+import threading
+import time
+
+SCHEMA = "bench_supervisor"
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+# Worker settings are read by parse.py at import time; the workers inherit the search_path
+os.environ["PGOPTIONS"] = f"-c search_path={SCHEMA}"
+os.environ.setdefault("DB_HOST", "localhost")
+os.environ.setdefault("PHONE_CLAIM_BATCH", "10")
+os.environ.setdefault("PHONE_IDLE_TIMEOUT", "2")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "auto_ria_scraper", "selenium"))
+
+import parse  # noqa: E402
+from supervisor import Supervisor  # noqa: E402
+
+from auto_ria_scraper.migrate import migrate  # noqa: E402
+
+
+class FakeFetcher:
+    """
+    Stand-in for PhoneFetcher: sleeps like a lookup and misbehaves at the configured rates.
+    """
+
+    def __init__(self, latency, fail_rate, crash_rate, hang_rate):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.crash_rate = crash_rate
+        self.hang_rate = hang_rate
+
+    def fetch(self, url):
+        time.sleep(random.uniform(0.5, 1.5) * self.latency)
+        roll = random.random()
+        if roll < self.crash_rate:
+            os._exit(1)
+        roll -= self.crash_rate
+        if roll < self.hang_rate:
+            time.sleep(3600)
+        roll -= self.hang_rate
+        if roll < self.fail_rate:
+            raise RuntimeError("fake lookup failure")
+        return "380500000000"
+
+    def close(self):
+        pass
+
+
+def reset(rows):
+    conn = parse.get_db_connection()
+    with conn, conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    migrate(conn, log=lambda message: None)
+    with conn, conn.cursor() as cur:
+        cur.execute(
+            "INSERT INTO cars (url) SELECT 'https://auto.ria.com/uk/auto_' || g || '.html' "
+            "FROM generate_series(1, %s) g",
+            (rows,),
+        )
+        cur.execute("INSERT INTO phone_jobs (car_id, url, datetime_found) SELECT id, url, datetime_found FROM cars")
+    return conn
+
+
+def sample(supervisor, samples, stop):
+    while not stop.is_set():
+        samples.append(supervisor.metrics()["workers"])
+        stop.wait(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=3000)
+    parser.add_argument("--duration", type=float, default=60, help="seconds before SIGTERM")
+    parser.add_argument("--min-workers", type=int, default=1)
+    parser.add_argument("--max-workers", type=int, default=6)
+    parser.add_argument("--jobs-per-worker", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="mean fake lookup time, seconds")
+    parser.add_argument("--fail-rate", type=float, default=0.02)
+    parser.add_argument("--crash-rate", type=float, default=0.002)
+    parser.add_argument("--hang-rate", type=float, default=0.001)
+    parser.add_argument("--heartbeat-timeout", type=float, default=10)
+    args = parser.parse_args()
+
+    conn = reset(args.rows)
+    make_fetcher = functools.partial(FakeFetcher, args.latency, args.fail_rate, args.crash_rate, args.hang_rate)
+    supervisor = Supervisor(
+        target=functools.partial(parse.worker, make_fetcher=make_fetcher),
+        count_due=parse.count_due_jobs,
+        release_jobs=parse.release_dead_worker,
+        min_workers=args.min_workers,
+        max_workers=args.max_workers,
+        jobs_per_worker=args.jobs_per_worker,
+        heartbeat_timeout=args.heartbeat_timeout,
+        check_interval=1,
+        scale_down_after=3,
+        drain_timeout=15,
+        min_uptime=2,
+    )
+    samples = []
+    sampling = threading.Event()
+    threading.Thread(target=sample, args=(supervisor, samples, sampling), daemon=True).start()
+    threading.Timer(args.duration, os.kill, (os.getpid(), signal.SIGTERM)).start()
+
+    start = time.perf_counter()
+    supervisor.run()
+    elapsed = time.perf_counter() - start
+    sampling.set()
+
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT phone_status, count(*) FROM cars GROUP BY phone_status")
+        statuses = dict(cur.fetchall())
+        cur.execute("SELECT count(*), count(lease_expires_at), count(claimed_by) FROM phone_jobs")
+        queued, leased, claimed = cur.fetchone()
+    done = statuses.get("success", 0)
+    print(f"{done}/{args.rows} phones in {elapsed:.1f}s -> {done / elapsed:,.1f} jobs/s, statuses {statuses}")
+    print(f"restarts: {supervisor.restarts}, still queued: {queued}, "
+          f"left leased after drain: {leased} (claimed_by set: {claimed})")
+    # Worker count per ~10s of the run, to show scaling up and back down
+    buckets = collections.OrderedDict()
+    for second, workers in enumerate(samples):
+        buckets.setdefault(second // 10 * 10, []).append(workers)
+    print("workers: " + ", ".join(f"{t}s={max(w)}" for t, w in buckets.items()))
+
+    with conn, conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
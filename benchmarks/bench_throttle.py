@@ -0,0 +1,162 @@
+"""
+Benchmark AdaptiveConcurrencyMiddleware against a local stub server that throttles like the site.
+
+The stub serves small pages and answers 429 (with Retry-After) once a client exceeds --limit
+requests/sec over a one-second window; a client that keeps getting throttled for --captcha-after
+requests in a row is served captcha pages instead. Latency also grows with the number of
+requests in flight, so blindly raising concurrency does not pay off.
+
+Each pass crawls --pages pages with the project settings (pipelines disabled) and reports the
+sustained rate of good pages, the ban counts and the final slot state:
+
+    python benchmarks/bench_throttle.py --pages 600 --limit 20
+    python benchmarks/bench_throttle.py --pages 600 --limit 20 --mode fixed   # adaptive middleware off
+
+No network or database access is needed.
+"""
+import argparse
+import collections
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import scrapy  # noqa: E402
+from scrapy.crawler import CrawlerProcess  # noqa: E402
+from scrapy.utils.project import get_project_settings  # noqa: E402
+
+
+class ThrottlingServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, limit, captcha_after, base_latency):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.limit = limit
+        self.captcha_after = captcha_after
+        self.base_latency = base_latency
+        self.lock = threading.Lock()
+        self.recent = collections.deque()
+        self.in_flight = 0
+        self.throttled_streak = 0
+
+    def admit(self):
+        """
+        Return 200, 429 or "captcha" for a request arriving now.
+        """
+        now = time.monotonic()
+        with self.lock:
+            while self.recent and self.recent[0] < now - 1:
+                self.recent.popleft()
+            self.recent.append(now)
+            if len(self.recent) <= self.limit:
+                self.throttled_streak = 0
+                return 200
+            self.throttled_streak += 1
+            return "captcha" if self.throttled_streak > self.captcha_after else 429
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        verdict = self.server.admit()
+        with self.server.lock:
+            self.server.in_flight += 1
+            in_flight = self.server.in_flight
+        try:
+            # Server-side queueing: every request in flight adds to the response time
+            time.sleep(self.server.base_latency * (1 + in_flight / 4))
+            if verdict == 429:
+                self.send_response(429)
+                self.send_header("Retry-After", "1")
+                body = b"Too Many Requests"
+            elif verdict == "captcha":
+                self.send_response(200)
+                body = b'<html><body><div class="g-recaptcha"></div></body></html>'
+            else:
+                self.send_response(200)
+                body = b"<html><body><h1 class='head'>ok</h1></body></html>"
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with self.server.lock:
+                self.server.in_flight -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+class StubSpider(scrapy.Spider):
+    name = "throttle_stub"
+
+    def __init__(self, base_url, pages, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url
+        self.pages = pages
+        self.good = 0
+        self.captchas = 0
+
+    async def start(self):
+        for page in range(self.pages):
+            yield scrapy.Request(f"{self.base_url}/page/{page}")
+
+    def parse(self, response):
+        if b"g-recaptcha" in response.body:
+            self.captchas += 1
+        elif response.status == 200:
+            self.good += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=600)
+    parser.add_argument("--limit", type=int, default=20, help="requests/sec the stub allows")
+    parser.add_argument("--captcha-after", type=int, default=20, help="consecutive throttled requests before captchas")
+    parser.add_argument("--latency", type=float, default=0.05, help="base response time of the stub, seconds")
+    parser.add_argument("--mode", choices=["adaptive", "fixed"], default="adaptive")
+    args = parser.parse_args()
+
+    server = ThrottlingServer(args.limit, args.captcha_after, args.latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    settings = get_project_settings()
+    settings.set("ITEM_PIPELINES", {})
+    settings.set("SPIDER_MIDDLEWARES", {})
+    settings.set("ROBOTSTXT_OBEY", False)
+    settings.set("HTTPCACHE_ENABLED", False)
+    settings.set("HTTPERROR_ALLOW_ALL", True)
+    settings.set("RETRY_TIMES", 5)
+    settings.set("LOG_LEVEL", "ERROR")
+    if args.mode == "fixed":
+        settings.set("ADAPTIVE_CONCURRENCY_ENABLED", False)
+        settings.set("CONCURRENT_REQUESTS_PER_DOMAIN", settings.getint("ADAPTIVE_MAX_CONCURRENCY"))
+        settings.set("DOWNLOAD_DELAY", 0)
+
+    process = CrawlerProcess(settings)
+    crawler = process.create_crawler(StubSpider)
+    process.crawl(crawler, base_url=f"http://127.0.0.1:{server.server_port}", pages=args.pages)
+    start = time.perf_counter()
+    process.start()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    stats = crawler.stats.get_stats()
+    good = crawler.spider.good
+    print(f"{args.mode}: {good}/{args.pages} good pages in {elapsed:.1f}s -> {good / elapsed:.1f} pages/s (stub limit {args.limit}/s)")
+    print(
+        f"bans: 429={stats.get('downloader/response_status_count/429', 0)} "
+        f"captcha={crawler.spider.captchas + stats.get('adaptive/bans/captcha', 0)} "
+        f"backoffs={stats.get('adaptive/decreases', 0)}"
+    )
+    for key in sorted(stats):
+        if key.startswith("adaptive/127.0.0.1"):
+            print(f"{key}: {stats[key]}")
+
+
+if __name__ == "__main__":
+    main()
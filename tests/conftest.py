@@ -0,0 +1,62 @@
+import os
+import sys
+
+import psycopg2
+import pytest
+from scrapy.utils.reactor import install_reactor, is_reactor_installed
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+
+# Tests that need PostgreSQL use the DB_* variables (like benchmarks/) and a scratch schema
+SCHEMA = f"test_{os.getpid()}"
+os.environ.setdefault("DB_HOST", "localhost")
+
+# Crawlers built in tests (scrapy.utils.test.get_crawler) need the project's reactor installed up front
+if not is_reactor_installed():
+    install_reactor("twisted.internet.asyncioreactor.AsyncioSelectorReactor")
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def fixture_response(name, request):
+    """
+    HtmlResponse for `request` with the saved page tests/fixtures/<name> as its body.
+    """
+    from scrapy.http import HtmlResponse
+
+    with open(os.path.join(FIXTURES, name), "rb") as f:
+        return HtmlResponse(url=request.url, body=f.read(), encoding="utf-8", request=request)
+
+
+@pytest.fixture(scope="session")
+def db():
+    """
+    Connection factory for a freshly migrated scratch schema; skips the test if PostgreSQL is unreachable.
+    """
+    from auto_ria_scraper.db import get_connection
+    from auto_ria_scraper.migrate import migrate
+
+    try:
+        admin = get_connection()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"PostgreSQL not available: {e}")
+    with admin, admin.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    # Every connection opened from now on (including the code under test) uses the scratch schema
+    previous = os.environ.get("PGOPTIONS")
+    os.environ["PGOPTIONS"] = f"-c search_path={SCHEMA}"
+    conn = get_connection()
+    migrate(conn, log=lambda message: None)
+    conn.close()
+    try:
+        yield get_connection
+    finally:
+        if previous is None:
+            os.environ.pop("PGOPTIONS")
+        else:
+            os.environ["PGOPTIONS"] = previous
+        with admin, admin.cursor() as cur:
+            cur.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+        admin.close()
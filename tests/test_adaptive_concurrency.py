@@ -0,0 +1,122 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+from scrapy import Request
+from scrapy.core.downloader import Slot
+from scrapy.http import HtmlResponse
+from scrapy.utils.test import get_crawler
+
+from auto_ria_scraper import settings as project_settings
+from auto_ria_scraper.middlewares import AdaptiveConcurrencyMiddleware
+from auto_ria_scraper.spiders.autoriaspider import AutoRiaSpider
+
+SLOT = "auto.ria.com"
+URL = "https://auto.ria.com/uk/auto_volkswagen_passat_38112233.html"
+CAPTCHA = b'<html><body><div class="g-recaptcha"></div></body></html>'
+
+
+@pytest.fixture
+def throttle():
+    """
+    Factory of (middleware, download slot, spider) using the project's ADAPTIVE_* settings.
+    The slot starts like the project's per-domain slot: 2 req/s (DOWNLOAD_DELAY 0.5), concurrency 4.
+    """
+
+    def build(**overrides):
+        settings = {name: getattr(project_settings, name) for name in dir(project_settings) if name.startswith("ADAPTIVE_")}
+        settings.update(METRICS_ENABLED=False, **overrides)
+        crawler = get_crawler(AutoRiaSpider, settings)
+        spider = AutoRiaSpider.from_crawler(crawler)
+        slot = Slot(project_settings.CONCURRENT_REQUESTS_PER_DOMAIN, project_settings.DOWNLOAD_DELAY, False)
+        # process_response only needs the downloader's slots from the engine
+        crawler.engine = SimpleNamespace(downloader=SimpleNamespace(slots={SLOT: slot}))
+        return AdaptiveConcurrencyMiddleware.from_crawler(crawler), slot, spider
+
+    return build
+
+
+def respond(middleware, spider, status=200, body=b"<html></html>", latency=0.1, headers=None):
+    request = Request(URL, meta={"download_slot": SLOT, "download_latency": latency})
+    response = HtmlResponse(URL, status=status, body=body, headers=headers, request=request)
+    return middleware.process_response(request, response, spider)
+
+
+def rate(slot):
+    return round(1 / slot.delay, 6)
+
+
+def test_ban_halves_rate_and_concurrency(throttle):
+    middleware, slot, spider = throttle()
+    # 429 is left to RetryMiddleware
+    assert isinstance(respond(middleware, spider, status=429), HtmlResponse)
+    assert (rate(slot), slot.concurrency) == (1, 2)
+    assert spider.crawler.stats.get_value("adaptive/bans/429") == 1
+    assert spider.crawler.stats.get_value(f"adaptive/{SLOT}/concurrency") == 2
+
+
+@pytest.mark.parametrize("status, body, reason", [(403, b"Forbidden", "403"), (200, CAPTCHA, "captcha")])
+def test_forbidden_and_captcha_pages_back_off_and_are_retried(throttle, status, body, reason):
+    middleware, slot, spider = throttle()
+    result = respond(middleware, spider, status=status, body=body)
+    assert isinstance(result, Request) and result.url == URL
+    assert (rate(slot), slot.concurrency) == (1, 2)
+    assert spider.crawler.stats.get_value(f"adaptive/bans/{reason}") == 1
+
+
+def test_bans_within_the_cooldown_back_off_once(throttle):
+    middleware, slot, spider = throttle()
+    for _ in range(3):
+        respond(middleware, spider, status=429)
+    assert (rate(slot), slot.concurrency) == (1, 2)
+    assert spider.crawler.stats.get_value("adaptive/bans/429") == 3
+    assert spider.crawler.stats.get_value("adaptive/decreases") == 1
+
+
+def test_clean_windows_recover_additively(throttle):
+    middleware, slot, spider = throttle()
+    respond(middleware, spider, status=429)
+    # A window is as many responses as the current concurrency
+    respond(middleware, spider)
+    assert (rate(slot), slot.concurrency) == (1, 2)
+    respond(middleware, spider)
+    assert (rate(slot), slot.concurrency) == (2, 3)
+    for _ in range(3):
+        respond(middleware, spider)
+    assert (rate(slot), slot.concurrency) == (3, 4)
+    # A window slower than ADAPTIVE_TARGET_LATENCY does not increase anything
+    for _ in range(4):
+        respond(middleware, spider, latency=project_settings.ADAPTIVE_TARGET_LATENCY + 1)
+    assert (rate(slot), slot.concurrency) == (3, 4)
+
+
+def test_rate_and_concurrency_stay_within_bounds(throttle):
+    middleware, slot, spider = throttle(ADAPTIVE_COOLDOWN=0)
+    for _ in range(1000):
+        respond(middleware, spider)
+    assert slot.concurrency == project_settings.ADAPTIVE_MAX_CONCURRENCY
+    assert slot.delay == project_settings.ADAPTIVE_MIN_DELAY
+    for _ in range(20):
+        respond(middleware, spider, status=429)
+    assert slot.concurrency == project_settings.ADAPTIVE_MIN_CONCURRENCY
+    assert slot.delay == project_settings.ADAPTIVE_MAX_DELAY
+    # Recovery starts from the bounded rate, not from wherever the halving would have taken it
+    for _ in range(project_settings.ADAPTIVE_MIN_CONCURRENCY):
+        respond(middleware, spider)
+    assert rate(slot) == round(1 / project_settings.ADAPTIVE_MAX_DELAY + project_settings.ADAPTIVE_RATE_STEP, 6)
+
+
+def test_retry_after_pauses_the_slot(throttle):
+    middleware, slot, spider = throttle()
+    before = time.time()
+    respond(middleware, spider, status=429, headers={"Retry-After": "10"})
+    # The downloader sends the next request `delay` after lastseen
+    assert slot.lastseen + slot.delay >= before + 10
+    assert (rate(slot), slot.concurrency) == (1, 2)
+
+
+def test_unparseable_retry_after_only_backs_off(throttle):
+    middleware, slot, spider = throttle()
+    respond(middleware, spider, status=429, headers={"Retry-After": "Wed, 21 Oct 2026 07:28:00 GMT"})
+    assert slot.lastseen <= time.time()
+    assert (rate(slot), slot.concurrency) == (1, 2)
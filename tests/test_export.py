@@ -0,0 +1,63 @@
+import os
+import sys
+
+import pyarrow.dataset as ds
+import pytest
+
+from conftest import ROOT
+
+from auto_ria_scraper.export import export_cars
+from auto_ria_scraper.pipelines import PostgresPipeline
+
+sys.path.insert(0, os.path.join(ROOT, "auto_ria_scraper", "selenium"))
+
+from jobs import claim_jobs, flush_results  # noqa: E402
+
+
+@pytest.fixture
+def pipeline(db):
+    conn = db()
+    with conn, conn.cursor() as cur:
+        cur.execute("TRUNCATE cars, car_urls, car_fingerprints, phone_jobs, cars_history")
+    conn.close()
+    pipeline = PostgresPipeline()
+    pipeline.connect()
+    yield pipeline
+    pipeline.close()
+
+
+def item(n, price=10000, found="2026-05-10T12:00:00+00:00"):
+    return {"url": f"https://auto.ria.com/uk/auto_bmw_x5_3512345{n}.html", "title": f"BMW X5 {n}", "price_usd": price, "datetime_found": found}
+
+
+def export(pipeline, out_dir):
+    # No lag: everything committed before the run is exported
+    return export_cars(pipeline.conn, str(out_dir), lag_seconds=0, log=lambda message: None)
+
+
+def latest(out_dir):
+    """
+    The latest exported version of every car, by id: (price_usd, phone_number).
+    """
+    rows = ds.dataset(str(out_dir), format="parquet", partitioning="hive").to_table().to_pylist()
+    rows.sort(key=lambda row: (row["id"], row["updated_at"] is not None, row["updated_at"]))
+    return {row["url"][-6:-5]: (row["price_usd"], row["phone_number"]) for row in rows}
+
+
+def test_incremental_export_picks_up_updated_rows(pipeline, tmp_path):
+    pipeline.save_items([item(1), item(2), item(3)])
+    assert export(pipeline, tmp_path)[0] == 3
+    assert export(pipeline, tmp_path)[0] == 0
+
+    # A phone found and a price changed after the first export, and one new car
+    jobs = dict((url[-6:-5], car_id) for car_id, url in claim_jobs(pipeline.conn, 10, worker="node:1"))
+    flush_results(pipeline.conn, [(jobs["1"], "+380671234567", "success")], worker="node:1")
+    pipeline.save_items([item(2, price=9500), item(4, found="2026-06-01T08:00:00+00:00")])
+    assert export(pipeline, tmp_path) == (3, 2)
+    assert latest(tmp_path) == {
+        "1": (10000, "+380671234567"),
+        "2": (9500, None),
+        "3": (10000, None),
+        "4": (10000, None),
+    }
+    assert export(pipeline, tmp_path)[0] == 0
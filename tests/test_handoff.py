@@ -0,0 +1,94 @@
+import functools
+import os
+import sys
+import time
+
+import pytest
+
+from conftest import ROOT
+
+sys.path.insert(0, os.path.join(ROOT, "auto_ria_scraper", "selenium"))
+
+import parse  # noqa: E402
+from supervisor import Supervisor  # noqa: E402
+
+from auto_ria_scraper.pipelines import PostgresPipeline  # noqa: E402
+
+# Far longer than the test may take: jobs are only picked up early if the NOTIFY wakes the worker
+IDLE_TIMEOUT = 60
+
+
+class FakeFetcher:
+    def fetch(self, url):
+        return "+380671234567"
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def conn(db, monkeypatch):
+    conn = db()
+    with conn, conn.cursor() as cur:
+        cur.execute("TRUNCATE cars, car_urls, car_fingerprints, phone_jobs, cars_history")
+    # Set before the worker is forked; a short heartbeat interval only makes the drain quick
+    monkeypatch.setattr(parse, "IDLE_TIMEOUT", IDLE_TIMEOUT)
+    monkeypatch.setattr(parse, "HEARTBEAT_INTERVAL", 0.1)
+    yield conn
+    conn.close()
+
+
+def query(conn, sql, params=()):
+    with conn, conn.cursor() as cur:
+        cur.execute(sql, params)
+        return cur.fetchall()
+
+
+def wait_until(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+
+def phone_status(conn, url):
+    return query(conn, "SELECT phone_status FROM cars WHERE url = %s", (url,))[0][0]
+
+
+def test_new_car_is_handed_to_an_idle_worker_by_notify(conn):
+    started = query(conn, "SELECT now()")[0][0]
+    supervisor = Supervisor(
+        target=functools.partial(parse.worker, make_fetcher=FakeFetcher),
+        count_due=lambda: 0,
+        release_jobs=parse.release_dead_worker,
+        min_workers=1,
+        max_workers=1,
+    )
+    supervisor.check()
+    try:
+        # The worker is idle once it listens and its first (empty) claim has committed
+        assert wait_until(lambda: query(
+            conn,
+            "SELECT count(*) FILTER (WHERE query = 'LISTEN cars_pending'), count(*) FILTER (WHERE query = 'COMMIT') "
+            "FROM pg_stat_activity WHERE backend_start >= %s AND pid <> pg_backend_pid()",
+            (started,),
+        )[0] == (1, 1))
+
+        # A job queued without a NOTIFY waits for the idle timeout: the worker does not poll
+        unannounced = "https://auto.ria.com/uk/auto_bmw_x5_35123456.html"
+        query(conn, "INSERT INTO cars (url, title, phone_status) VALUES (%s, 'BMW X5', 'pending') RETURNING id", (unannounced,))
+        query(conn, "INSERT INTO phone_jobs (car_id, url, datetime_found) SELECT id, url, datetime_found FROM cars RETURNING car_id")
+        time.sleep(1)
+        assert phone_status(conn, unannounced) == "pending"
+
+        # The pipeline's NOTIFY wakes the worker, which then claims every due job at once
+        pipeline = PostgresPipeline()
+        pipeline.connect()
+        url = "https://auto.ria.com/uk/auto_volkswagen_passat_38112233.html"
+        assert pipeline.save_items([{"url": url, "title": "Volkswagen Passat 2015", "price_usd": 12500}])[1] == 1
+        pipeline.close()
+        assert wait_until(lambda: phone_status(conn, url) == "success", timeout=IDLE_TIMEOUT / 4)
+        assert phone_status(conn, unannounced) == "success"
+        assert query(conn, "SELECT count(*) FROM phone_jobs") == [(0,)]
+    finally:
+        supervisor.drain()
@@ -0,0 +1,157 @@
+import json
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+
+from conftest import FIXTURES, ROOT
+
+# The phone parser is a separate Docker context with flat imports
+sys.path.insert(0, os.path.join(ROOT, "auto_ria_scraper", "selenium"))
+
+from http_phone import PhoneLookupError, create_session, get_phone_number_http  # noqa: E402
+
+LISTING_PATH = "/uk/auto_bmw_x5_35123456.html"
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), "rb") as f:
+        return f.read()
+
+
+class StubSite(BaseHTTPRequestHandler):
+    """
+    The listing page and the phone endpoint, served from fixtures; `routes` overrides responses per path.
+    """
+
+    routes = {}
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        self.server.requests.append(self.path)
+        if url.path in self.server.routes:
+            status, content_type, body = self.server.routes[url.path]
+        elif url.path == LISTING_PATH:
+            status, content_type, body = 200, "text/html; charset=utf-8", read_fixture("phone_listing.html")
+        elif url.path == "/users/phones/35123456":
+            qs = parse_qs(url.query)
+            signed = qs.get("hash") == ["a1b2c3d4e5f6"] and qs.get("expires") == ["1767225600"]
+            ajax = self.headers.get("X-Requested-With") == "XMLHttpRequest"
+            if signed and ajax:
+                status, content_type, body = 200, "application/json", read_fixture("phone_response.json")
+            else:
+                status, content_type, body = 403, "application/json", b'{"error": "bad hash"}'
+        else:
+            status, content_type, body = 404, "text/plain", b"not found"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def site():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubSite)
+    server.routes = {}
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    server.listing_url = f"http://127.0.0.1:{server.server_port}{LISTING_PATH}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def session():
+    session = create_session(2)
+    yield session
+    session.close()
+
+
+def test_reads_number_from_phone_endpoint(site, session):
+    assert get_phone_number_http(session, site.listing_url) == "(067) 123 45 67"
+    assert [urlparse(path).path for path in site.requests] == [LISTING_PATH, "/users/phones/35123456"]
+
+
+def test_falls_back_to_phones_list(site, session):
+    site.routes["/users/phones/35123456"] = (
+        200, "application/json", json.dumps({"phones": [{"phoneFormatted": "(050) 765 43 21"}]}).encode()
+    )
+    assert get_phone_number_http(session, site.listing_url) == "(050) 765 43 21"
+
+
+@pytest.mark.parametrize("route, error", [
+    # Listing page without the signed hash/expires pair (e.g. a captcha page)
+    ((LISTING_PATH, (200, "text/html", b"<html><body>captcha</body></html>")), PhoneLookupError),
+    (("/users/phones/35123456", (200, "application/json", b'{"formattedPhoneNumber": "(067) xxx xx xx"}')), PhoneLookupError),
+    (("/users/phones/35123456", (200, "application/json", '{"formattedPhoneNumber": "(067) ••• •• ••"}'.encode())), PhoneLookupError),
+    (("/users/phones/35123456", (200, "application/json", b'{"phones": [{"phoneFormatted": "067 ***-**-**"}]}')), PhoneLookupError),
+    (("/users/phones/35123456", (200, "text/html", b"<html>blocked</html>")), PhoneLookupError),
+    (("/users/phones/35123456", (429, "text/plain", b"slow down")), requests.HTTPError),
+    ((LISTING_PATH, (500, "text/plain", b"error")), requests.HTTPError),
+])
+def test_errors(site, session, route, error):
+    path, response = route
+    site.routes[path] = response
+    with pytest.raises(error):
+        get_phone_number_http(session, site.listing_url)
+
+
+def test_url_without_listing_id(site, session):
+    with pytest.raises(PhoneLookupError):
+        get_phone_number_http(session, f"http://127.0.0.1:{site.server_port}/uk/search/")
+    assert site.requests == []
+
+
+class FakePool:
+    """
+    DriverPool stand-in: hands out a placeholder "browser" and counts checkouts.
+    """
+
+    def __init__(self):
+        self.checkouts = 0
+
+    @contextmanager
+    def driver(self):
+        self.checkouts += 1
+        yield object()
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fetcher(monkeypatch):
+    import parse
+
+    monkeypatch.setattr(parse, "get_phone_number", lambda driver, url: "(067) 999 88 77")
+    fetcher = parse.PhoneFetcher("http", pool_size=2)
+    fetcher.pool = FakePool()
+    yield fetcher
+    fetcher.session.close()
+
+
+def test_fetcher_uses_http_result(site, fetcher):
+    assert fetcher.fetch(site.listing_url) == "+380671234567"
+    assert fetcher.pool.checkouts == 0
+
+
+@pytest.mark.parametrize("path, response", [
+    ("/users/phones/35123456", (200, "application/json", b'{"formattedPhoneNumber": "(067) xxx xx xx"}')),
+    ("/users/phones/35123456", (403, "application/json", b'{"error": "bad hash"}')),
+    (LISTING_PATH, (200, "text/html", b"<html><body>captcha</body></html>")),
+])
+def test_fetcher_falls_back_to_selenium_on_http_error(site, fetcher, path, response):
+    site.routes[path] = response
+    assert fetcher.fetch(site.listing_url) == "+380679998877"
+    assert fetcher.pool.checkouts == 1
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from scrapy import Request
+from scrapy.utils.test import get_crawler
+
+from auto_ria_scraper.middlewares import IncrementalSpiderMiddleware
+from auto_ria_scraper.pipelines import PostgresPipeline
+from auto_ria_scraper.spiders.autoriaspider import AutoRiaSpider
+
+URL = "https://auto.ria.com/uk/auto_volkswagen_passat_38112233.html"
+
+
+@pytest.fixture
+def pipeline(db):
+    conn = db()
+    with conn, conn.cursor() as cur:
+        cur.execute("TRUNCATE cars, car_urls, car_fingerprints, phone_jobs, cars_history")
+    conn.close()
+    pipeline = PostgresPipeline()
+    pipeline.connect()
+    yield pipeline
+    pipeline.close()
+
+
+def item(found):
+    return {"url": URL, "title": "Volkswagen Passat 2015", "price_usd": 12500, "datetime_found": found.isoformat()}
+
+
+def last_seen(pipeline):
+    pipeline.cur.execute("SELECT last_seen FROM car_urls")
+    value = pipeline.cur.fetchone()[0]
+    pipeline.conn.commit()
+    return value
+
+
+def age(pipeline, days):
+    pipeline.cur.execute("UPDATE car_urls SET last_seen = last_seen - make_interval(days => %s)", (days,))
+    pipeline.conn.commit()
+
+
+def skipped(url):
+    """
+    Whether an incremental crawl started now drops the detail request for `url`.
+    """
+    crawler = get_crawler(AutoRiaSpider, {"INCREMENTAL_CRAWL": True, "METRICS_ENABLED": False})
+    spider = AutoRiaSpider.from_crawler(crawler)
+    middleware = IncrementalSpiderMiddleware.from_crawler(crawler)
+    middleware.spider_opened(spider)
+    return not list(middleware.process_spider_output(None, [Request(url)], spider))
+
+
+def test_listing_found_long_ago_but_seen_recently_is_skipped(pipeline):
+    pipeline.save_items([item(datetime.now(timezone.utc) - timedelta(days=30))])
+    assert skipped(URL)
+
+
+def test_recrawl_refreshes_a_stale_listing(pipeline):
+    found = datetime.now(timezone.utc) - timedelta(days=30)
+    pipeline.save_items([item(found)])
+    age(pipeline, 30)
+    assert not skipped(URL)
+    # The unchanged listing is fetched again: only its last_seen moves
+    _, inserted, changed, _, _ = pipeline.save_items([item(found)])
+    assert (inserted, changed) == (0, 0)
+    assert skipped(URL)
+
+
+def test_unchanged_listing_seen_within_the_hour_is_not_rewritten(pipeline):
+    pipeline.save_items([item(datetime.now(timezone.utc))])
+    seen = last_seen(pipeline)
+    pipeline.save_items([item(datetime.now(timezone.utc))])
+    assert last_seen(pipeline) == seen
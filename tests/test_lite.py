@@ -0,0 +1,100 @@
+import pytest
+from scrapy import Request
+from scrapy.utils.test import get_crawler
+
+from auto_ria_scraper.items import AutoRiaItem
+from auto_ria_scraper.spiders.autoriaspider import AutoRiaSpider
+from conftest import fixture_response
+
+SEARCH_URL = "https://auto.ria.com/uk/search/?indexName=auto&countpage=10&page=0"
+PASSAT_URL = "https://auto.ria.com/uk/auto_volkswagen_passat_38112233.html"
+OCTAVIA_URL = "https://auto.ria.com/uk/auto_skoda_octavia_38114455.html"
+
+# Markup of the complete (Passat) card that provides each of AutoRiaSpider.lite_detail_fields
+CARD_FIELD_MARKUP = {
+    "car_vin": '<span class="label-vin"><span>WVWZZZ3CZFE123456</span></span>',
+    "car_number": '<span class="state-num">AA 1234 BB</span>',
+    "image_url": '<img src="https://cdn0.riastatic.com/photosnew/auto/photo/volkswagen_passat__560563454f.jpg" alt="Volkswagen Passat 2015">',
+}
+
+
+def lite_spider():
+    crawler = get_crawler(AutoRiaSpider, {"METRICS_ENABLED": False})
+    return AutoRiaSpider.from_crawler(crawler, lite="1")
+
+
+def parse_search(spider, body_filter=None):
+    request = spider.page_request(SEARCH_URL, 0)
+    response = fixture_response("search_lite.html", request)
+    if body_filter is not None:
+        response = response.replace(body=body_filter(response.text).encode())
+    return list(spider.parse(response))
+
+
+def test_complete_card_yields_item_without_detail_request():
+    spider = lite_spider()
+    results = parse_search(spider)
+    items = [r for r in results if isinstance(r, AutoRiaItem)]
+    assert len(items) == 1
+    item = items[0]
+    assert item["url"] == PASSAT_URL
+    assert item["title"] == "Volkswagen Passat 2015"
+    assert item["price_usd"] == 12500
+    assert item["odometer"] == 185000
+    assert item["car_vin"] == "WVWZZZ3CZFE123456"
+    assert item["car_number"] == "AA 1234 BB"
+    assert item["image_url"].endswith("volkswagen_passat__560563454f.jpg")
+    assert PASSAT_URL not in [r.url for r in results if isinstance(r, Request)]
+    assert spider.crawler.stats.get_value("lite/card_items") == 1
+
+
+def test_incomplete_card_schedules_detail_with_card_item():
+    spider = lite_spider()
+    requests = [r for r in parse_search(spider) if isinstance(r, Request)]
+    assert [r.url for r in requests] == [OCTAVIA_URL]
+    request = requests[0]
+    assert request.callback == spider.parse_car_detail
+    card_item = request.cb_kwargs["card_item"]
+    # The card's USD price label is kept, VIN and plate are left for the detail page
+    assert card_item["price_usd"] == 7500
+    assert card_item["car_vin"] is None and card_item["car_number"] is None
+    assert spider.crawler.stats.get_value("lite/detail_requests") == 1
+
+
+@pytest.mark.parametrize("field", sorted(CARD_FIELD_MARKUP))
+def test_card_missing_detail_field_schedules_detail(field):
+    spider = lite_spider()
+    results = parse_search(spider, lambda html: html.replace(CARD_FIELD_MARKUP[field], ""))
+    assert not [r for r in results if isinstance(r, AutoRiaItem)]
+    passat = [r for r in results if isinstance(r, Request) and r.url == PASSAT_URL]
+    assert len(passat) == 1
+    assert passat[0].cb_kwargs["card_item"][field] is None
+
+
+def test_detail_page_fills_only_missing_card_fields():
+    spider = lite_spider()
+    request = [r for r in parse_search(spider) if isinstance(r, Request)][0]
+    items = list(request.callback(fixture_response("detail_skoda_octavia.html", request), **request.cb_kwargs))
+    assert len(items) == 1
+    item = items[0]
+    assert item is request.cb_kwargs["card_item"]
+    # From the card
+    assert item["title"] == "Skoda Octavia 2012"
+    assert item["price_usd"] == 7500
+    assert item["image_url"].endswith("skoda_octavia__560999001f.jpg")
+    # From the detail page
+    assert item["car_vin"] == "TMBJF21Z8C2012345"
+    assert item["car_number"] == "KA 5678 IX"
+    assert item["username"] == "Олександр"
+    assert item["images_count"] == 14
+
+
+def test_requests_per_listing_stat():
+    spider = lite_spider()
+    stats = spider.crawler.stats
+    detail_requests = [r for r in parse_search(spider) if isinstance(r, Request)]
+    # One search page and one detail page downloaded for two listings
+    stats.set_value("downloader/request_count", 1 + len(detail_requests))
+    spider.closed("finished")
+    assert stats.get_value("listing/found") == 2
+    assert stats.get_value("listing/requests_per_listing") == 1.0
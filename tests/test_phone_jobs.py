@@ -0,0 +1,121 @@
+import os
+import sys
+
+import pytest
+
+from conftest import ROOT
+
+sys.path.insert(0, os.path.join(ROOT, "auto_ria_scraper", "selenium"))
+
+from jobs import claim_jobs, flush_results, release_jobs  # noqa: E402
+
+
+@pytest.fixture
+def conn(db):
+    conn = db()
+    with conn, conn.cursor() as cur:
+        cur.execute("TRUNCATE cars, phone_jobs")
+        cur.execute(
+            "INSERT INTO cars (id, url, title, datetime_found, phone_status) "
+            "VALUES (1, 'https://auto.ria.com/uk/auto_bmw_x5_35123456.html', 'BMW X5', now(), 'pending')"
+        )
+        cur.execute("INSERT INTO phone_jobs (car_id, url, datetime_found) SELECT id, url, datetime_found FROM cars")
+    yield conn
+    conn.close()
+
+
+def expire_lease(conn):
+    with conn, conn.cursor() as cur:
+        cur.execute("UPDATE phone_jobs SET lease_expires_at = now() - interval '1 second', next_attempt_at = now() - interval '1 second'")
+
+
+def state(conn):
+    with conn, conn.cursor() as cur:
+        cur.execute(
+            "SELECT c.phone_number, c.phone_status, j.claimed_by, j.attempts "
+            "FROM cars c LEFT JOIN phone_jobs j ON j.car_id = c.id WHERE c.id = 1"
+        )
+        return cur.fetchone()
+
+
+def test_holder_acknowledges_its_job(conn):
+    assert claim_jobs(conn, 10, worker="node:1") == [(1, "https://auto.ria.com/uk/auto_bmw_x5_35123456.html")]
+    assert len(flush_results(conn, [(1, "+380671234567", "success")], worker="node:1")) == 1
+    assert state(conn) == ("+380671234567", "success", None, None)
+
+
+def test_late_result_of_expired_lease_is_dropped(conn):
+    claim_jobs(conn, 10, worker="node:1")
+    expire_lease(conn)
+    assert claim_jobs(conn, 10, worker="node:2")
+    # node:1 finishes after its lease expired: neither its success nor its error touches node:2's job
+    assert flush_results(conn, [(1, "+380500000000", "success")], worker="node:1") == []
+    flush_results(conn, [(1, None, "error")], worker="node:1")
+    assert state(conn) == (None, "pending", "node:2", 2)
+    flush_results(conn, [(1, "+380671234567", "success")], worker="node:2")
+    assert state(conn) == ("+380671234567", "success", None, None)
+
+
+def test_error_is_retried_only_by_holder(conn):
+    claim_jobs(conn, 10, worker="node:1")
+    flush_results(conn, [(1, None, "error")], worker="node:1")
+    assert state(conn) == (None, "pending", None, 1)
+
+
+def test_release_only_returns_own_jobs(conn):
+    claim_jobs(conn, 10, worker="node:1")
+    assert release_jobs(conn, [1], worker="node:2") == 0
+    assert state(conn)[2:] == ("node:1", 1)
+    assert release_jobs(conn, [1], worker="node:1") == 1
+    assert state(conn)[2:] == (None, 0)
+
+
+def retry_delay(conn):
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT round(extract(epoch FROM next_attempt_at - now())) FROM phone_jobs WHERE car_id = 1")
+        return cur.fetchone()[0]
+
+
+def make_due(conn):
+    with conn, conn.cursor() as cur:
+        cur.execute("UPDATE phone_jobs SET next_attempt_at = now() - interval '1 second'")
+
+
+def test_lease_is_exclusive_until_it_expires(conn):
+    assert claim_jobs(conn, 10, lease_seconds=300, worker="node:1")
+    assert retry_delay(conn) == 300
+    assert claim_jobs(conn, 10, worker="node:2") == []
+    expire_lease(conn)
+    assert claim_jobs(conn, 10, worker="node:2")
+    assert state(conn)[2:] == ("node:2", 2)
+
+
+def test_errors_are_retried_with_exponential_backoff(conn):
+    for attempt, delay in ((1, 60), (2, 120), (3, 240), (4, 300)):
+        assert claim_jobs(conn, 10, max_attempts=10, worker="node:1")
+        flush_results(conn, [(1, None, "error")], max_attempts=10, backoff=60, max_backoff=300, worker="node:1")
+        assert state(conn) == (None, "pending", None, attempt)
+        # Doubled per attempt, capped at max_backoff; not claimable before then
+        assert retry_delay(conn) == delay
+        assert claim_jobs(conn, 10, max_attempts=10, worker="node:1") == []
+        make_due(conn)
+
+
+def test_last_failed_attempt_is_terminal(conn):
+    for _ in range(2):
+        claim_jobs(conn, 10, max_attempts=3, worker="node:1")
+        flush_results(conn, [(1, None, "error")], max_attempts=3, worker="node:1")
+        make_due(conn)
+    claim_jobs(conn, 10, max_attempts=3, worker="node:1")
+    flush_results(conn, [(1, None, "error")], max_attempts=3, worker="node:1")
+    assert state(conn) == (None, "failed", None, None)
+    assert claim_jobs(conn, 10, max_attempts=3, worker="node:1") == []
+
+
+def test_expired_lease_of_last_attempt_fails_the_job(conn):
+    # The worker holding the job dies on every attempt
+    for _ in range(3):
+        assert claim_jobs(conn, 10, max_attempts=3, worker="node:1")
+        expire_lease(conn)
+    assert claim_jobs(conn, 10, max_attempts=3, worker="node:2") == []
+    assert state(conn) == (None, "failed", None, None)
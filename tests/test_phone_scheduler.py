@@ -0,0 +1,43 @@
+import asyncio
+import os
+import sys
+import threading
+
+from conftest import ROOT
+
+sys.path.insert(0, os.path.join(ROOT, "auto_ria_scraper", "selenium"))
+
+from scheduler import PhoneScheduler  # noqa: E402
+
+
+def test_scheduler_publishes_its_metrics_while_lookups_run():
+    jobs = [[(n, f"https://auto.ria.com/uk/auto_bmw_x5_{n}.html") for n in range(1, 5)]]
+    release = threading.Event()
+    stored, snapshots = [], []
+
+    def fetch(url):
+        release.wait(5)
+        return "+380671234567"
+
+    def publish(snapshot):
+        snapshots.append(snapshot)
+        if snapshot["in_flight"] == 2:
+            release.set()
+
+    scheduler = PhoneScheduler(
+        claim_jobs=lambda limit: jobs.pop() if jobs else [],
+        fetch_phone=fetch,
+        store_results=stored.extend,
+        wait_for_jobs=lambda timeout: None,
+        concurrency=2,
+        flush_interval=0.05,
+        metrics_interval=0.01,
+        should_stop=lambda: not jobs and len(stored) == 4,
+        publish_metrics=publish,
+    )
+    asyncio.run(asyncio.wait_for(scheduler.run(), 10))
+    assert sorted(car_id for car_id, _, _ in stored) == [1, 2, 3, 4]
+    # Both slots were busy with the other two jobs queued behind them at some point
+    assert {"in_flight": 2, "queue_depth": 2} in [
+        {key: s[key] for key in ("in_flight", "queue_depth")} for s in snapshots
+    ]
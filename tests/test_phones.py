@@ -0,0 +1,76 @@
+import os
+import sys
+
+import pytest
+
+from conftest import ROOT
+
+# The phone parser is a separate Docker context with flat imports
+sys.path.insert(0, os.path.join(ROOT, "auto_ria_scraper", "selenium"))
+
+from phones import INVALID, MASKED, normalize_phone, renormalize  # noqa: E402
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("(067) 123 45 67", ("+380671234567", None)),
+    ("8 067 123-45-67", ("+380671234567", None)),
+    ("+48 601 234 567", ("+48601234567", None)),
+    ("(067) xxx xx xx", (None, MASKED)),
+    ("067 ***-**-**", (None, MASKED)),
+    ("+1 (800) 555-0199 ext 2", (None, INVALID)),
+    ("067 123 45 6x", (None, INVALID)),
+    ("", (None, INVALID)),
+])
+def test_normalize_phone(raw, expected):
+    assert normalize_phone(raw) == expected
+
+
+def test_renormalize(db):
+    conn = db()
+    stored = {
+        1: "(067) 123 45 67",
+        2: "(067) xxx xx xx",
+        3: "067 ••• •• ••",
+        4: "067 123 45 6x",
+        5: "+380501234567",
+    }
+    with conn, conn.cursor() as cur:
+        cur.execute("TRUNCATE cars, phone_jobs")
+        for car_id, phone in stored.items():
+            cur.execute(
+                "INSERT INTO cars (id, url, datetime_found, phone_number, phone_status) "
+                "VALUES (%s, %s, now(), %s, 'success')",
+                (car_id, f"https://auto.ria.com/uk/auto_bmw_x5_3512345{car_id}.html", phone),
+            )
+
+    def state():
+        with conn, conn.cursor() as cur:
+            cur.execute(
+                "SELECT c.id, c.phone_number, c.phone_flag, c.phone_status, j.car_id IS NOT NULL "
+                "FROM cars c LEFT JOIN phone_jobs j ON j.car_id = c.id ORDER BY c.id"
+            )
+            return cur.fetchall()
+
+    # Small chunks, so the walk over several transactions is covered too
+    counts = renormalize(conn, chunk_rows=2, log=lambda message: None)
+    assert counts == {"scanned": 5, "normalized": 1, "masked": 2, "invalid": 1}
+    fixed = state()
+    assert fixed == [
+        (1, "+380671234567", None, "success", False),
+        # Masked numbers are kept as evidence and looked up again
+        (2, "(067) xxx xx xx", MASKED, "pending", True),
+        (3, "067 ••• •• ••", MASKED, "pending", True),
+        (4, "067 123 45 6x", INVALID, "success", False),
+        (5, "+380501234567", None, "success", False),
+    ]
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT xmin::text FROM cars ORDER BY id")
+        versions = cur.fetchall()
+    # A second run finds nothing left to fix and rewrites no row
+    counts = renormalize(conn, chunk_rows=2, log=lambda message: None)
+    assert counts == {"scanned": 5, "normalized": 0, "masked": 2, "invalid": 1}
+    assert state() == fixed
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT xmin::text FROM cars ORDER BY id")
+        assert cur.fetchall() == versions
+    conn.close()
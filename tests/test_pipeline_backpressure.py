@@ -0,0 +1,85 @@
+import time
+
+from scrapy import Spider
+from twisted.internet import defer, reactor, task
+from twisted.trial import unittest
+
+from auto_ria_scraper.pipelines import PostgresPipeline
+
+# Time one batch takes to "write" on the slow database
+WRITE_SECONDS = 0.3
+# Longest the reactor may go without running a 10 ms timer while batches are written
+MAX_TICK_GAP = 0.1
+
+
+class SlowDbPipeline(PostgresPipeline):
+    """
+    PostgresPipeline whose database takes WRITE_SECONDS per batch (no real connection).
+    """
+
+    def connect(self):
+        self.written = []
+
+    def close(self):
+        pass
+
+    def save_items(self, items):
+        time.sleep(WRITE_SECONDS)
+        self.written.append(len(items))
+        return WRITE_SECONDS, len(items), 0, 0, 0
+
+
+def sleep(seconds):
+    return task.deferLater(reactor, seconds, lambda: None)
+
+
+class BackpressureTest(unittest.TestCase):
+    timeout = 10
+
+    def setUp(self):
+        self.pipeline = SlowDbPipeline(batch_size=2, flush_interval=60, max_pending=1)
+        self.spider = Spider("slowdb")
+        self.pipeline.open_spider(self.spider)
+        self.ticks = []
+        self.ticker = task.LoopingCall(lambda: self.ticks.append(time.monotonic()))
+        self.ticker.start(0.01)
+
+    def tearDown(self):
+        if self.ticker.running:
+            self.ticker.stop()
+        # After a failure close_spider may not have run: its writer thread would keep the process alive
+        if self.pipeline.flusher.running:
+            self.pipeline.flusher.stop()
+        if self.pipeline.pool.started:
+            self.pipeline.pool.stop()
+
+    @defer.inlineCallbacks
+    def test_reactor_keeps_ticking_and_items_are_held_past_max_pending(self):
+        start = time.monotonic()
+        results = [self.pipeline.process_item({"url": f"https://auto.ria.com/uk/auto_{n}.html"}, self.spider) for n in range(4)]
+        # Two batches handed to the writer: the first two items pass, the second batch
+        # exceeds max_pending, so its last item is held until the first batch is written
+        self.assertEqual(len(self.pipeline.pending), 2)
+        self.assertNotIsInstance(results[0], defer.Deferred)
+        self.assertNotIsInstance(results[2], defer.Deferred)
+        held = results[3]
+        self.assertIsInstance(held, defer.Deferred)
+        self.assertFalse(held.called)
+        # process_item returned at once, without waiting for the database
+        self.assertLess(time.monotonic() - start, WRITE_SECONDS / 2)
+
+        yield sleep(WRITE_SECONDS / 2)
+        self.assertFalse(held.called)
+        item = yield held
+        self.assertEqual(item["url"], "https://auto.ria.com/uk/auto_3.html")
+        self.assertEqual(self.pipeline.written, [2])
+
+        yield self.pipeline.close_spider(self.spider)
+        self.assertEqual(self.pipeline.written, [2, 2])
+        self.assertGreaterEqual(time.monotonic() - start, 2 * WRITE_SECONDS)
+
+        self.ticker.stop()
+        gaps = [b - a for a, b in zip(self.ticks, self.ticks[1:])]
+        # ~60 ticks over the two writes, none delayed by a blocking write
+        self.assertGreater(len(self.ticks), 2 * WRITE_SECONDS / 0.01 / 2)
+        self.assertLess(max(gaps), MAX_TICK_GAP)
@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from auto_ria_scraper.pipelines import PostgresPipeline
+
+VIN = "WVWZZZ3CZFE123456"
+
+
+@pytest.fixture
+def pipeline(db):
+    conn = db()
+    with conn, conn.cursor() as cur:
+        cur.execute("TRUNCATE cars, car_urls, car_fingerprints, phone_jobs, cars_history")
+    conn.close()
+    pipeline = PostgresPipeline()
+    pipeline.connect()
+    yield pipeline
+    pipeline.close()
+
+
+def item(n, username, found=None, vin=VIN):
+    return {
+        "url": f"https://auto.ria.com/uk/auto_volkswagen_passat_{n}.html",
+        "title": "Volkswagen Passat 2015",
+        "price_usd": 12500,
+        "username": username,
+        "car_vin": vin,
+        "datetime_found": (found or datetime.now(timezone.utc)).isoformat(),
+    }
+
+
+def car(pipeline, n):
+    pipeline.cur.execute(
+        "SELECT id, duplicate_of, phone_number, phone_status, EXISTS (SELECT 1 FROM phone_jobs j WHERE j.car_id = c.id) "
+        "FROM cars c WHERE url = %s",
+        (item(n, None)["url"],),
+    )
+    row = pipeline.cur.fetchone()
+    pipeline.conn.commit()
+    return dict(zip(("id", "duplicate_of", "phone_number", "phone_status", "queued"), row))
+
+
+def first_listing(pipeline, username, found=None, flag=None):
+    """
+    Save listing 1 and give it a looked-up phone number, as a phone worker would.
+    """
+    pipeline.save_items([item(1, username, found)])
+    pipeline.cur.execute(
+        "UPDATE cars SET phone_number = %s, phone_flag = %s, phone_status = 'success' WHERE id = %s",
+        ("+380671234567" if flag is None else "067 12", flag, car(pipeline, 1)["id"]),
+    )
+    pipeline.cur.execute("DELETE FROM phone_jobs")
+    pipeline.conn.commit()
+    return car(pipeline, 1)["id"]
+
+
+def test_repost_by_same_seller_reuses_phone(pipeline):
+    first = first_listing(pipeline, "Ігор")
+    _, inserted, _, duplicates, reused = pipeline.save_items([item(2, "Ігор")])
+    assert (inserted, duplicates, reused) == (1, 1, 1)
+    assert car(pipeline, 2) == {
+        "id": car(pipeline, 2)["id"], "duplicate_of": first, "phone_number": "+380671234567",
+        "phone_status": "success", "queued": False,
+    }
+
+
+def test_resale_by_another_seller_gets_a_lookup(pipeline):
+    first = first_listing(pipeline, "Ігор")
+    _, inserted, _, duplicates, reused = pipeline.save_items([item(2, "Автосалон Київ")])
+    assert (inserted, duplicates, reused) == (1, 1, 0)
+    repost = car(pipeline, 2)
+    assert repost["duplicate_of"] == first
+    assert (repost["phone_number"], repost["phone_status"], repost["queued"]) == (None, "pending", True)
+
+
+def test_flagged_phone_is_not_reused(pipeline):
+    first_listing(pipeline, "Ігор", flag="invalid")
+    pipeline.save_items([item(2, "Ігор")])
+    assert car(pipeline, 2)["phone_status"] == "pending"
+
+
+@pytest.mark.parametrize("age_days, reused", [(1, True), (60, False)])
+def test_unknown_seller_reuses_only_recent_phone(pipeline, age_days, reused):
+    first_listing(pipeline, "Ігор", found=datetime.now(timezone.utc) - timedelta(days=age_days))
+    # Lite-mode card item: no seller name
+    pipeline.save_items([item(2, None)])
+    assert (car(pipeline, 2)["phone_status"] == "success") is reused
+
+
+def test_changed_listing_does_not_draw_an_id(pipeline):
+    pipeline.save_items([item(1, "Ігор")])
+    pipeline.cur.execute("SELECT last_value FROM cars_id_seq")
+    before = pipeline.cur.fetchone()[0]
+    pipeline.conn.commit()
+    changed = dict(item(1, "Ігор"), price_usd=11900)
+    _, inserted, updated, _, _ = pipeline.save_items([changed])
+    assert (inserted, updated) == (0, 1)
+    pipeline.cur.execute("SELECT last_value FROM cars_id_seq")
+    assert pipeline.cur.fetchone()[0] == before
+    pipeline.conn.commit()
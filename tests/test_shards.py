@@ -0,0 +1,135 @@
+import pytest
+
+from auto_ria_scraper.shards import Shard, ShardCoordinator, shard_url
+
+
+@pytest.fixture
+def nodes(db):
+    """
+    Two coordinators (crawler nodes) over an empty crawl_shards table.
+    """
+    conn = db()
+    with conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM crawl_shards")
+    a = ShardCoordinator(conn, "node-a", lease_minutes=10)
+    b = ShardCoordinator(db(), "node-b", lease_minutes=10)
+    yield a, b
+    a.close()
+    b.close()
+
+
+def shards(coordinator):
+    with coordinator.conn, coordinator.conn.cursor() as cur:
+        cur.execute("SELECT price_min, price_max, status, claimed_by FROM crawl_shards ORDER BY price_min, id")
+        return cur.fetchall()
+
+
+def expire_leases(coordinator, minutes):
+    with coordinator.conn, coordinator.conn.cursor() as cur:
+        cur.execute("UPDATE crawl_shards SET claimed_at = claimed_at - make_interval(mins => %s)", (minutes,))
+
+
+def test_shard_url_sets_price_band():
+    url = "https://auto.ria.com/uk/search/?indexName=auto&price.USD.lte=5&page=0"
+    assert "price.USD.gte=100" in shard_url(url, Shard(1, 100, 199)) and "price.USD.lte=199" in shard_url(url, Shard(1, 100, 199))
+    assert "price.USD.lte" not in shard_url(url, Shard(1, 500, None))
+
+
+def test_seed_creates_bands_once_per_round(nodes):
+    a, b = nodes
+    assert a.seed([0, 1000, 5000])
+    assert shards(a) == [(0, 999, "pending", None), (1000, 4999, "pending", None), (5000, None, "pending", None)]
+    # A node starting while the round is running joins it
+    assert not b.seed([0, 10])
+    assert len(shards(a)) == 3
+
+
+def test_seed_starts_new_round_when_all_done(nodes):
+    a, _ = nodes
+    a.seed([0, 1000])
+    while (shard := a.claim()) is not None:
+        assert a.complete(shard, 10)
+    assert a.seed([0, 500, 1000])
+    assert [row[2] for row in shards(a)] == ["pending"] * 3
+
+
+def test_claims_are_disjoint(nodes):
+    a, b = nodes
+    a.seed([0, 1000])
+    first, second = a.claim(), b.claim()
+    assert {first, second} == {Shard(first.id, 0, 999), Shard(second.id, 1000, None)}
+    assert a.claim() is None and b.claim() is None
+    assert {row[3] for row in shards(a)} == {"node-a", "node-b"}
+
+
+def test_split_replaces_shard_with_halves(nodes):
+    a, _ = nodes
+    a.seed([0, 1000])
+    bounded, top = a.claim(), a.claim()
+    assert a.split(bounded, 5000)
+    assert a.split(top, 5000)
+    assert sorted(shards(a), key=lambda row: (row[0], row[2])) == [
+        (0, 499, "pending", None),
+        (0, 999, "split", "node-a"),
+        (500, 999, "pending", None),
+        (1000, 1999, "pending", None),
+        (1000, None, "split", "node-a"),
+        (2000, None, "pending", None),
+    ]
+    # A single-price band cannot be split
+    assert not a.split(Shard(bounded.id, 7, 7), 5000)
+
+
+def test_complete_and_release_require_ownership(nodes):
+    a, b = nodes
+    a.seed([0, 1000])
+    shard = a.claim()
+    assert not b.complete(shard)
+    b.release(shard)
+    assert shards(a)[0][2:] == ("in_progress", "node-a")
+    a.release(shard)
+    assert shards(a)[0][2:] == ("pending", None)
+    shard = b.claim()
+    assert b.complete(shard, 42)
+    assert shards(a)[0][2:] == ("done", "node-b")
+
+
+def test_expired_lease_is_claimed_by_another_node(nodes):
+    a, b = nodes
+    a.seed([0])
+    shard = a.claim()
+    assert b.claim() is None
+    expire_leases(a, 11)
+    taken = b.claim()
+    assert taken == shard
+    # The node that lost the shard can neither renew nor complete it
+    assert not a.renew(shard)
+    assert not a.complete(shard)
+    assert b.complete(taken)
+
+
+def test_renewed_lease_is_not_taken(nodes):
+    a, b = nodes
+    a.seed([0])
+    shard = a.claim()
+    expire_leases(a, 9)
+    assert a.renew(shard)
+    expire_leases(a, 9)
+    # 18 minutes after the claim, but only 9 after the renewal
+    assert b.claim() is None
+    expire_leases(a, 2)
+    assert b.claim() == shard
+
+
+def test_split_requires_ownership(nodes):
+    a, b = nodes
+    a.seed([0])
+    shard = a.claim()
+    assert not b.split(shard, 5000)
+    expire_leases(a, 11)
+    assert b.claim() == shard
+    # The node that lost the lease must not add a second pair of halves
+    assert not a.split(shard, 5000)
+    assert shards(a) == [(0, None, "in_progress", "node-b")]
+    assert b.split(shard, 5000)
+    assert len(shards(a)) == 3
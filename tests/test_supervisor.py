@@ -0,0 +1,194 @@
+import functools
+import os
+import sys
+import time
+
+import pytest
+
+from conftest import ROOT
+
+sys.path.insert(0, os.path.join(ROOT, "auto_ria_scraper", "selenium"))
+
+import parse  # noqa: E402
+from supervisor import Supervisor  # noqa: E402
+
+URL = "https://auto.ria.com/uk/auto_bmw_x5_{}.html"
+
+
+class FakeFetcher:
+    """
+    Stand-in for PhoneFetcher: the first lookup of a listing marked "crash" kills the worker
+    process, the first one of a listing marked "hang" never returns; every other lookup succeeds.
+    Lookups already attempted are remembered in `seen_dir`, which outlives the worker processes.
+    """
+
+    def __init__(self, seen_dir):
+        self.seen_dir = seen_dir
+
+    def fetch(self, url):
+        marker = os.path.join(self.seen_dir, os.path.basename(url))
+        first = not os.path.exists(marker)
+        open(marker, "w").close()
+        if first and "crash" in url:
+            os._exit(1)
+        if first and "hang" in url:
+            time.sleep(3600)
+        return "+380671234567"
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def conn(db, monkeypatch):
+    conn = db()
+    with conn, conn.cursor() as cur:
+        cur.execute("TRUNCATE cars, phone_jobs")
+    # Idle workers beat and notice drain requests quickly; set before the workers are forked
+    monkeypatch.setattr(parse, "HEARTBEAT_INTERVAL", 0.1)
+    monkeypatch.setattr(parse, "IDLE_TIMEOUT", 0.5)
+    yield conn
+    conn.close()
+
+
+def enqueue(conn, names):
+    with conn, conn.cursor() as cur:
+        for name in names:
+            cur.execute(
+                "INSERT INTO cars (url, title, phone_status) VALUES (%s, 'BMW X5', 'pending')",
+                (URL.format(name),),
+            )
+        cur.execute("INSERT INTO phone_jobs (car_id, url, datetime_found) SELECT id, url, datetime_found FROM cars")
+
+
+def statuses(conn):
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT phone_status, count(*) FROM cars GROUP BY phone_status")
+        return dict(cur.fetchall())
+
+
+def supervise(supervisor, done, timeout=20):
+    """
+    Run the supervisor's periodic check until `done()` or `timeout` seconds, then drain.
+    """
+    deadline = time.monotonic() + timeout
+    try:
+        while not done() and time.monotonic() < deadline:
+            supervisor.check()
+            time.sleep(0.1)
+    finally:
+        supervisor.drain()
+
+
+def phone_supervisor(tmp_path, released, **kwargs):
+    def release_jobs(pid):
+        count = parse.release_dead_worker(pid)
+        released.append(count)
+        return count
+
+    return Supervisor(
+        target=functools.partial(parse.worker, make_fetcher=functools.partial(FakeFetcher, str(tmp_path))),
+        count_due=lambda: 0,
+        release_jobs=release_jobs,
+        min_workers=1,
+        max_workers=1,
+        min_uptime=0,
+        **kwargs,
+    )
+
+
+def test_crashed_worker_is_replaced_and_its_jobs_released(conn, tmp_path):
+    enqueue(conn, ["1", "2-crash", "3"])
+    released = []
+    supervisor = phone_supervisor(tmp_path, released)
+    # The lease (PHONE_LEASE_SECONDS) is far longer than the run: jobs come back only if released
+    supervise(supervisor, lambda: statuses(conn) == {"success": 3})
+    assert statuses(conn) == {"success": 3}
+    assert supervisor.restarts == 1
+    # The whole claimed batch was released, not only the job that was being looked up
+    assert released[0] == 3
+    assert supervisor.workers == []
+
+
+def test_hung_worker_is_killed_and_its_jobs_released(conn, tmp_path):
+    enqueue(conn, ["1-hang", "2"])
+    released = []
+    supervisor = phone_supervisor(tmp_path, released, heartbeat_timeout=1)
+    supervise(supervisor, lambda: statuses(conn) == {"success": 2})
+    assert statuses(conn) == {"success": 2}
+    assert supervisor.restarts == 1
+    assert released[0] == 2
+
+
+def beating(heartbeat):
+    while not heartbeat.stopping():
+        heartbeat.beat()
+        time.sleep(0.05)
+
+
+def stubborn(heartbeat):
+    # Ignores drain requests, like a worker stuck in a lookup that still beats
+    while True:
+        heartbeat.beat()
+        time.sleep(0.05)
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+
+def test_worker_count_follows_queue_depth():
+    due, released = [0], []
+    supervisor = Supervisor(
+        target=beating,
+        count_due=lambda: due[0],
+        release_jobs=released.append,
+        min_workers=1,
+        max_workers=3,
+        jobs_per_worker=10,
+        scale_down_after=2,
+    )
+    try:
+        supervisor.check()
+        assert supervisor.metrics()["workers"] == 1
+        # Scaling up is immediate, and capped at max_workers
+        due[0] = 25
+        supervisor.check()
+        assert supervisor.metrics() == {"workers": 3, "draining": 0, "desired": 3, "restarts": 0}
+        due[0] = 1000
+        supervisor.check()
+        assert supervisor.metrics()["workers"] == 3
+        # Scaling down waits for scale_down_after checks and drains one worker at a time
+        due[0] = 0
+        supervisor.check()
+        assert supervisor.metrics()["draining"] == 0
+        supervisor.check()
+        assert supervisor.metrics()["draining"] == 1
+        draining = next(handle for handle in supervisor.workers if handle.draining_since is not None)
+        assert wait_until(lambda: not draining.process.is_alive())
+        supervisor.check()
+        assert supervisor.metrics() == {"workers": 2, "draining": 0, "desired": 1, "restarts": 0}
+        assert released == [draining.process.pid]
+    finally:
+        supervisor.drain()
+    assert supervisor.workers == []
+
+
+def test_drain_kills_workers_that_do_not_stop():
+    released = []
+    supervisor = Supervisor(
+        target=stubborn,
+        count_due=lambda: 0,
+        release_jobs=released.append,
+        min_workers=2,
+        drain_timeout=0.5,
+    )
+    supervisor.check()
+    processes = [handle.process for handle in supervisor.workers]
+    assert len(processes) == 2
+    supervisor.drain()
+    assert not any(process.is_alive() for process in processes)
+    assert sorted(released) == sorted(process.pid for process in processes)